@@ -0,0 +1,53 @@
+"""Compares GhostGame.make_moves against the same number of
+make_move calls.
+
+Run from the repository root:
+
+    $ python -m benchmarks.batch_moves [--batch N] [--trie dict|compact]
+"""
+import argparse
+import random
+import time
+
+from game.Trie import Trie
+from game.CompactTrie import CompactTrie
+from game.GhostGame import GhostGame
+
+from .compare_tries import load_words
+
+TRIE_CLASSES = {'dict': Trie, 'compact': CompactTrie}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--trie', choices=TRIE_CLASSES, default='dict')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    words = load_words()
+    trie = TRIE_CLASSES[args.trie]()
+    trie.insert_all(words)
+    game = GhostGame(trie)
+
+    rng = random.Random(args.seed)
+    states = [w[:rng.randint(0, len(w) - 1)] for w in rng.choices(words, k=args.batch)]
+
+    random.seed(args.seed)
+    start = time.perf_counter()
+    for state in states:
+        game.make_move(state)
+    single = time.perf_counter() - start
+
+    random.seed(args.seed)
+    start = time.perf_counter()
+    game.make_moves(states)
+    batch = time.perf_counter() - start
+
+    print(f"{args.batch} moves ({args.trie} trie)")
+    print(f"  make_move x{args.batch}: {args.batch / single:10.0f} moves/s")
+    print(f"  make_moves:      {args.batch / batch:10.0f} moves/s ({single / batch:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
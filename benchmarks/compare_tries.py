@@ -0,0 +1,70 @@
+"""Compares memory use and lookup speed of Trie and CompactTrie.
+
+Run from the repository root:
+
+    $ python -m benchmarks.compare_tries [--words N]
+
+Without --words the shipped word list is used. Otherwise N synthetic
+words are generated from a seeded RNG.
+"""
+import argparse
+import random
+import string
+import timeit
+import tracemalloc
+from os import path
+
+from game.Trie import Trie
+from game.CompactTrie import CompactTrie
+
+WORDLIST_PATH = path.join(path.dirname(__file__), '..', 'game', 'static', 'game', 'wordlist.txt')
+
+
+def load_words(count=None, seed=0):
+    if count is None:
+        with open(WORDLIST_PATH) as f:
+            return [line.strip().lower() for line in f if line.strip()]
+
+    rng = random.Random(seed)
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12)))
+            for _ in range(count)]
+
+
+def measure(trie_class, words, queries):
+    tracemalloc.start()
+    trie = trie_class()
+    trie.insert_all(words)
+    trie.calculate_heights()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    number = 5
+    elapsed = timeit.timeit(lambda: [trie.find(q) for q in queries], number=number)
+    return {
+        'resident_bytes': size,
+        'peak_bytes': peak,
+        'find_ns': elapsed / (number * len(queries)) * 1e9,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--words', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    words = load_words(args.words, args.seed)
+    rng = random.Random(args.seed)
+    queries = [w[:rng.randint(1, len(w))] for w in rng.sample(words, min(len(words), 10000))]
+
+    print(f"{len(words)} words, {len(queries)} lookups")
+    for trie_class in (Trie, CompactTrie):
+        result = measure(trie_class, words, queries)
+        print(f"{trie_class.__name__:>12}: "
+              f"{result['resident_bytes'] / 1024:10.1f} KiB resident, "
+              f"{result['peak_bytes'] / 1024:10.1f} KiB peak, "
+              f"{result['find_ns']:8.0f} ns/find")
+
+
+if __name__ == '__main__':
+    main()
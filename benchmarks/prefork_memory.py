@@ -0,0 +1,110 @@
+"""Measures the total memory of a gunicorn server as workers are added,
+with and without prefork mode (GHOST_PREFORK).
+
+Run from the repository root:
+
+    $ python -m benchmarks.prefork_memory [--workers 1,2,4,8] [--trie auto,dict]
+
+For every configuration the server is started, every worker is sent
+a few hundred moves, and the proportional set size (PSS) of the master
+and its workers is summed: pages shared between processes count once
+in total, so a dictionary that stays shared adds nothing per worker.
+Linux only (reads /proc).
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+from .compare_tries import load_words
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def pss_bytes(pid):
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def play(port, words, count):
+    url = f'http://127.0.0.1:{port}/api/move'
+    for _ in range(count):
+        word = random.choice(words)
+        data = urllib.parse.urlencode({'prefix': word[:2], 'input': word[2], 'hint': 'true'}).encode()
+        urllib.request.urlopen(url, data).read()
+
+
+def measure(workers, prefork, trie_impl, words, log_dir):
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GHOST_BIND=f'127.0.0.1:{port}',
+               GHOST_PREFORK='1' if prefork else '0', GHOST_TRIE_IMPL=trie_impl,
+               LOG_PATH=log_dir, DJANGO_LOG_LEVEL='WARNING')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'ghost.asgi:application'],
+                              cwd=REPO_ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                play(port, words, 1)
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.2)
+
+        # connections are spread over the workers by the kernel, so
+        # enough requests reach (and load the dictionary into) all of them
+        play(port, words, 300 * workers)
+        pids = [server.pid] + children(server.pid)
+        return sum(pss_bytes(pid) for pid in pids)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--trie', default='auto,dict', help="GHOST_TRIE_IMPL values to try")
+    parser.add_argument('--output', default=None, help="write results to this JSON file")
+    args = parser.parse_args()
+
+    words = [w for w in load_words() if len(w) > 3]
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for trie_impl in args.trie.split(','):
+            for prefork in (False, True):
+                for workers in map(int, args.workers.split(',')):
+                    name = f"pss_bytes.{trie_impl}.{'prefork' if prefork else 'independent'}.workers{workers}"
+                    results[name] = measure(workers, prefork, trie_impl, words, log_dir)
+                    print(f"{name:<44} {results[name] / 2 ** 20:8.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
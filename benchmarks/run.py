@@ -0,0 +1,361 @@
+"""Reproducible benchmarks for the game's hot paths.
+
+Run from the repository root:
+
+    $ python -m benchmarks.run [--sizes 100000,1000000] [--output results.json]
+    $ python -m benchmarks.run --compare baseline.json [--threshold 0.1]
+
+Benchmarks:
+    trie.*      Trie/CompactTrie insert_all, calculate_heights and
+                GhostSolver.solve on the shipped word list and on
+                synthetic word lists; size (raw and gzipped) and
+                decode time of the client trie; "did you mean"
+                suggestions at edit distance 2 (mean, slowest input
+                and cached)
+    game.*      GhostGame.make_move, make_moves, get_leaf_node and
+                get_hints by prefix depth; make_moves against each
+                difficulty and the time to build their tables;
+                Superghost index build, solve and extension queries
+    loader.*    time and peak memory to load the default dictionary
+                with game.asset_loader, in a fresh interpreter
+    views.*     full requests through Django's test client
+
+Every benchmark reports seconds (lower is better) or bytes (lower is
+better). With --compare, the run fails if any result is more than
+--threshold worse than the same result in the baseline file.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from os import path
+
+from game.ClientTrie import ClientTrie
+from game.Trie import Trie
+from game.CompactTrie import CompactTrie
+from game.GhostGame import GhostGame, HINT_LONGEST, HINT_COMMON
+from game.GhostSolver import GhostSolver
+from game.GhostStrategies import DIFFICULTIES, FrequencyWeightedStrat, SuperghostStrat
+from game.SubstringIndex import SubstringIndex
+from game.Suggester import Suggester
+
+from .compare_tries import load_words
+
+REPO_ROOT = path.abspath(path.join(path.dirname(__file__), '..'))
+
+TRIE_CLASSES = {'dict': Trie, 'compact': CompactTrie}
+
+MAX_DEPTH = 8
+
+# Room sizes solved by trie.solve.*
+SOLVER_PLAYERS = (2, 4, 6)
+
+# Inputs per word list and edit distance of trie.suggest.*
+SUGGEST_INPUTS = 200
+SUGGEST_DISTANCE = 2
+
+
+def best_of(func, repeat=5, number=1):
+    """Minimum time in seconds of a single call to `func`."""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def synthetic_words(count, rng):
+    """Random lower-case words whose length follows the shipped list."""
+    letters = string.ascii_lowercase
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 12)))
+            for _ in range(count)]
+
+
+###############################################################################
+# Trie construction
+###############################################################################
+def bench_trie(results, word_lists, repeat):
+    for list_name, words in word_lists.items():
+        # large lists take seconds per build; fewer repeats are enough
+        n = repeat if len(words) < 200000 else 1
+        for impl, trie_class in TRIE_CLASSES.items():
+            results[f'trie.insert_all.{impl}.{list_name}'] = best_of(
+                lambda: build_trie(trie_class, words), repeat=n)
+            results[f'trie.calculate_heights.{impl}.{list_name}'] = time_heights(
+                trie_class, words, n)
+            trie = build_trie(trie_class, words)
+            for players in SOLVER_PLAYERS:
+                results[f'trie.solve.{impl}.players{players}.{list_name}'] = best_of(
+                    lambda: GhostSolver(trie, players).solve(), repeat=n)
+
+        # decoded in Python here; ghost.js logs its own decode time
+        data = ClientTrie.encode(build_trie(CompactTrie, words))
+        results[f'trie.client_trie.bytes.{list_name}'] = len(data)
+        results[f'trie.client_trie.gzip_bytes.{list_name}'] = len(gzip.compress(data))
+        results[f'trie.client_trie.decode.{list_name}'] = best_of(lambda: ClientTrie(data), repeat=n)
+
+
+def bench_suggest(results, word_lists, rng, repeat):
+    for list_name, words in word_lists.items():
+        for impl, trie_class in TRIE_CLASSES.items():
+            trie = build_trie(trie_class, words)
+            inputs = misplays(trie, words, rng)
+            suggester = Suggester(trie, cache_size=0)
+            results[f'trie.suggest.{impl}.{list_name}'] = best_of(
+                lambda: [suggester.suggest(w, SUGGEST_DISTANCE) for w in inputs], repeat) / len(inputs)
+            results[f'trie.suggest.{impl}.worst.{list_name}'] = max(
+                best_of(lambda: suggester.suggest(w, SUGGEST_DISTANCE), repeat) for w in inputs)
+
+            suggester = Suggester(trie)
+            for w in inputs:
+                suggester.suggest(w, SUGGEST_DISTANCE)
+            results[f'trie.suggest.{impl}.cached.{list_name}'] = best_of(
+                lambda: [suggester.suggest(w, SUGGEST_DISTANCE) for w in inputs], repeat) / len(inputs)
+
+
+def misplays(trie, words, rng):
+    """Moves that leave the trie: a prefix of a word followed by a
+    letter that no word continues it with."""
+    inputs = []
+    while len(inputs) < SUGGEST_INPUTS:
+        word = rng.choice(words)
+        attempt = word[:rng.randint(0, len(word) - 1)] + rng.choice(string.ascii_lowercase)
+        if trie.find(attempt) is None:
+            inputs.append(attempt)
+    return inputs
+
+
+def build_trie(trie_class, words):
+    trie = trie_class()
+    trie.insert_all(words)
+    if isinstance(trie, CompactTrie):
+        # CompactTrie defers building its arrays until first use
+        trie.find_id('')
+    return trie
+
+
+def time_heights(trie_class, words, repeat):
+    best = None
+    for _ in range(repeat):
+        trie = build_trie(trie_class, words)
+        start = time.perf_counter()
+        trie.calculate_heights()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+###############################################################################
+# Move selection and hints
+###############################################################################
+def bench_game(results, words, rng, repeat):
+    states_by_depth = {}
+    for depth in range(MAX_DEPTH + 1):
+        candidates = [w[:depth] for w in words if len(w) > depth]
+        states_by_depth[depth] = [rng.choice(candidates) for _ in range(1000)]
+
+    for impl, trie_class in TRIE_CLASSES.items():
+        trie = trie_class()
+        trie.insert_all(words)
+        game = GhostGame(trie)
+
+        for depth, states in states_by_depth.items():
+            results[f'game.make_move.{impl}.depth{depth}'] = best_of(
+                lambda: [game.make_move(s) for s in states], repeat) / len(states)
+            results[f'game.get_leaf_node.{impl}.depth{depth}'] = best_of(
+                lambda: [game.get_leaf_node(s) for s in states], repeat) / len(states)
+            for mode in (HINT_LONGEST, HINT_COMMON):
+                results[f'game.get_hints.{mode}.{impl}.depth{depth}'] = best_of(
+                    lambda: [game.get_hints(s, mode) for s in states], repeat) / len(states)
+
+        batch = [s for states in states_by_depth.values() for s in states]
+        results[f'game.make_moves.{impl}'] = best_of(lambda: game.make_moves(batch), repeat) / len(batch)
+        for difficulty in DIFFICULTIES:
+            results[f'game.make_moves.{impl}.{difficulty}'] = best_of(
+                lambda: game.make_moves(batch, difficulty), repeat) / len(batch)
+        results[f'game.difficulty_tables.{impl}'] = best_of(
+            lambda: [FrequencyWeightedStrat(trie, difficulty) for difficulty in DIFFICULTIES], repeat)
+
+    results['game.superghost.build_index'] = best_of(lambda: SubstringIndex(words), repeat)
+    index = SubstringIndex(words)
+    results['game.superghost.solve'] = best_of(lambda: SuperghostStrat(index).solve(), repeat)
+    fragments = [w[i:i + 3] for w in rng.sample(words, 1000) for i in (0, len(w) - 3)]
+    results['game.superghost.extensions'] = best_of(
+        lambda: [index.extensions(f) for f in fragments], repeat) / len(fragments)
+
+
+###############################################################################
+# Asset loading (fresh interpreter per measurement)
+###############################################################################
+LOADER_SCRIPT = """
+import json, resource, time, tracemalloc
+import django
+django.setup()
+tracemalloc.start()
+start = time.perf_counter()
+import game.asset_loader
+game.asset_loader.load_assets(game.asset_loader.DEFAULT_DICTIONARY)
+elapsed = time.perf_counter() - start
+peak = tracemalloc.get_traced_memory()[1]
+print(json.dumps({'seconds': elapsed, 'peak_bytes': peak,
+                  'maxrss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}))
+"""
+
+
+def bench_loader(results, repeat, log_dir):
+    for impl in ('auto', 'dict', 'compact'):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='ghost.settings',
+                   GHOST_TRIE_IMPL=impl, LOG_PATH=log_dir, DJANGO_LOG_LEVEL='WARNING')
+        runs = []
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, '-c', LOADER_SCRIPT], cwd=REPO_ROOT,
+                                  env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"loader.{impl}: skipped ({proc.stderr.strip().splitlines()[-1]})", file=sys.stderr)
+                break
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if runs:
+            results[f'loader.import_seconds.{impl}'] = min(r['seconds'] for r in runs)
+            results[f'loader.peak_bytes.{impl}'] = min(r['peak_bytes'] for r in runs)
+            results[f'loader.maxrss_bytes.{impl}'] = min(r['maxrss_bytes'] for r in runs)
+
+
+###############################################################################
+# Full request path
+###############################################################################
+def bench_views(results, words, rng, repeat, log_dir):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ghost.settings')
+    os.environ.setdefault('LOG_PATH', log_dir)
+    os.environ.setdefault('DJANGO_LOG_LEVEL', 'WARNING')
+    try:
+        import django
+        django.setup()
+        from django.test import Client
+        import game.views
+        # load the dictionary outside the timings
+        game.views.dictionaries.get(game.views.DEFAULT_DICTIONARY)
+    except Exception as e:
+        print(f"views: skipped ({e})", file=sys.stderr)
+        return
+
+    client = Client()
+    states = [w[:rng.randint(1, len(w) - 1)] for w in rng.sample(words, 200)]
+
+    def index():
+        for state in states:
+            client.post('/', {'prefix': state[:-1], 'input-txt': state[-1]})
+
+    def api_move():
+        for state in states:
+            client.post('/api/move', {'prefix': state[:-1], 'input': state[-1]})
+
+    results['views.index.post'] = best_of(index, repeat) / len(states)
+    results['views.api_move.post'] = best_of(api_move, repeat) / len(states)
+    results['views.index.get'] = best_of(lambda: client.get('/'), repeat, number=50)
+
+    # after the first round every lookup is a response cache hit
+    def definitions():
+        for state in states:
+            client.get(f'/api/definition/{state}')
+
+    def completions():
+        for state in states:
+            client.get(f'/api/completions/{state}')
+
+    etags = {state: client.get(f'/api/completions/{state}').get('ETag') for state in states}
+
+    def completions_not_modified():
+        for state in states:
+            client.get(f'/api/completions/{state}', HTTP_IF_NONE_MATCH=etags[state])
+
+    results['views.api_definition.get'] = best_of(definitions, repeat) / len(states)
+    results['views.api_completions.get'] = best_of(completions, repeat) / len(states)
+    results['views.api_completions.not_modified'] = best_of(completions_not_modified, repeat) / len(states)
+
+
+###############################################################################
+# Driver
+###############################################################################
+def compare(results, baseline, threshold):
+    """Returns the names of results that regressed past `threshold`."""
+    regressions = []
+    for name, value in sorted(results.items()):
+        old = baseline.get(name)
+        if not old:
+            continue
+        change = (value - old) / old
+        marker = ''
+        if change > threshold:
+            regressions.append(name)
+            marker = '  REGRESSION'
+        print(f"{name:<48} {old:12.4g} -> {value:12.4g} ({change:+.1%}){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', default='100000',
+                        help="comma separated sizes of synthetic word lists (default: 100000)")
+    parser.add_argument('--only', default=None,
+                        help="comma separated groups to run: trie,game,loader,views")
+    parser.add_argument('--output', default=None, help="write results to this JSON file")
+    parser.add_argument('--compare', default=None, help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed relative slowdown before --compare fails (default: 0.10)")
+    args = parser.parse_args()
+
+    groups = set(args.only.split(',')) if args.only else {'trie', 'game', 'loader', 'views'}
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    words = load_words()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        if 'trie' in groups:
+            word_lists = {'shipped': words}
+            for size in filter(None, args.sizes.split(',')):
+                word_lists[f'synthetic{int(size)}'] = synthetic_words(int(size), random.Random(args.seed))
+            bench_trie(results, word_lists, args.repeat)
+            bench_suggest(results, word_lists, random.Random(args.seed), args.repeat)
+        if 'game' in groups:
+            bench_game(results, words, rng, args.repeat)
+        if 'loader' in groups:
+            bench_loader(results, min(args.repeat, 3), log_dir)
+        if 'views' in groups:
+            bench_views(results, words, rng, args.repeat, log_dir)
+
+    report = {
+        'meta': {
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}.")
+            sys.exit(1)
+    else:
+        for name, value in sorted(results.items()):
+            print(f"{name:<48} {value:12.4g}")
+
+
+if __name__ == '__main__':
+    main()
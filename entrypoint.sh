@@ -1,5 +1,7 @@
 #!/bin/sh
 
+python game/assets/build_wordlist.py --snapshot-only --output-dir game/static/game
+
 python manage.py collectstatic --no-input --clear
 
 exec "$@"
\ No newline at end of file
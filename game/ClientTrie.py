@@ -0,0 +1,102 @@
+from array import array
+import struct
+
+# Client trie layout (see ClientTrie.encode). Every field is a single
+# byte, so the file reads the same on any platform and in JavaScript:
+#   header      - magic, format version, node count (little endian)
+#   labels      - uint8 * count: the letter leading to each node
+#   child count - uint8 * count
+#   terminal    - one bit per node, least significant bit first
+# Nodes are in breadth-first order with siblings sorted by letter, so
+# the children of every node are contiguous and come after it: first
+# child offsets and heights are recomputed by the reader rather than
+# stored. game/static/game/js/ghost.js is the browser's reader.
+CLIENT_TRIE_MAGIC = b'GHCT'
+CLIENT_TRIE_VERSION = 1
+
+_CLIENT_TRIE_HEADER = struct.Struct('<4sHI')
+
+
+class ClientTrie(object):
+    """Read-only trie decoded from the compact encoding served to the
+    browser, which validates the player's moves with it.
+
+    This is the Python counterpart of the reader in ghost.js. It is
+    used to measure the encoding and to check that it agrees with the
+    server's trie.
+    """
+
+    ROOT = 0
+
+    def __init__(self, data):
+        if len(data) < _CLIENT_TRIE_HEADER.size:
+            raise ValueError("Buffer is too small to hold a client trie.")
+        magic, version, count = _CLIENT_TRIE_HEADER.unpack_from(data, 0)
+        if magic != CLIENT_TRIE_MAGIC:
+            raise ValueError("Buffer does not contain a client trie.")
+        if version != CLIENT_TRIE_VERSION:
+            raise ValueError(f"Unsupported client trie version {version} "
+                             f"(expected {CLIENT_TRIE_VERSION}).")
+
+        offset = _CLIENT_TRIE_HEADER.size
+        self._labels = bytes(data[offset:offset + count])
+        self._child_count = bytes(data[offset + count:offset + 2 * count])
+        self._terminal = bytes(data[offset + 2 * count:offset + 2 * count + (count + 7) // 8])
+
+        first_child = array('i', [0]) * count
+        following = 1
+        for node, children in enumerate(self._child_count):
+            first_child[node] = following
+            following += children
+        self._first_child = first_child
+
+        # children come after their parents, so a reverse sweep sees
+        # every node after all of its children
+        height = array('H', [0]) * count
+        for node in range(count - 1, -1, -1):
+            start = first_child[node]
+            for child in range(start, start + self._child_count[node]):
+                if height[child] + 1 > height[node]:
+                    height[node] = height[child] + 1
+        self._height = height
+
+
+    def __len__(self):
+        return len(self._labels)
+
+
+    @staticmethod
+    def encode(trie):
+        """Returns the client encoding of a CompactTrie."""
+        count = len(trie)
+        terminal = bytearray((count + 7) // 8)
+        for node in range(count):
+            if trie._terminal[node]:
+                terminal[node >> 3] |= 1 << (node & 7)
+        return b''.join((
+            _CLIENT_TRIE_HEADER.pack(CLIENT_TRIE_MAGIC, CLIENT_TRIE_VERSION, count),
+            bytes(trie._labels),
+            bytes(trie._child_count),
+            bytes(terminal),
+        ))
+
+
+    def find_id(self, value):
+        """Returns the id of the node reached by `value`, or None if no
+        word starts with it."""
+        labels = self._labels
+        node = self.ROOT
+        for code in value.encode('latin-1', 'replace'):
+            start = self._first_child[node]
+            node = labels.find(code, start, start + self._child_count[node])
+            if node < 0:
+                return None
+        return node
+
+
+    def is_word(self, node):
+        return bool(self._terminal[node >> 3] >> (node & 7) & 1)
+
+
+    def height(self, node):
+        return self._height[node]
@@ -0,0 +1,637 @@
+from array import array
+import mmap
+import struct
+import sys
+
+from .Trie import TRIE_BRANCH, HINT_CACHE_SIZE, MoveTable
+
+# Snapshot file layout (see CompactTrie.write_snapshot):
+#   header: magic, format version, byte order, node count, move bytes,
+#   leaf count, hint cache size
+#   followed by the arrays in _SNAPSHOT_ARRAYS order, the labels and
+#   the move letters, each section padded to an 8 byte boundary.
+#   Arrays hold one entry per node, per leaf, or hint cache size
+#   entries per node.
+SNAPSHOT_MAGIC = b'GHSTTRIE'
+SNAPSHOT_VERSION = 2
+
+_SNAPSHOT_HEADER = struct.Struct('<8sIIIIII')
+_SNAPSHOT_ALIGN = 8
+_SNAPSHOT_ARRAYS = (
+    ('_parent', 'i', 'node'),
+    ('_first_child', 'i', 'node'),
+    ('_move_offset', 'i', 'node'),
+    ('_leaf_start', 'i', 'node'),
+    ('_leaf_count', 'i', 'node'),
+    ('_deepest_leaf', 'i', 'node'),
+    ('_leaf_nodes', 'i', 'leaf'),
+    ('_common_leaves', 'i', 'hint'),
+    ('_depth', 'H', 'node'),
+    ('_height', 'h', 'node'),
+    ('_child_count', 'B', 'node'),
+    ('_terminal', 'B', 'node'),
+    ('_win_count', 'B', 'node'),
+    ('_lose_count', 'B', 'node'),
+    ('_best_count', 'B', 'node'),
+)
+
+
+def _padding(size):
+    return -size % _SNAPSHOT_ALIGN
+
+
+class CompactTrieNode(object):
+    """Lightweight view onto a single node of a CompactTrie.
+
+    Exposes the same attributes as TrieNode (value, children, depth,
+    height, child(), has_children, iter_children()) but reads them
+    from the trie's flat arrays, so the only per-node cost is the
+    node id.
+    """
+
+    __slots__ = ('trie', 'id')
+
+    def __init__(self, trie, node_id):
+        self.trie = trie
+        self.id = node_id
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactTrieNode)
+                and other.trie is self.trie and other.id == self.id)
+
+    def __hash__(self):
+        return self.id
+
+    def child(self, letter):
+        """Returns the child reached by appending `letter`, or None."""
+        trie = self.trie
+        code = ord(letter)
+        if code > 255:
+            return None
+        start = trie._first_child[self.id]
+        node_id = trie._labels.find(code, start, start + trie._child_count[self.id])
+        if node_id < 0:
+            return None
+        return CompactTrieNode(trie, node_id)
+
+    @property
+    def value(self):
+        if self.trie._terminal[self.id]:
+            return self.trie.word(self.id)
+        return TRIE_BRANCH
+
+    @property
+    def has_children(self):
+        return self.trie._child_count[self.id] > 0
+
+    def iter_children(self):
+        """Yields (letter, child) for every child, in letter order,
+        without building the dict that `children` returns."""
+        trie = self.trie
+        labels = trie._labels
+        start = trie._first_child[self.id]
+        for c in range(start, start + trie._child_count[self.id]):
+            yield chr(labels[c]), CompactTrieNode(trie, c)
+
+    @property
+    def children(self):
+        # a new dict on every access: hot paths use child(),
+        # has_children and iter_children() instead
+        trie = self.trie
+        start = trie._first_child[self.id]
+        end = start + trie._child_count[self.id]
+        return {chr(trie._labels[c]): CompactTrieNode(trie, c) for c in range(start, end)}
+
+    @property
+    def depth(self):
+        return self.trie._depth[self.id]
+
+    @property
+    def height(self):
+        return self.trie._height[self.id]
+
+    @property
+    def moves(self):
+        return self.trie.move_table(self.id)
+
+    @property
+    def leaf_start(self):
+        return self.trie._leaf_start[self.id]
+
+    @property
+    def leaf_count(self):
+        return self.trie._leaf_count[self.id]
+
+    @property
+    def deepest_leaf(self):
+        return self.trie._deepest_leaf[self.id]
+
+    @property
+    def common_leaves(self):
+        trie = self.trie
+        start = self.id * trie._hint_size
+        return tuple(i for i in trie._common_leaves[start:start + trie._hint_size] if i >= 0)
+
+
+class CompactTrie(object):
+    """Array-backed trie with the same public API as Trie.
+
+    Nodes are numbered in breadth-first order so that the children
+    of every node occupy a contiguous id range. Each node therefore
+    only needs a handful of fixed-width integers:
+
+        labels[n]       - letter on the edge leading into n
+        parent[n]       - id of the parent node (-1 for the root)
+        first_child[n]  - id of the first child of n
+        child_count[n]  - number of children of n
+        depth[n]        - distance from the root
+        height[n]       - distance to the deepest leaf below n
+        terminal[n]     - 1 if the path to n spells a word
+
+    calculate_move_tables() adds a flat encoding of each branch node's
+    MoveTable: the winning letters followed by the losing letters
+    (longest-surviving first) are stored in a shared byte string at
+    move_offset[n], with win_count[n], lose_count[n] and
+    best_count[n] recording where each group ends.
+
+    Children of a node are stored in sorted order and looked up with
+    a single bytes.find() over the node's label range.
+
+    The arrays are immutable once built. Inserted values are buffered
+    and the arrays are rebuilt from scratch the next time the trie is
+    queried, so callers should prefer insert_all() over many calls
+    to insert().
+
+    A fully calculated trie can be saved with write_snapshot() and
+    loaded again with open_snapshot(), which memory-maps the file and
+    answers queries straight from the mapped pages.
+    """
+
+    ROOT = 0
+
+    def __init__(self):
+        self._pending = []
+        # incremented by every change to the set of values (see Trie)
+        self.generation = 0
+        self._heights_valid = False
+        self._moves_valid = False
+        self._hints_valid = False
+        self._ranks = {}
+        self._build([])
+
+
+    @property
+    def root(self):
+        self._ensure_built()
+        return CompactTrieNode(self, self.ROOT)
+
+
+    def __len__(self):
+        """Number of nodes in the trie (including the root)."""
+        self._ensure_built()
+        return len(self._parent)
+
+
+    def find(self, value):
+        """Searches for a match to the provided value in the trie.
+
+        Args:
+            value - the value to search for
+
+        Returns:
+            - A CompactTrieNode for the matched node, if it exists.
+            - None if the provided value does not appear in the
+            trie and cannot be reached from any node in the trie.
+        """
+        node_id = self.find_id(value)
+        if node_id is None:
+            return None
+        return CompactTrieNode(self, node_id)
+
+
+    def find_id(self, value):
+        """Same as find(), but returns the raw node id."""
+        self._ensure_built()
+
+        try:
+            codes = value.encode('latin-1')
+        except UnicodeEncodeError:
+            # labels are single bytes, so nothing outside latin-1 can match
+            return None
+
+        labels = self._labels
+        first_child = self._first_child
+        child_count = self._child_count
+
+        node = self.ROOT
+        for code in codes:
+            start = first_child[node]
+            node = labels.find(code, start, start + child_count[node])
+            if node < 0:
+                return None
+        return node
+
+
+    def insert(self, value):
+        """Inserts the provided value into the trie."""
+        self._pending.append(value)
+        self.generation += 1
+
+
+    def insert_all(self, iterable):
+        """Inserts the provided values into the trie."""
+        self._pending.extend(iterable)
+        self.generation += 1
+
+
+    def remove(self, value):
+        """Removes the provided value from the trie.
+
+        This rebuilds the arrays, so it is only meant for occasional
+        edits to a loaded dictionary.
+
+        Returns:
+            True if the value was in the trie, False otherwise.
+        """
+        node_id = self.find_id(value)
+        if node_id is None or not self._terminal[node_id]:
+            return False
+        self._build([word for word in self._iter_words() if word != value])
+        self.generation += 1
+        return True
+
+
+    def calculate_heights(self):
+        """Recalculates heights for all nodes in the tree."""
+        self._ensure_built()
+        if self._heights_valid:
+            return
+
+        height = self._height
+        parent = self._parent
+        for node in range(len(height)):
+            height[node] = 0
+
+        # children always have larger ids than their parents, so a
+        # reverse sweep visits every node after all of its children
+        for node in range(len(height) - 1, 0, -1):
+            p = parent[node]
+            if height[node] + 1 > height[p]:
+                height[p] = height[node] + 1
+
+        self._heights_valid = True
+
+
+    def calculate_move_tables(self):
+        """Precomputes the move table of every branch node,
+        calculating heights first if needed."""
+        self.calculate_heights()
+        if self._moves_valid:
+            return
+
+        labels = self._labels
+        height = self._height
+        first_child = self._first_child
+        child_count = self._child_count
+
+        node_count = len(height)
+        move_offset = array('i', [0]) * node_count
+        win_count = array('B', [0]) * node_count
+        lose_count = array('B', [0]) * node_count
+        best_count = array('B', [0]) * node_count
+        letters = []
+        offset = 0
+
+        for node in range(node_count):
+            start = first_child[node]
+            end = start + child_count[node]
+            if start == end:
+                continue
+
+            table = MoveTable.from_children((chr(labels[c]), height[c]) for c in range(start, end))
+            move_offset[node] = offset
+            win_count[node] = len(table.winners)
+            lose_count[node] = len(table.losers)
+            best_count[node] = len(table.best_losers)
+            letters.append(table.letters)
+            offset += len(table.letters)
+
+        self._move_offset = move_offset
+        self._win_count = win_count
+        self._lose_count = lose_count
+        self._best_count = best_count
+        self._move_letters = ''.join(letters).encode('latin-1')
+        self._move_cache = {}
+        self._moves_valid = True
+
+
+    def move_table(self, node_id):
+        """Returns the MoveTable of the given node, or None for leaves.
+        Calculates the tables of the whole trie first if needed.
+
+        Tables are decoded from the flat encoding on first use and
+        cached, so repeated moves from the same node do not allocate.
+        """
+        if not self._moves_valid:
+            self.calculate_move_tables()
+        table = self._move_cache.get(node_id)
+        if table is not None or not self._child_count[node_id]:
+            return table
+
+        offset = self._move_offset[node_id]
+        wins = self._win_count[node_id]
+        moves = str(self._move_letters[offset:offset + wins + self._lose_count[node_id]], 'latin-1')
+
+        start = self._first_child[node_id]
+        terminals = ''.join(chr(self._labels[c])
+                            for c in range(start, start + self._child_count[node_id])
+                            if not self._child_count[c])
+
+        table = MoveTable(moves[:wins], moves[wins:],
+                          moves[wins:wins + self._best_count[node_id]], terminals)
+        self._move_cache[node_id] = table
+        return table
+
+
+    def calculate_hint_tables(self, ranks=None):
+        """Indexes the values of the trie for hints, calculating
+        heights first if needed. See Trie.calculate_hint_tables().
+
+        Values are numbered in sorted order, and leaf_nodes maps each
+        number back to its node. Per node, the arrays leaf_start,
+        leaf_count and deepest_leaf hold the same fields as TrieNode,
+        and common_leaves holds HINT_CACHE_SIZE entries per node,
+        padded with -1.
+        """
+        if ranks is not None:
+            self._ranks = ranks
+            self._hints_valid = False
+        self.calculate_heights()
+        if self._hints_valid:
+            return
+
+        height = self._height
+        parent = self._parent
+        terminal = self._terminal
+        first_child = self._first_child
+        child_count = self._child_count
+        node_count = len(parent)
+        k = HINT_CACHE_SIZE
+
+        # leaf counts accumulate upwards; children have larger ids
+        leaf_count = array('i', terminal)
+        for node in range(node_count - 1, 0, -1):
+            leaf_count[parent[node]] += leaf_count[node]
+
+        # a node's leaves start after its parent's own value and the
+        # leaves of its earlier siblings, so one forward sweep suffices
+        leaf_start = array('i', [0]) * node_count
+        leaf_nodes = array('i', [0]) * leaf_count[self.ROOT]
+        for node in range(node_count):
+            offset = leaf_start[node]
+            if terminal[node]:
+                leaf_nodes[offset] = node
+                offset += 1
+            for c in range(first_child[node], first_child[node] + child_count[node]):
+                leaf_start[c] = offset
+                offset += leaf_count[c]
+
+        unranked = len(self._ranks)
+        if self._ranks:
+            leaf_ranks = [self._ranks.get(self.word(n), unranked) for n in leaf_nodes]
+        else:
+            leaf_ranks = [unranked] * len(leaf_nodes)
+        keys = [(rank, self._depth[n], i) for i, (rank, n) in enumerate(zip(leaf_ranks, leaf_nodes))]
+
+        deepest_leaf = array('i', [-1]) * node_count
+        common_leaves = array('i', [-1]) * (node_count * k)
+        for node in range(node_count - 1, -1, -1):
+            start = first_child[node]
+            end = start + child_count[node]
+
+            if start == end:
+                if terminal[node]:
+                    deepest_leaf[node] = leaf_start[node]
+            else:
+                highest = start
+                for c in range(start + 1, end):
+                    if height[c] > height[highest]:
+                        highest = c
+                deepest_leaf[node] = deepest_leaf[highest]
+
+            candidates = [leaf_start[node]] if terminal[node] else []
+            for c in range(start, end):
+                candidates.extend(i for i in common_leaves[c * k:(c + 1) * k] if i >= 0)
+            best = sorted(candidates, key=keys.__getitem__)[:k]
+            common_leaves[node * k:node * k + len(best)] = array('i', best)
+
+        self._leaf_start = leaf_start
+        self._leaf_count = leaf_count
+        self._deepest_leaf = deepest_leaf
+        self._leaf_nodes = leaf_nodes
+        self._common_leaves = common_leaves
+        self._hint_size = k
+        self._hints_valid = True
+
+
+    def leaf(self, index):
+        """Returns the value with the given number (see calculate_hint_tables())."""
+        return self.word(self._leaf_nodes[index])
+
+
+    def word(self, node_id):
+        """Returns the string spelled by the path to the given node."""
+        labels = self._labels
+        parent = self._parent
+        letters = []
+        while node_id > self.ROOT:
+            letters.append(chr(labels[node_id]))
+            node_id = parent[node_id]
+        return ''.join(reversed(letters))
+
+
+    def words(self):
+        """Yields every value stored in the trie, in sorted order."""
+        self._ensure_built()
+        return self._iter_words()
+
+
+    @classmethod
+    def open_snapshot(cls, filename):
+        """Memory-maps a snapshot written by write_snapshot().
+
+        The node arrays are read directly from the mapping, so loading
+        is independent of the dictionary size and the pages are shared
+        between all processes that open the same file.
+
+        Raises:
+            ValueError if the file is not a snapshot of a supported
+            version, or is shorter than its header says.
+        """
+        with open(filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(buffer)
+
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Creates a read-only trie backed by the given snapshot buffer."""
+        if len(buffer) < _SNAPSHOT_HEADER.size:
+            raise ValueError("Buffer is too small to hold a trie snapshot.")
+
+        magic, version, little_endian, node_count, move_bytes, leaf_total, hint_size = \
+            _SNAPSHOT_HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Buffer does not contain a trie snapshot.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported trie snapshot version {version} "
+                             f"(expected {SNAPSHOT_VERSION}).")
+        if bool(little_endian) != (sys.byteorder == 'little'):
+            raise ValueError("Trie snapshot was written with a different byte order.")
+
+        offset = _SNAPSHOT_HEADER.size + _padding(_SNAPSHOT_HEADER.size)
+        lengths = {'node': node_count, 'leaf': leaf_total, 'hint': node_count * hint_size}
+        sizes = [lengths[length] * array(typecode).itemsize for _, typecode, length in _SNAPSHOT_ARRAYS]
+        expected = offset + sum(size + _padding(size) for size in sizes + [node_count]) + move_bytes
+        if len(buffer) < expected:
+            raise ValueError(f"Trie snapshot is truncated ({len(buffer)} of {expected} bytes).")
+
+        trie = cls.__new__(cls)
+        view = memoryview(buffer)
+
+        for (name, typecode, _), size in zip(_SNAPSHOT_ARRAYS, sizes):
+            setattr(trie, name, view[offset:offset + size].cast(typecode))
+            offset += size + _padding(size)
+
+        # labels are searched with bytes.find(), which memoryview lacks,
+        # so they are the one section copied out of the mapping
+        trie._labels = bytes(view[offset:offset + node_count])
+        offset += node_count + _padding(node_count)
+        trie._move_letters = view[offset:offset + move_bytes]
+
+        trie._buffer = buffer
+        trie._pending = []
+        trie.generation = 0
+        trie._hint_size = hint_size
+        trie._ranks = {}
+        trie._heights_valid = True
+        trie._moves_valid = True
+        trie._hints_valid = True
+        trie._move_cache = {}
+        return trie
+
+
+    def write_snapshot(self, f):
+        """Writes the trie, including heights, move tables and hint
+        tables, to the given binary file object in the format read by
+        open_snapshot(). Call calculate_hint_tables() with word ranks
+        first for the common completions to be ranked."""
+        self.calculate_move_tables()
+        self.calculate_hint_tables()
+
+        node_count = len(self._parent)
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                      int(sys.byteorder == 'little'),
+                                      node_count, len(self._move_letters),
+                                      len(self._leaf_nodes), self._hint_size))
+        f.write(bytes(_padding(_SNAPSHOT_HEADER.size)))
+
+        sections = [bytes(getattr(self, name)) for name, _, _ in _SNAPSHOT_ARRAYS]
+        sections += [bytes(self._labels), bytes(self._move_letters)]
+        for section in sections:
+            f.write(section)
+            f.write(bytes(_padding(len(section))))
+
+
+    def nbytes(self):
+        """Approximate size in bytes of the node arrays."""
+        self._ensure_built()
+        arrays = [self._parent, self._first_child, self._child_count,
+                  self._depth, self._height, self._terminal]
+        size = len(self._labels)
+        if self._moves_valid:
+            arrays += [self._move_offset, self._win_count, self._lose_count, self._best_count]
+            size += len(self._move_letters)
+        if self._hints_valid:
+            arrays += [self._leaf_start, self._leaf_count, self._deepest_leaf,
+                       self._leaf_nodes, self._common_leaves]
+        return size + sum(len(a) * a.itemsize for a in arrays)
+
+
+    def _iter_words(self):
+        # depth-first walk over the label ranges yields sorted output
+        stack = [self.ROOT]
+        while stack:
+            node = stack.pop()
+            if self._terminal[node]:
+                yield self.word(node)
+            start = self._first_child[node]
+            stack.extend(range(start + self._child_count[node] - 1, start - 1, -1))
+
+
+    def _ensure_built(self):
+        if self._pending:
+            words = set(self._pending)
+            words.update(self._iter_words())
+            self._pending = []
+            self._build(sorted(words))
+
+
+    def _build(self, words):
+        """Lays out the given sorted, de-duplicated words breadth first."""
+        labels = bytearray([0])
+        parent = array('i', [-1])
+        first_child = array('i')
+        child_count = array('B')
+        depth = array('H', [0])
+        terminal = array('B', [0])
+
+        # Every node corresponds to the range of words sharing its
+        # prefix. Ranges are expanded in id order, which is also the
+        # order in which they were appended.
+        range_lo = array('i', [0])
+        range_hi = array('i', [len(words)])
+        node = 0
+        while node < len(range_lo):
+            lo = range_lo[node]
+            hi = range_hi[node]
+            d = depth[node]
+
+            if lo < hi and len(words[lo]) == d:
+                terminal[node] = 1
+                lo += 1
+
+            first_child.append(len(parent))
+            count = 0
+            while lo < hi:
+                letter = words[lo][d]
+                end = lo + 1
+                while end < hi and words[end][d] == letter:
+                    end += 1
+
+                code = ord(letter)
+                if code > 255:
+                    raise ValueError(f"Unsupported character in trie value: {letter!r}")
+                labels.append(code)
+                parent.append(node)
+                depth.append(d + 1)
+                terminal.append(0)
+                range_lo.append(lo)
+                range_hi.append(end)
+                count += 1
+                lo = end
+
+            child_count.append(count)
+            node += 1
+
+        self._labels = bytes(labels)
+        self._parent = parent
+        self._first_child = first_child
+        self._child_count = child_count
+        self._depth = depth
+        self._terminal = terminal
+        self._height = array('h', [-1]) * len(parent)
+        self._heights_valid = False
+        self._moves_valid = False
+        self._hints_valid = False
+        self._move_cache = {}
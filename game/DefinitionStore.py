@@ -0,0 +1,146 @@
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+import json
+import mmap
+import struct
+import sys
+import threading
+
+# Index file layout (see DefinitionStore.write):
+#   header: magic, format version, byte order, entry count, key bytes
+#   value offsets - uint64 * (count + 1) into the value blob
+#   key offsets   - uint32 * (count + 1) into the key blob
+#   key blob      - UTF-8 keys, sorted by their encoded bytes
+#   value blob    - UTF-8 JSON encoding of each value
+INDEX_MAGIC = b'GHSTDEFS'
+INDEX_VERSION = 1
+
+_INDEX_HEADER = struct.Struct('<8sIIIQ4x')
+_MISSING = object()
+
+
+class DefinitionStore(Mapping):
+    """Read-only mapping from words to definitions backed by an
+    offset-indexed file.
+
+    The file is memory-mapped, so opening it costs the same no matter
+    how many definitions it holds, and only the entries that are
+    actually looked up are decoded. Decoded values (and misses) are
+    kept in an LRU cache of at most `cache_size` entries.
+    """
+
+    def __init__(self, buffer, cache_size=1024):
+        if len(buffer) < _INDEX_HEADER.size:
+            raise ValueError("Buffer is too small to hold a definitions index.")
+
+        magic, version, little_endian, count, key_bytes = _INDEX_HEADER.unpack_from(buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Buffer does not contain a definitions index.")
+        if version != INDEX_VERSION:
+            raise ValueError(f"Unsupported definitions index version {version} "
+                             f"(expected {INDEX_VERSION}).")
+        if bool(little_endian) != (sys.byteorder == 'little'):
+            raise ValueError("Definitions index was written with a different byte order.")
+
+        view = memoryview(buffer)
+        offset = _INDEX_HEADER.size
+        self._value_offsets = view[offset:offset + 8 * (count + 1)].cast('Q')
+        offset += 8 * (count + 1)
+        self._key_offsets = view[offset:offset + 4 * (count + 1)].cast('I')
+        offset += 4 * (count + 1)
+        self._keys = view[offset:offset + key_bytes]
+        self._values = view[offset + key_bytes:]
+
+        self._buffer = buffer
+        self._count = count
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def open(cls, filename, cache_size=1024):
+        """Memory-maps an index written by DefinitionStore.write()."""
+        with open(filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, cache_size)
+
+
+    @staticmethod
+    def write(items, f):
+        """Writes (word, definition) pairs to the given binary file
+        object in the format read by DefinitionStore.open()."""
+        entries = sorted((str(key).encode('utf-8'), json.dumps(value).encode('utf-8'))
+                         for key, value in items)
+
+        key_offsets = array('I', [0])
+        value_offsets = array('Q', [0])
+        for key, value in entries:
+            key_offsets.append(key_offsets[-1] + len(key))
+            value_offsets.append(value_offsets[-1] + len(value))
+
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION,
+                                   int(sys.byteorder == 'little'),
+                                   len(entries), key_offsets[-1]))
+        f.write(bytes(value_offsets))
+        f.write(bytes(key_offsets))
+        for key, _ in entries:
+            f.write(key)
+        for _, value in entries:
+            f.write(value)
+
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is not _MISSING:
+                self._cache.move_to_end(key)
+        if value is _MISSING:
+            value = self._lookup(key)
+            with self._lock:
+                self._cache[key] = value
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+    def __len__(self):
+        return self._count
+
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key(i).decode('utf-8')
+
+
+    def nbytes(self):
+        """Size in bytes of the index (the mapped file, if opened from
+        one). The decoded entries in the cache are not counted."""
+        return len(self._buffer)
+
+
+    def _key(self, i):
+        return bytes(self._keys[self._key_offsets[i]:self._key_offsets[i + 1]])
+
+
+    def _lookup(self, key):
+        """Binary search over the sorted keys. Returns None if absent."""
+        if not isinstance(key, str):
+            return None
+        target = key.encode('utf-8')
+
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == self._count or self._key(lo) != target:
+            return None
+        return json.loads(str(self._values[self._value_offsets[lo]:self._value_offsets[lo + 1]], 'utf-8'))
@@ -0,0 +1,558 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import weakref
+
+logger = logging.getLogger("ghostAppLogger")
+
+# Registries with a watcher to restart in child processes after a fork
+_watching = weakref.WeakSet()
+
+
+def _restart_watchers():
+    for registry in list(_watching):
+        registry._start_watcher()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_watchers)
+
+
+def rss_bytes():
+    """Resident memory of this process. Falls back to the peak when
+    /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer(object):
+    """Records how long each stage of a load takes:
+
+        timer = StageTimer()
+        with timer('trie'):
+            trie = load_trie(name)
+
+    `seconds` maps each stage to its duration, in the order they ran.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = time.perf_counter() - start
+
+
+class Dictionary(object):
+    """One loaded version of the word list and definitions.
+
+    A Dictionary is never modified once it is published, so a request
+    (or a game session) that holds on to one can keep using it while
+    newer versions are loaded.
+
+    Attributes:
+        version (int) - 1 for the dictionary loaded at start-up, and
+            one more for every reload (or load after an eviction)
+        game (GhostGame)
+        definitions (dict or DefinitionStore)
+        superghost (SuperghostGame or None)
+        client_trie (str or None) - file name of the trie sent to the
+            browser (see ClientTrie)
+        build_seconds (float) - time taken to load this version
+        stage_seconds (dict) - time taken by each stage of the load,
+            if the loader recorded them (see StageTimer)
+        rss_delta_bytes (int) - change in resident memory while loading
+        size_bytes (int) - estimated memory taken by this version (see
+            nbytes()), set when DictionaryLibrary first counts it
+            against its budget
+    """
+
+    def __init__(self, game, definitions, superghost=None, client_trie=None):
+        self.game = game
+        self.definitions = definitions
+        self.superghost = superghost
+        self.client_trie = client_trie
+
+        # set by the loader
+        self.stage_seconds = {}
+
+        # set by DictionaryRegistry when the version is published
+        self.version = None
+        self.build_seconds = None
+        self.rss_delta_bytes = None
+        # set by DictionaryLibrary
+        self.size_bytes = None
+
+
+    def nbytes(self):
+        """Estimates the memory taken by this version: the arrays (or
+        nodes) of its trie and Superghost index, and its definitions
+        index or, if they were read from JSON, its definitions.
+
+        Unlike rss_delta_bytes this only counts the dictionary's own
+        data, so it does not depend on what else the process allocated
+        while loading it or whether the allocator returned memory."""
+        size = 0
+        if self.game is not None:
+            size += self.game.wordlist.nbytes()
+        if self.superghost is not None:
+            size += self.superghost.index.nbytes()
+        if hasattr(self.definitions, 'nbytes'):
+            size += self.definitions.nbytes()
+        else:
+            size += sys.getsizeof(self.definitions) + sum(
+                sys.getsizeof(word) + sys.getsizeof(definition) for word, definition in self.definitions.items())
+        return size
+
+
+class DictionaryRegistry(object):
+    """Holds the current Dictionary and replaces it on reload.
+
+    New versions are built by calling `loader()` on a background
+    thread, so requests keep being served from the current version in
+    the meantime. Publishing a version is a single reference swap:
+    callers read `current` once and use that Dictionary throughout.
+
+    reload() can be called directly, or watch() can poll the given
+    files and reload when they change.
+    """
+
+    def __init__(self, loader, initial=None, versions=0):
+        """
+        Args:
+            loader - callable returning a new Dictionary
+            initial (Dictionary) - the first version; loaded with
+            `loader` (synchronously) if omitted
+            versions (int) - versions published before this registry,
+            so that version numbers keep increasing when a dictionary
+            is loaded again
+        """
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._building = False
+        self._pending = False
+        self._watch_paths = ()
+        self._watch_trigger = None
+        self._watch_interval = None
+        self._watcher = None
+        self._watch_stop = None
+
+        self.current = None
+        self.versions = versions
+        self._publish(initial if initial is not None else self._build())
+
+
+    def add_listener(self, listener):
+        """Calls `listener(dictionary)` for the current version and for
+        every version published from now on."""
+        self._listeners.append(listener)
+        listener(self.current)
+
+
+    def reload(self):
+        """Starts building a new version in the background.
+
+        If a build is already running, another one is started as soon
+        as it finishes, so that changes made during a build are not
+        missed. Returns the thread doing the work, or None if the
+        request was folded into a running build.
+        """
+        with self._lock:
+            if self._building:
+                self._pending = True
+                return None
+            self._building = True
+
+        thread = threading.Thread(target=self._reload, name='dictionary-reload', daemon=True)
+        thread.start()
+        return thread
+
+
+    def watch(self, paths, interval, trigger=None):
+        """Polls the modification times of `paths` every `interval`
+        seconds and reloads once they change and then hold still for
+        one interval (so half-written files are not loaded).
+
+        While the file `trigger` exists, only it is polled: whoever
+        rewrites `paths` writes to it once they are all in place, so a
+        rebuild that writes several files reloads once. An empty
+        trigger holds reloads off, and deleting it does not reload.
+
+        The polling thread is restarted in child processes after a
+        fork, so this may be called before gunicorn forks its workers.
+        """
+        self._watch_paths = tuple(paths)
+        self._watch_trigger = trigger
+        self._watch_interval = interval
+        _watching.add(self)
+        self._start_watcher()
+
+
+    def stop_watching(self):
+        """Stops polling, here and in processes forked from now on."""
+        _watching.discard(self)
+        self.pause_watching()
+
+
+    def pause_watching(self):
+        """Stops polling in this process only; child processes forked
+        afterwards still start their own watcher."""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+
+
+    def _start_watcher(self):
+        self.pause_watching()
+        self._watch_stop = threading.Event()
+        # taken here, so changes made once this returns are seen
+        seen = self._fingerprint()
+        self._watcher = threading.Thread(target=self._watch, args=(self._watch_stop, seen),
+                                         name='dictionary-watcher', daemon=True)
+        self._watcher.start()
+
+
+    def _watch(self, stop, seen):
+        changed = None
+        while not stop.wait(self._watch_interval):
+            fingerprint = self._fingerprint()
+            if fingerprint != seen and fingerprint == changed:
+                triggered, stats = fingerprint
+                if triggered and stats is not None or not triggered and not seen[0]:
+                    logger.info("Dictionary files changed; reloading.")
+                    self.reload()
+                seen = fingerprint
+            changed = fingerprint
+
+
+    def _fingerprint(self):
+        """(True, stat of the trigger, or None while it is empty) while
+        the trigger exists, or else (False, stats of the polled files)."""
+        trigger = self._stat(self._watch_trigger) if self._watch_trigger is not None else None
+        if trigger is not None:
+            return (True, trigger if trigger[1] else None)
+        return (False, tuple(self._stat(filename) for filename in self._watch_paths))
+
+
+    @staticmethod
+    def _stat(filename):
+        try:
+            stat = os.stat(filename)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
+
+
+    def _reload(self):
+        while True:
+            try:
+                self._publish(self._build())
+            except Exception:
+                logger.exception("Could not load a new dictionary version; keeping "
+                                 f"version {self.current.version}.")
+
+            with self._lock:
+                if not self._pending:
+                    self._building = False
+                    return
+                self._pending = False
+
+
+    def _build(self):
+        rss = rss_bytes()
+        start = time.perf_counter()
+        dictionary = self._loader()
+        dictionary.build_seconds = time.perf_counter() - start
+        dictionary.rss_delta_bytes = rss_bytes() - rss
+        return dictionary
+
+
+    def _publish(self, dictionary):
+        with self._lock:
+            self.versions += 1
+            dictionary.version = self.versions
+            self.current = dictionary
+
+        if dictionary.build_seconds is not None:
+            stages = ', '.join(f"{stage} {seconds:.3f} s" for stage, seconds in dictionary.stage_seconds.items())
+            logger.info(f"Dictionary version {dictionary.version} loaded in "
+                        f"{dictionary.build_seconds:.3f} s "
+                        f"({dictionary.rss_delta_bytes / 2 ** 20:+.1f} MB resident)"
+                        + (f": {stages}." if stages else "."))
+        for listener in self._listeners:
+            listener(dictionary)
+
+
+class DictionaryLibrary(object):
+    """Named dictionaries, each loaded on first use into its own
+    DictionaryRegistry.
+
+    The size of each loaded dictionary is estimated (see
+    Dictionary.nbytes()), and once the loaded dictionaries add up to
+    more than `budget_bytes` the least recently used ones are dropped
+    (games in progress on them still finish). A budget of 0 means no
+    limit.
+
+    stats[name] counts the loads, hits (requests served by an already
+    loaded dictionary) and evictions of every dictionary. Versions are
+    numbered across evictions, so a (name, version) pair identifies one
+    load of a dictionary for the life of the process.
+    """
+
+    def __init__(self, loader, names, budget_bytes=0, watched_paths=None, watch_interval=0,
+                 reload_trigger=None):
+        """
+        Args:
+            loader - callable taking a name and returning a new Dictionary
+            names - the names that may be loaded
+            budget_bytes (int) - memory budget for all loaded dictionaries
+            watched_paths - optional callable taking a name and returning
+            the files to watch for changes (see DictionaryRegistry.watch)
+            watch_interval (float) - seconds between checks; 0 disables
+            reload_trigger - optional callable taking a name and
+            returning the trigger file of its watcher
+        """
+        self._loader = loader
+        self.names = tuple(names)
+        self.budget_bytes = budget_bytes
+        self._watched_paths = watched_paths
+        self._watch_interval = watch_interval
+        self._reload_trigger = reload_trigger
+
+        self._registries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.names}
+        self._listeners = []
+        # versions published by evicted registries
+        self._versions = {name: 0 for name in self.names}
+        self.stats = {name: {'loads': 0, 'hits': 0, 'evictions': 0} for name in self.names}
+
+
+    def __contains__(self, name):
+        return name in self._load_locks
+
+
+    def is_loaded(self, name):
+        return name in self._registries
+
+
+    def add_listener(self, listener):
+        """Calls `listener(event, name, registry)` after every 'load',
+        'hit' and 'evict'."""
+        self._listeners.append(listener)
+
+
+    def current(self, name):
+        """Returns the current Dictionary for `name`, loading it first
+        if needed. Raises KeyError for unknown names."""
+        return self.get(name).current
+
+
+    def get(self, name):
+        """Returns the DictionaryRegistry for `name`, loading it first
+        if needed. Raises KeyError for unknown names."""
+        with self._lock:
+            registry = self._registries.get(name)
+            if registry is not None:
+                self._registries.move_to_end(name)
+                self.stats[name]['hits'] += 1
+        if registry is not None:
+            self._notify('hit', name, registry)
+            return registry
+
+        # loads of different dictionaries may run at the same time
+        with self._load_locks[name]:
+            registry = self._registries.get(name)
+            if registry is not None:
+                return registry
+
+            registry = DictionaryRegistry(lambda: self._loader(name), versions=self._versions[name])
+            if self._watch_interval > 0 and self._watched_paths is not None:
+                trigger = self._reload_trigger(name) if self._reload_trigger is not None else None
+                registry.watch(self._watched_paths(name), self._watch_interval, trigger)
+
+            with self._lock:
+                self._registries[name] = registry
+                self.stats[name]['loads'] += 1
+                evicted = self._evict(keep=name)
+
+        self._notify('load', name, registry)
+        for evicted_name, evicted_registry in evicted:
+            evicted_registry.stop_watching()
+            logger.info(f"Evicted dictionary '{evicted_name}' to stay within the memory budget.")
+            self._notify('evict', evicted_name, evicted_registry)
+        return registry
+
+
+    def loaded(self, name):
+        """Returns the current Dictionary for `name` if it is loaded,
+        or None, without loading it or counting a hit."""
+        registry = self._registries.get(name)
+        return registry.current if registry is not None else None
+
+
+    def pause_watching(self):
+        """Stops the watchers of every loaded dictionary in this
+        process. See DictionaryRegistry.pause_watching()."""
+        for registry in list(self._registries.values()):
+            registry.pause_watching()
+
+
+    def size_bytes(self, name):
+        """Estimated size of the current version of `name`, or 0 if it
+        is not loaded."""
+        registry = self._registries.get(name)
+        if registry is None:
+            return 0
+        dictionary = registry.current
+        if dictionary.size_bytes is None:
+            dictionary.size_bytes = dictionary.nbytes()
+        return dictionary.size_bytes
+
+
+    def _evict(self, keep):
+        """Drops least recently used dictionaries other than `keep`
+        until the rest fit in the budget. Returns (name, registry) for
+        each one dropped."""
+        evicted = []
+        if not self.budget_bytes:
+            return evicted
+
+        total = sum(self.size_bytes(name) for name in self._registries)
+        for name in list(self._registries):
+            if total <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self.size_bytes(name)
+            registry = self._registries.pop(name)
+            self._versions[name] = registry.versions
+            evicted.append((name, registry))
+            self.stats[name]['evictions'] += 1
+        return evicted
+
+
+    def _notify(self, event, name, registry):
+        for listener in self._listeners:
+            listener(event, name, registry)
+
+
+class DictionaryWarmup(object):
+    """Loads dictionaries into a DictionaryLibrary on a background
+    thread, so that a worker has them in place before its first
+    request instead of loading them during it.
+
+    Requests that arrive in the meantime wait for the load of their
+    dictionary as they would without a warmup; `state` tells a load
+    balancer when to start sending them.
+
+    Attributes:
+        state (str) - 'idle', 'loading', 'ready' (every dictionary
+            loaded) or 'failed'
+        error (str or None) - why the last warmup failed
+        seconds (float or None) - time taken by the last warmup
+    """
+
+    IDLE = 'idle'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, library, names):
+        """
+        Args:
+            library (DictionaryLibrary)
+            names - the dictionaries to load, in order
+        """
+        self.library = library
+        self.names = tuple(names)
+        self.state = self.IDLE
+        self.error = None
+        self.seconds = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+
+    @property
+    def ready(self):
+        return self.state == self.READY
+
+
+    def start(self):
+        """Starts the warmup, unless it is running or has finished.
+        A warmup that failed is started again.
+
+        Returns the thread doing the work, or None.
+        """
+        with self._lock:
+            if self.state in (self.LOADING, self.READY):
+                return None
+            self.state = self.LOADING
+            self._done.clear()
+
+        thread = threading.Thread(target=self._run, name='dictionary-warmup', daemon=True)
+        thread.start()
+        return thread
+
+
+    def wait(self, timeout=None):
+        """Waits for a started warmup to finish. Returns True if every
+        dictionary is loaded."""
+        if self.state == self.LOADING:
+            self._done.wait(timeout)
+        return self.ready
+
+
+    def status(self):
+        """The state of the warmup and the load stages of each of its
+        dictionaries that is loaded, as a JSON-serializable dict."""
+        dictionaries = {}
+        for name in self.names:
+            dictionary = self.library.loaded(name)
+            if dictionary is not None:
+                dictionaries[name] = {
+                    'version': dictionary.version,
+                    'build_seconds': dictionary.build_seconds,
+                    'stage_seconds': dictionary.stage_seconds,
+                }
+        return {
+            'status': self.state,
+            'seconds': self.seconds,
+            'error': self.error,
+            'dictionaries': dictionaries,
+        }
+
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            for name in self.names:
+                self.library.get(name)
+        except Exception as e:
+            logger.exception("Dictionary warmup failed.")
+            self.error = f"{type(e).__name__}: {e}"
+            state = self.FAILED
+        else:
+            self.error = None
+            state = self.READY
+        self.seconds = time.perf_counter() - start
+        if state == self.READY:
+            logger.info(f"Warmed up {', '.join(self.names)} in {self.seconds:.3f} s.")
+
+        with self._lock:
+            self.state = state
+        self._done.set()
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import secrets
+import threading
+import time
+
+
+class GameSession(object):
+    """Server-side state of a single game in progress.
+
+    Attributes:
+        token (str) - identifier handed to the client
+        word (str) - current state of the game, as the server played it
+        node - trie node for `word`, so that the next move only needs
+            to follow one edge instead of searching from the root
+        dictionary - the Dictionary version the game started with;
+            `node` belongs to its trie, so the whole game is played
+            on it even if a newer version is loaded meanwhile
+        difficulty (str) - the CPU opponent chosen when the game
+            started (one of GhostStrategies.DIFFICULTIES), or None
+            for the default
+    """
+
+    def __init__(self, token, word, node, dictionary=None, difficulty=None):
+        self.token = token
+        self.word = word
+        self.node = node
+        self.dictionary = dictionary
+        self.difficulty = difficulty
+
+    def advance(self, letters):
+        """Appends the given letters to the word, following the trie
+        edges from the current node. The node becomes None as soon as
+        the word leaves the trie."""
+        node = self.node
+        for letter in letters:
+            if node is None:
+                break
+            node = node.child(letter)
+        self.word += letters
+        self.node = node
+
+
+class GameSessionStore(object):
+    """In-process store of GameSessions.
+
+    Sessions expire `ttl` seconds after they were last used, and the
+    least recently used session is evicted once more than `capacity`
+    are held. Sessions are local to the process that created them;
+    callers should treat a missing session as a cache miss and rebuild
+    the state from scratch.
+    """
+
+    def __init__(self, ttl=1800, capacity=10000):
+        self.ttl = ttl
+        self.capacity = capacity
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+    def create(self, word, node, dictionary=None, difficulty=None):
+        """Starts a new session at the given word and trie node."""
+        session = GameSession(secrets.token_urlsafe(16), word, node, dictionary, difficulty)
+        with self._lock:
+            self._sessions[session.token] = (session, time.monotonic() + self.ttl)
+            self._evict()
+        return session
+
+
+    def get(self, token):
+        """Returns the live session for `token`, or None if it is
+        unknown or has expired. Looking a session up renews its TTL."""
+        if not token:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            session, expires = entry
+            if expires < now:
+                del self._sessions[token]
+                return None
+            self._sessions[token] = (session, now + self.ttl)
+            self._sessions.move_to_end(token)
+        return session
+
+
+    def discard(self, token):
+        """Ends the session for `token`, if there is one."""
+        with self._lock:
+            self._sessions.pop(token, None)
+
+
+    def _evict(self):
+        now = time.monotonic()
+        # entries are ordered by last use, so expired ones come first
+        while self._sessions:
+            _, (_, expires) = next(iter(self._sessions.items()))
+            if expires >= now and len(self._sessions) <= self.capacity:
+                break
+            self._sessions.popitem(last=False)
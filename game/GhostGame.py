@@ -1,38 +1,98 @@
 import random
 
 from .Trie import TRIE_BRANCH
-from .GhostStrategies import RandomWinBestEffortLossStrat
+from .GhostSolver import GhostSolver
+from .GhostStrategies import (DIFFICULTIES, FrequencyWeightedStrat, RandomWinBestEffortLossStrat, SolvedStrat,
+                              SuperghostStrat)
+from .Suggester import Suggester
+
+# Kinds of hint served by GhostGame.get_hints()
+HINT_RANDOM = 'random'
+HINT_LONGEST = 'longest'
+HINT_COMMON = 'common'
+HINT_MODES = (HINT_RANDOM, HINT_LONGEST, HINT_COMMON)
 
 class GhostMove(object):
     """Describes a move being made by a CPU player.
     In the case where the CPU player has not made
     a move because the previous player's move put the game
     into a completed state, the `word` field is None.
+
+    The `node` field holds the trie node reached by `word`
+    (None if `word` is None or not in the trie), so that callers
+    can continue the game from it without searching the trie again.
     """
     
-    def __init__(self, is_game_over, word, is_real_word=True):
+    def __init__(self, is_game_over, word, is_real_word=True, node=None):
         self.is_game_over = is_game_over
         self.word = word
         self.is_real_word = is_real_word
+        self.node = node
+
+    def as_dict(self):
+        """JSON-serializable form of the move (without the node)."""
+        return {
+            'word': self.word,
+            'is_game_over': self.is_game_over,
+            'is_real_word': self.is_real_word,
+        }
 
 
 class GhostGame(object):
-    def __init__(self, wordlist):
+    def __init__(self, wordlist, ranks=None, players=2):
         """
         Args:
-            wordlist (Trie)
+            wordlist (Trie or CompactTrie)
+            ranks (dict) - optional frequency rank of each word (lower
+            is more common), used to pick the most common completions
+            for hints. Snapshots loaded from disk already carry them.
+            players (int) - number of players taking turns. Games with
+            more than two players are solved ahead of time with a
+            GhostSolver, since the move tables assume two.
+
+        Two-player games can also be played against the
+        FrequencyWeightedStrat of each of DIFFICULTIES; see
+        make_move().
         """
         self.wordlist = wordlist
         self.wordlist.calculate_heights()
+        self.wordlist.calculate_move_tables()
+        self.wordlist.calculate_hint_tables(ranks)
+        self.suggester = Suggester(wordlist)
 
-        self.strategy = RandomWinBestEffortLossStrat()
+        self.players = players
+        if players == 2:
+            self.solver = None
+            self.strategy = RandomWinBestEffortLossStrat()
+            self.strategies = {difficulty: FrequencyWeightedStrat(wordlist, difficulty)
+                               for difficulty in DIFFICULTIES}
+        else:
+            self.solver = GhostSolver(wordlist, players)
+            self.solver.solve()
+            self.strategy = SolvedStrat(self.solver)
+            # difficulties are only defined for two players
+            self.strategies = {}
     
 
-    def make_move(self, current_word):
+    def get_strategy(self, difficulty=None):
+        """Returns the strategy for `difficulty` (one of DIFFICULTIES),
+        or the default strategy if it is None or the game has more
+        than two players. Raises ValueError for unknown difficulties."""
+        if difficulty is None:
+            return self.strategy
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"Unknown difficulty {difficulty!r}.")
+        return self.strategies.get(difficulty, self.strategy)
+
+
+    def make_move(self, current_word, node=None, difficulty=None):
         """Selects a move to be played next, given the current word.
         
         Args:
             current_word (str) - Current state of the game
+            node - Trie node for current_word, if the caller already
+            has it. When omitted the word is looked up in the trie.
+            difficulty (str) - see get_strategy()
         
         Returns:
             None if the current word represents an end state
@@ -41,7 +101,8 @@ class GhostGame(object):
             next word to be played in the game.
         """
 
-        node = self.wordlist.find(current_word)
+        if node is None:
+            node = self.wordlist.find(current_word)
 
         # game is finished
         if node is None:
@@ -51,42 +112,84 @@ class GhostGame(object):
         elif node.value != TRIE_BRANCH:
             # word is a leaf (it's a real word)
             return GhostMove(True, None, True)
-        
-        winners = {}
-        losers = {}
-
-        # sort the children into winners and losers
-        for letter in node.children:
-            child = node.children[letter]
-            if child.height % 2 == 0:
-                losers[letter] = child
-            else:
-                winners[letter] = child
-
-        suffix = self.strategy.get_move(winners, losers)
-
-        # The strategy provider doesn't tell us which list
-        # it got it's selection from, so we have to look it
-        # up again to determine whether the game needs to
-        # continue or not.
-        return self._create_move_obj(current_word, suffix, winners, losers)
+
+        suffix = self.get_strategy(difficulty).get_move(node)
+
+        return self._create_move_obj(current_word, suffix, node)
     
 
-    def _create_move_obj(self, prefix, suffix, winners, losers):
-        word = prefix + suffix
+    def make_moves(self, words, difficulty=None):
+        """Selects the next move for each of the given game states.
 
-        chosen_node = None
+        Equivalent to calling make_move() on every word, but the words
+        are visited in sorted order so that each trie descent starts
+        from the node shared with the previous word, and the random
+        numbers for all moves are drawn in a single pass.
 
-        if suffix in winners:
-            chosen_node = winners[suffix]
-            is_game_over = chosen_node.height == 0
-            
-            return GhostMove(is_game_over, word)
+        Args:
+            words (list of str) - Current states of the games
+            difficulty (str) - see get_strategy()
 
-        elif suffix in losers:
-            chosen_node = losers[suffix]
-            is_game_over = chosen_node.height == 0
-            return GhostMove(is_game_over, word)
+        Returns:
+            A list of GhostMoves in the same order as `words`. Equal
+            moves for equal words may be the same object, so they
+            should be treated as read-only.
+        """
+        order = sorted(range(len(words)), key=words.__getitem__)
+        draws = [random.random() for _ in range(len(words))]
+        moves = [None] * len(words)
+
+        # path[i] is the node for the first i letters of the previous word
+        path = [self.wordlist.root]
+        previous = None
+        get_move = self.get_strategy(difficulty).get_move
+
+        for i in order:
+            word = words[i]
+
+            if word != previous:
+                if previous is not None and word.startswith(previous):
+                    common = len(previous)
+                else:
+                    common = 0
+                    limit = min(len(word), len(previous or ''))
+                    while common < limit and word[common] == previous[common]:
+                        common += 1
+                del path[common + 1:]
+
+                node = path[-1]
+                for letter in word[len(path) - 1:]:
+                    node = node.child(letter)
+                    if node is None:
+                        break
+                    path.append(node)
+                previous = word
+                is_branch = node is not None and node.value == TRIE_BRANCH
+                if is_branch:
+                    replies = {}
+                else:
+                    reply = GhostMove(True, None, node is not None)
+
+            if is_branch:
+                # games in the same state that receive the same letter
+                # share one (read-only) GhostMove
+                suffix = get_move(node, draws[i])
+                reply = replies.get(suffix)
+                if reply is None:
+                    reply = replies[suffix] = self._create_move_obj(word, suffix, node)
+            moves[i] = reply
+
+        return moves
+
+
+    def _create_move_obj(self, prefix, suffix, node):
+        word = prefix + suffix
+        moves = node.moves
+
+        if len(suffix) == 1 and suffix in moves.letters:
+            # the game ends when nothing can follow the letter
+            is_game_over = suffix in moves.terminals
+            return GhostMove(is_game_over, word, node=node.child(suffix))
 
         else:
             # strategy chose a non-real word
@@ -95,13 +198,17 @@ class GhostGame(object):
 
     def get_leaf_node(self, current_word):
         """Provided a current word that lies somewhere on the trie,
-        traverses down a branch until it hits a leaf and returns the 
-        collected path as a single word.
+        returns a word chosen uniformly at random among those that
+        start with it.
 
         Effectively, this can be used as a "hint" mechanism. Given that
         the game is in the state "current_word", the random choice 
         of leaf node provides at least one possibility for extending gameplay.
 
+        The words below every node occupy a contiguous range of the
+        trie's sorted leaves, so the choice is a single random index
+        rather than a walk down the trie.
+
         Args:
             current_word (string) - Current state of the game
         Returns:
@@ -110,6 +217,8 @@ class GhostGame(object):
             Otherwise, returns a string that constitutes a word whose prefix
             is current_word.
         """
+        # the tables are out of date after an insert() or remove()
+        self.wordlist.calculate_hint_tables()
         node = self.wordlist.find(current_word)
 
         if node is None:
@@ -118,12 +227,74 @@ class GhostGame(object):
         elif node.value != TRIE_BRANCH:
             # current word is already a leaf
             return current_word
-        
-        # descend down a random branch down the trie
-        # until we hit a leaf
-        while node.children:
-            next_letter = random.choice(list(node.children.keys()))
-            current_word += next_letter
-            node = node.children.get(next_letter)
-        
-        return current_word
\ No newline at end of file
+
+        return self.wordlist.leaf(node.leaf_start + random.randrange(node.leaf_count))
+
+
+    def get_hints(self, current_word, mode=HINT_RANDOM):
+        """Returns completions of current_word to be shown as hints.
+
+        Args:
+            current_word (string) - Current state of the game
+            mode (string) - one of HINT_MODES:
+                'random' - one word chosen uniformly at random
+                'longest' - the word that keeps the game going the
+                    longest if both players play it out
+                'common' - up to HINT_CACHE_SIZE of the most common
+                    words, most common first
+        Returns:
+            A list of words, empty if current_word is not in the Trie.
+        """
+        if mode == HINT_RANDOM:
+            word = self.get_leaf_node(current_word)
+            return [word] if word is not None else []
+        if mode not in HINT_MODES:
+            raise ValueError(f"Unknown hint mode {mode!r}.")
+
+        self.wordlist.calculate_hint_tables()
+        node = self.wordlist.find(current_word)
+        if node is None:
+            return []
+        if mode == HINT_LONGEST:
+            return [self.wordlist.leaf(node.deepest_leaf)]
+        return [self.wordlist.leaf(i) for i in node.common_leaves]
+
+
+    def get_suggestions(self, word, max_distance=2, limit=5):
+        """Returns up to `limit` prefixes or words of the dictionary
+        within `max_distance` edits of `word`, closest first ("did you
+        mean ...?"). See Suggester.suggest().
+        """
+        return [prefix for prefix, _ in self.suggester.suggest(word, max_distance, limit)]
+
+
+class SuperghostGame(object):
+    """Superghost: each player adds a letter to either end of the
+    fragment, and loses by completing a word or by making a fragment
+    that occurs in no word.
+    """
+
+    def __init__(self, index):
+        """
+        Args:
+            index (SubstringIndex)
+        """
+        self.index = index
+        self.strategy = SuperghostStrat(index)
+        self.strategy.solve()
+
+
+    def make_move(self, fragment):
+        """Selects a move to be played next, given the current fragment.
+
+        Returns:
+            A GhostMove whose `word` is the new fragment, or None if
+            the opposing player has already lost.
+        """
+        if self.index.is_word(fragment):
+            return GhostMove(True, None, True)
+        if not self.index.contains(fragment):
+            return GhostMove(True, None, False)
+
+        word = self.strategy.get_move(fragment)
+        return GhostMove(self.index.is_word(word), word)
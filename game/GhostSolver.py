@@ -0,0 +1,191 @@
+from array import array
+
+from .Trie import TRIE_BRANCH
+from .CompactTrie import CompactTrie
+
+
+class GhostSolver(object):
+    """Solves Ghost for any number of players taking turns.
+
+    The player who completes a word loses the round. At every node the
+    player to move first avoids moves that make them lose; among the
+    safe moves they finish the round as quickly as possible, and when
+    every move loses they drag the round out as long as possible (the
+    two-player rule used by MoveTable). Remaining ties go to the move
+    whose loser comes soonest after the mover, so every node has one
+    well-defined outcome.
+
+    With two players this agrees with minimax on the win/loss of every
+    node, which `height % 2` does not guarantee.
+
+    Results are kept in a transposition table keyed by (node, player
+    to move). A trie has a single path to every node, so a node's
+    result only depends on who is to move relative to the loser; the
+    table stores that relative result once per node and rotates it for
+    the requested player. Entries are filled on first use, or for the
+    whole dictionary at once by solve(). A CompactTrie is always solved
+    as a whole, in one sweep over its node arrays.
+    """
+
+    def __init__(self, wordlist, players=2):
+        """
+        Args:
+            wordlist (Trie or CompactTrie)
+            players (int) - number of players in the game, at least 2
+        """
+        if players < 2:
+            raise ValueError("Ghost needs at least two players.")
+        self.wordlist = wordlist
+        self.players = players
+
+        # node -> (loser, length, letters): the loser counted in turns
+        # after the player to move, the number of letters left to play,
+        # and every letter that reaches that outcome
+        self.table = {}
+
+        # the same fields as flat arrays indexed by node id, with the
+        # letters stored like CompactTrie's move tables
+        self._compact = isinstance(wordlist, CompactTrie)
+        self._arrays = None
+
+
+    def solve(self):
+        """Fills the table for every node of the dictionary."""
+        if self._compact:
+            self._solve_compact()
+        else:
+            self._solve(self.wordlist.root)
+
+
+    def loser(self, node, player=0):
+        """Returns the index of the player who loses from `node`,
+        given that `player` is to move there."""
+        return (player + self._entry(node)[0]) % self.players
+
+
+    def outcomes(self, node, player=0):
+        """Returns a tuple with one entry per player, True for every
+        player who does not lose from `node` when `player` is to move."""
+        loser = self.loser(node, player)
+        return tuple(p != loser for p in range(self.players))
+
+
+    def length(self, node):
+        """Number of letters left to be played from `node`."""
+        return self._entry(node)[1]
+
+
+    def best_moves(self, node):
+        """Letters that the player to move at branch `node` should
+        play. Any of them leads to the same outcome."""
+        return self._entry(node)[2]
+
+
+    def _entry(self, node):
+        if self._compact:
+            if self._arrays is None:
+                self._solve_compact()
+            loser, length, offset, count, letters = self._arrays
+            i = node.id
+            return (loser[i], length[i], str(letters[offset[i]:offset[i] + count[i]], 'latin-1'))
+
+        entry = self.table.get(node)
+        if entry is None:
+            self._solve(node)
+            entry = self.table[node]
+        return entry
+
+
+    def _solve(self, start):
+        """Post-order traversal below `start`, skipping subtrees that
+        are already in the table."""
+        table = self.table
+        players = self.players
+        # a completed word: the player who just moved loses
+        game_over = (players - 1, 0, '')
+
+        stack = [(start, False)]
+        while stack:
+            node, expanded = stack.pop()
+
+            if node.value != TRIE_BRANCH or not node.children:
+                table[node] = game_over
+                continue
+
+            children = node.children
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children.values() if child not in table)
+                continue
+
+            best_key = None
+            letters = []
+            for letter, child in sorted(children.items()):
+                loser, length, _ = table[child]
+                loser = (loser + 1) % players
+                length += 1
+                if loser:
+                    # safe: finish quickly
+                    key = (0, length, loser)
+                else:
+                    # losing: survive as long as possible
+                    key = (1, -length, loser)
+
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best = (loser, length)
+                    letters = [letter]
+                elif key == best_key:
+                    letters.append(letter)
+
+            table[node] = best + (''.join(letters),)
+
+
+    def _solve_compact(self):
+        """Same as _solve() for the whole of a CompactTrie. Children
+        have larger ids than their parents and are stored in letter
+        order, so one reverse sweep visits them first."""
+        trie = self.wordlist
+        players = self.players
+        labels = trie._labels
+        terminal = trie._terminal
+        first_child = trie._first_child
+        child_count = trie._child_count
+        node_count = len(trie)
+
+        loser = array('B', [players - 1]) * node_count
+        length = array('H', [0]) * node_count
+        offset = array('i', [0]) * node_count
+        count = array('B', [0]) * node_count
+        letters = bytearray()
+
+        for node in range(node_count - 1, -1, -1):
+            if terminal[node] or not child_count[node]:
+                continue
+
+            best_key = None
+            start = first_child[node]
+            for c in range(start, start + child_count[node]):
+                child_loser = loser[c] + 1
+                if child_loser == players:
+                    child_loser = 0
+                child_length = length[c] + 1
+                if child_loser:
+                    key = (0, child_length, child_loser)
+                else:
+                    key = (1, -child_length, child_loser)
+
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best_loser, best_length = child_loser, child_length
+                    best = [labels[c]]
+                elif key == best_key:
+                    best.append(labels[c])
+
+            loser[node] = best_loser
+            length[node] = best_length
+            offset[node] = len(letters)
+            count[node] = len(best)
+            letters += bytes(best)
+
+        self._arrays = (loser, length, offset, count, bytes(letters))
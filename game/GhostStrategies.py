@@ -1,26 +1,52 @@
 from abc import ABCMeta, abstractmethod
+from array import array
+from bisect import bisect_right
 import random
+import threading
+
+from .CompactTrie import CompactTrie
+from .Trie import TRIE_BRANCH
+
+# Opponents played by FrequencyWeightedStrat
+DIFFICULTY_EASY = 'easy'
+DIFFICULTY_MEDIUM = 'medium'
+DIFFICULTY_HARD = 'hard'
+DIFFICULTIES = (DIFFICULTY_EASY, DIFFICULTY_MEDIUM, DIFFICULTY_HARD)
+
+
+def choose(letters, draw=None):
+    """Picks one of `letters` uniformly. If `draw` (a float in
+    [0, 1)) is given it is used instead of a fresh random number."""
+    if draw is None:
+        return random.choice(letters)
+    return letters[int(draw * len(letters))]
 
 class GhostStrategy(object):
     __metaclass__ = ABCMeta
 
     @abstractmethod
-    def get_move(self, winners, losers):
+    def get_move(self, node, draw=None):
         """Returns the next letter to be played using the
         current strategy.
 
         Args:
-            winners: dict whose keys are letters and whose
-            values are the Trie nodes corresponding to appending
-            that letter to the current word. Choosing any of these
-            words should lead to a win by the current player
-            given optimal play.
-            
-            losers: dict whose keys are letters and whose values
-            are the Trie nodes corresponding to appending that
-            letter to the current word. Choosing any of these
-            words should lead to a loss by the current player
-            given optimal play by the opponent.
+            node: Trie node for the current word. It is always a
+            branch node, and its `moves` attribute holds the
+            MoveTable precomputed for it:
+
+            moves.winners - letters that should lead to a win
+            by the current player given optimal play.
+
+            moves.losers - letters that should lead to a loss
+            by the current player given optimal play by the
+            opponent, longest-surviving first.
+
+            moves.best_losers - the losers that keep the game
+            going for as long as possible.
+
+            draw: optional float in [0, 1) to use as the source of
+            randomness instead of the random module, so that callers
+            can draw the numbers for many moves at once.
         
         Returns:
             A letter to be appended to the end of the current word.
@@ -36,24 +62,256 @@ class RandomWinBestEffortLossStrat(GhostStrategy):
     maximal game length). 
     """
 
-    def get_move(self, winners, losers):
+    def get_move(self, node, draw=None):
+        moves = node.moves
+        return choose(moves.winners or moves.best_losers, draw)
 
-        if winners:
 
-            return random.choice([letter for letter in winners])
+class RandomChoiceStrat(GhostStrategy):
+    """Totally random strategy."""
 
-        else:
+    def get_move(self, node, draw=None):
+        return choose(node.moves.letters, draw)
 
-            # only those nodes that have the longest chain leading to end game state
-            max_height = max([x.height for x in losers.values()])
-            best_choices = [letter for letter in losers if losers[letter].height == max_height]
 
-            return random.choice(best_choices)
+class FrequencyWeightedStrat(GhostStrategy):
+    """Picks letters in proportion to how common the words below them
+    are, so that the computer heads for words a person would know.
 
+    Words are weighted by frequency rank, the word ranked r weighing
+    1 / (r + 1). A letter weighs as much as all the words below it,
+    adjusted for the difficulty:
 
-class RandomChoiceStrat(GhostStrategy):
-    """Totally random strategy."""
+        easy - frequency alone, whether the letter wins or not
+        medium - winning letters weigh WINNER_BIAS times as much
+        hard - only the letters RandomWinBestEffortLossStrat plays
+            (the winners, or else the longest-surviving losers)
+
+    The weights of every branch node are summed into a cumulative
+    table when the strategy is created, so choosing a move is a single
+    bisect. A CompactTrie keeps one flat array with an entry per node:
+    the children of a node are contiguous, so their entries form that
+    node's table. The tables are built again on the first move after
+    the trie changes.
+    """
+
+    # how much more a winning letter weighs at medium difficulty
+    WINNER_BIAS = 4
+
+    def __init__(self, wordlist, difficulty=DIFFICULTY_HARD, ranks=None):
+        """
+        Args:
+            wordlist (Trie or CompactTrie) - its heights, move tables
+            and hint tables (for the range of words below each node)
+            are calculated if needed.
+            difficulty (str) - one of DIFFICULTIES
+            ranks (dict) - frequency rank of each word (lower is more
+            common). Defaults to the ranks the trie's hint tables were
+            calculated with. Unranked words all weigh as much as a word
+            ranked just after the last one, so without any ranks a
+            letter weighs as much as the number of words below it.
+        """
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"Unknown difficulty {difficulty!r}.")
+        self.difficulty = difficulty
+        self.wordlist = wordlist
+        self._ranks = ranks
+        self._compact = isinstance(wordlist, CompactTrie)
+        self._lock = threading.Lock()
+        # the trie's generation the tables were built for
+        self._generation = None
+        self._build_tables()
+
+
+    def get_move(self, node, draw=None):
+        if self._generation != self.wordlist.generation:
+            self._build_tables()
+        if draw is None:
+            draw = random.random()
+        if self._compact:
+            trie = node.trie
+            start = trie._first_child[node.id]
+            child = bisect_right(self._cumulative, draw, start, start + trie._child_count[node.id])
+            return chr(trie._labels[child])
+
+        letters, cumulative = self._tables[node]
+        return letters[bisect_right(cumulative, draw)]
+
+
+    def _build_tables(self):
+        with self._lock:
+            wordlist = self.wordlist
+            generation = wordlist.generation
+            if generation == self._generation:
+                return
+
+            # an inserted or removed word leaves these out of date
+            wordlist.calculate_heights()
+            wordlist.calculate_move_tables()
+            wordlist.calculate_hint_tables()
+            # total weight of the first i leaves, in the trie's leaf order
+            ranks = self._ranks if self._ranks is not None else wordlist._ranks
+            unranked = len(ranks)
+            self._leaf_totals = [0.0]
+            for i in range(wordlist.root.leaf_count):
+                self._leaf_totals.append(self._leaf_totals[-1] + 1 / (ranks.get(wordlist.leaf(i), unranked) + 1))
+
+            if self._compact:
+                self._build_compact(wordlist)
+            else:
+                self._build(wordlist)
+            del self._leaf_totals
+            self._generation = generation
+
+
+    def _weight(self, letter, leaf_start, leaf_count, winners, best_losers):
+        weight = self._leaf_totals[leaf_start + leaf_count] - self._leaf_totals[leaf_start]
+        if self.difficulty == DIFFICULTY_HARD:
+            return weight if letter in (winners or best_losers) else 0.0
+        if self.difficulty == DIFFICULTY_MEDIUM and letter in winners:
+            return weight * self.WINNER_BIAS
+        return weight
+
+
+    def _build(self, wordlist):
+        # branch node -> (letters, cumulative share of each letter)
+        tables = {}
+        stack = [wordlist.root]
+        while stack:
+            node = stack.pop()
+            children = node.children
+            # a word ends the game, but lists that are not reduced
+            # have branch nodes below it
+            stack.extend(children.values())
+            if node.value != TRIE_BRANCH or not children:
+                continue
+
+            moves = node.moves
+            letters = []
+            cumulative = []
+            total = 0.0
+            for letter, child in sorted(children.items()):
+                weight = self._weight(letter, child.leaf_start, child.leaf_count,
+                                      moves.winners, moves.best_losers)
+                if weight > 0:
+                    total += weight
+                    letters.append(letter)
+                    cumulative.append(total)
+            tables[node] = (''.join(letters), tuple(c / total for c in cumulative))
+        self._tables = tables
+
+
+    def _build_compact(self, trie):
+        # entry c: share of the siblings up to and including child c;
+        # children that are never played add nothing
+        cumulative = array('d', [0.0]) * len(trie)
+        leaf_start = trie._leaf_start
+        leaf_count = trie._leaf_count
+        for node in range(len(trie)):
+            count = trie._child_count[node]
+            if not count or trie._terminal[node]:
+                continue
+
+            # the node's move table, without decoding it into the
+            # trie's cache
+            offset = trie._move_offset[node]
+            wins = trie._win_count[node]
+            winners = str(trie._move_letters[offset:offset + wins], 'latin-1')
+            best_losers = str(trie._move_letters[offset + wins:offset + wins + trie._best_count[node]], 'latin-1')
+
+            start = trie._first_child[node]
+            total = 0.0
+            for child in range(start, start + count):
+                total += self._weight(chr(trie._labels[child]), leaf_start[child], leaf_count[child],
+                                      winners, best_losers)
+                cumulative[child] = total
+            for child in range(start, start + count):
+                cumulative[child] /= total
+        self._cumulative = cumulative
+
+
+class SolvedStrat(GhostStrategy):
+    """Plays the moves chosen by a GhostSolver, for games with any
+    number of players. Picks randomly among moves with the same
+    outcome."""
+
+    def __init__(self, solver):
+        self.solver = solver
+
+    def get_move(self, node, draw=None):
+        return choose(self.solver.best_moves(node), draw)
+
+
+class SuperghostStrat(object):
+    """RandomWinBestEffortLossStrat for Superghost, where letters may
+    be added at either end of the fragment.
+
+    Unlike the trie, many sequences of moves lead to the same
+    fragment, so the outcome of every fragment is solved once and
+    kept in `table`. get_move() takes and returns whole fragments
+    rather than trie nodes and letters, so this is not a
+    GhostStrategy and cannot be used by GhostGame.
+    """
+
+    def __init__(self, index):
+        """
+        Args:
+            index (SubstringIndex)
+        """
+        self.index = index
+        # fragment -> (player to move wins, letters left to play)
+        self.table = {}
+
+    def solve(self):
+        """Solves every fragment reachable from the empty one."""
+        self._solve('')
+
+    def get_move(self, node, draw=None):
+        """
+        Args:
+            node (str) - current fragment; it occurs in some word but
+            is not itself a word.
+            draw - see GhostStrategy.get_move()
+
+        Returns:
+            The fragment after the chosen move.
+        """
+        winners, best_losers, _ = self._moves(node)
+        return choose([f for f, _ in winners] or [f for f, _ in best_losers], draw)
+
+    def _moves(self, fragment):
+        """Returns the winning moves, the longest-surviving losing
+        moves (both as (fragment, letters left) pairs, sorted by
+        fragment) and the number of letters left after the best move."""
+        left, right = self.index.extensions(fragment)
+        children = sorted(set([letter + fragment for letter in left] +
+                              [fragment + letter for letter in right]))
+
+        winners = []
+        best_losers = []
+        for child in children:
+            wins, length = self._solve(child)
+            if not wins:
+                winners.append((child, length))
+            elif not best_losers or length > best_losers[0][1]:
+                best_losers = [(child, length)]
+            elif length == best_losers[0][1]:
+                best_losers.append((child, length))
+
+        if winners:
+            # finish the round as soon as possible
+            length = min(length for _, length in winners)
+        else:
+            length = best_losers[0][1]
+        return winners, best_losers, length + 1
+
+    def _solve(self, fragment):
+        if self.index.is_word(fragment):
+            # the previous player completed a word
+            return (True, 0)
 
-    def get_move(self, winners, losers):
-        choices = winners + losers
-        return random.choice([letter for letter in choices])
\ No newline at end of file
+        entry = self.table.get(fragment)
+        if entry is None:
+            winners, _, length = self._moves(fragment)
+            entry = self.table[fragment] = (bool(winners), length)
+        return entry
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+
+class CachedResponse(object):
+    """A rendered response body, with its status and strong ETag."""
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        # a hash of the exact bytes, so it is the same in every worker
+        # and across restarts for as long as the content is unchanged
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class ResponseCache(object):
+    """In-process LRU cache of rendered responses.
+
+    Keys should include everything the response depends on, including
+    the dictionary version, so that entries for older versions are
+    never served and simply age out.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def get(self, key):
+        """Returns the CachedResponse for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+
+    def put(self, key, status, body):
+        """Stores and returns a CachedResponse for `key`."""
+        entry = CachedResponse(status, body)
+        if self.capacity <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return entry
@@ -0,0 +1,228 @@
+from importlib import import_module
+import json
+import random
+
+from .GhostSolver import GhostSolver
+from .GhostStrategies import (DIFFICULTY_EASY, DIFFICULTY_HARD, DIFFICULTY_MEDIUM, FrequencyWeightedStrat,
+                              GhostStrategy, RandomChoiceStrat, RandomWinBestEffortLossStrat, SolvedStrat)
+from .Trie import TRIE_BRANCH
+
+# Seeds of consecutive games are this far apart, so that the games of
+# different runs do not overlap unless their seeds are close.
+GAME_SEED_STRIDE = 1 << 32
+
+
+def _solved(wordlist):
+    solver = GhostSolver(wordlist)
+    solver.solve()
+    return SolvedStrat(solver)
+
+
+# Name -> callable taking the (move-table ready) trie and returning a
+# GhostStrategy. Any other strategy can be named by its dotted path
+# (e.g. game.GhostStrategies.RandomChoiceStrat) if it takes no
+# arguments.
+STRATEGIES = {
+    'random': lambda wordlist: RandomChoiceStrat(),
+    'best': lambda wordlist: RandomWinBestEffortLossStrat(),
+    'solved': _solved,
+    'easy': lambda wordlist: FrequencyWeightedStrat(wordlist, DIFFICULTY_EASY),
+    'medium': lambda wordlist: FrequencyWeightedStrat(wordlist, DIFFICULTY_MEDIUM),
+    'hard': lambda wordlist: FrequencyWeightedStrat(wordlist, DIFFICULTY_HARD),
+}
+
+
+def create_strategy(name, wordlist):
+    """Returns the strategy called `name` (see STRATEGIES). Raises
+    ValueError if there is no such strategy."""
+    if name in STRATEGIES:
+        return STRATEGIES[name](wordlist)
+
+    module_name, _, class_name = name.rpartition('.')
+    try:
+        strategy_class = getattr(import_module(module_name), class_name)
+    except (ImportError, AttributeError, ValueError):
+        raise ValueError(f"Unknown strategy '{name}'; expected one of {', '.join(STRATEGIES)} "
+                         "or the dotted path of a GhostStrategy class.")
+    if not (isinstance(strategy_class, type) and issubclass(strategy_class, GhostStrategy)):
+        raise ValueError(f"'{name}' is not a GhostStrategy.")
+    try:
+        return strategy_class()
+    except TypeError as e:
+        raise ValueError(f"'{name}' cannot be created without arguments: {e}")
+
+
+def play_game(wordlist, strategies, first, rng):
+    """Plays one game of two-player Ghost from the empty word.
+
+    Args:
+        wordlist (Trie or CompactTrie) - with move tables calculated
+        strategies - the two GhostStrategy objects, by seat
+        first (int) - seat of the player who moves first
+        rng (random.Random) - source of every random draw
+
+    Returns:
+        (seat of the loser, number of letters played)
+    """
+    node = wordlist.root
+    seat = first
+    length = 0
+    while True:
+        node = node.child(strategies[seat].get_move(node, rng.random()))
+        length += 1
+        if node.value != TRIE_BRANCH or not node.has_children:
+            # completing a word loses
+            return seat, length
+        seat = 1 - seat
+
+
+class SelfPlayResult(object):
+    """Totals of a set of games between two strategies.
+
+    Attributes:
+        games (int)
+        wins (list) - games won by each seat
+        first_wins (list) - games won by each seat when it moved first
+        lengths (dict) - number of games by the number of letters played
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.wins = [0, 0]
+        self.first_wins = [0, 0]
+        self.lengths = {}
+
+
+    def add(self, loser, first, length):
+        winner = 1 - loser
+        self.games += 1
+        self.wins[winner] += 1
+        if winner == first:
+            self.first_wins[winner] += 1
+        self.lengths[length] = self.lengths.get(length, 0) + 1
+
+
+    def merge(self, other):
+        self.games += other.games
+        for seat in (0, 1):
+            self.wins[seat] += other.wins[seat]
+            self.first_wins[seat] += other.first_wins[seat]
+        for length, count in other.lengths.items():
+            self.lengths[length] = self.lengths.get(length, 0) + count
+
+
+    def percentile(self, fraction):
+        """Smallest game length at or above `fraction` of the games."""
+        target = fraction * self.games
+        seen = 0
+        for length in sorted(self.lengths):
+            seen += self.lengths[length]
+            if seen >= target:
+                return length
+        return None
+
+
+    def mean_length(self):
+        if not self.games:
+            return None
+        return sum(length * count for length, count in self.lengths.items()) / self.games
+
+
+    def as_dict(self):
+        return {
+            'games': self.games,
+            'wins': self.wins,
+            'first_wins': self.first_wins,
+            'lengths': {str(length): count for length, count in sorted(self.lengths.items())},
+        }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls()
+        result.games = data['games']
+        result.wins = list(data['wins'])
+        result.first_wins = list(data['first_wins'])
+        result.lengths = {int(length): count for length, count in data['lengths'].items()}
+        return result
+
+
+###########################################################
+# Process pool workers
+#
+# The command loads the dictionary and builds both strategies
+# in init_worker() before starting the pool, so that errors
+# surface there rather than in every worker. Forked workers
+# inherit the result; others load it once, also in
+# init_worker(). Each then plays chunks of games.
+###########################################################
+
+_worker = None
+
+
+def init_worker(dictionary, strategy_names):
+    """Loads the dictionary and builds the strategies, unless this
+    process already has them. Raises whatever loading raises, and
+    ValueError for an unknown strategy."""
+    from . import asset_loader
+
+    global _worker
+    if _worker is not None:
+        return
+    wordlist = asset_loader.load_trie(dictionary)
+    wordlist.calculate_move_tables()
+    ranks = asset_loader.load_ranks(dictionary)
+    if ranks is not None:
+        # word frequencies for the difficulty strategies
+        wordlist.calculate_hint_tables(ranks)
+    _worker = (wordlist, [create_strategy(name, wordlist) for name in strategy_names])
+
+
+def play_chunk(chunk, start, count, seed):
+    """Plays games start .. start + count - 1. Game i is seeded with
+    seed * GAME_SEED_STRIDE + i, and seat i % 2 moves first, so every
+    game can be replayed on its own.
+
+    Returns:
+        (chunk, SelfPlayResult as a dict)
+    """
+    wordlist, strategies = _worker
+    result = SelfPlayResult()
+    rng = random.Random()
+    for game in range(start, start + count):
+        rng.seed(seed * GAME_SEED_STRIDE + game)
+        first = game % 2
+        loser, length = play_game(wordlist, strategies, first, rng)
+        result.add(loser, first, length)
+    return chunk, result.as_dict()
+
+
+###########################################################
+# Results file
+#
+# One JSON object per line: the run's parameters first, then
+# one line per finished chunk, in the order they finish.
+###########################################################
+
+def read_results(filename):
+    """Returns (parameters, {chunk: SelfPlayResult}) from a results
+    file. A partly written last line (from an interrupted run) is
+    ignored."""
+    params = None
+    chunks = {}
+    with open(filename) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if params is None:
+                params = record
+            else:
+                chunks[record['chunk']] = SelfPlayResult.from_dict(record['result'])
+    return params, chunks
+
+
+def write_record(f, record):
+    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    f.flush()
@@ -0,0 +1,171 @@
+from array import array
+import sys
+
+WORD_SEPARATOR = '\n'
+
+
+class SuffixAutomaton(object):
+    """Suffix automaton of a list of words.
+
+    The automaton accepts exactly the substrings of the words, so
+    following the letters of a fragment from the initial state either
+    fails (the fragment occurs in no word) or ends in a state whose
+    transitions are the letters that may be appended to it. Both take
+    time proportional to the fragment.
+
+    The words are joined with WORD_SEPARATOR into one string, and the
+    separator is never followed, so no fragment spans two words.
+    States are numbered from 0 (the initial state). While building,
+    next[s] maps letters to states, link[s] is the suffix link and
+    length[s] the length of the longest string in s; once built, only
+    the transitions are kept, in flat arrays (see _freeze()).
+    """
+
+    def __init__(self, words):
+        self.next = [{}]
+        self.link = [-1]
+        self.length = [0]
+
+        last = 0
+        for word in words:
+            for letter in word:
+                last = self._extend(last, letter)
+            last = self._extend(last, WORD_SEPARATOR)
+
+        self._freeze()
+
+
+    def __len__(self):
+        return len(self._first)
+
+
+    def nbytes(self):
+        """Size in bytes of the transition arrays."""
+        return len(self._labels) + sum(len(a) * a.itemsize for a in (self._first, self._count, self._targets))
+
+
+    def walk(self, fragment, state=0):
+        """Returns the state reached by following `fragment` from
+        `state`, or -1 if the result is not a substring of any word."""
+        labels = self._labels
+        first = self._first
+        count = self._count
+        targets = self._targets
+        for letter in fragment:
+            code = ord(letter)
+            if code > 255:
+                return -1
+            start = first[state]
+            i = labels.find(code, start, start + count[state])
+            if i < 0:
+                return -1
+            state = targets[i]
+        return state
+
+
+    def letters(self, state):
+        """Letters that can follow the strings in `state`, sorted."""
+        start = self._first[state]
+        return str(self._labels[start:start + self._count[state]], 'latin-1')
+
+
+    def _freeze(self):
+        """Replaces the per-state dicts used while building with flat
+        arrays, in the style of CompactTrie: the transitions of state s
+        are labels/targets[first[s]:first[s] + count[s]], sorted by
+        letter. Transitions on the separator are dropped."""
+        first = array('i')
+        count = array('B')
+        labels = bytearray()
+        targets = array('i')
+
+        for transitions in self.next:
+            first.append(len(targets))
+            letters = sorted(letter for letter in transitions if letter != WORD_SEPARATOR)
+            count.append(len(letters))
+            labels += ''.join(letters).encode('latin-1')
+            targets.extend(transitions[letter] for letter in letters)
+
+        self._first = first
+        self._count = count
+        self._labels = bytes(labels)
+        self._targets = targets
+        del self.next, self.link, self.length
+
+
+    def _extend(self, last, letter):
+        nxt, link, length = self.next, self.link, self.length
+
+        cur = len(nxt)
+        nxt.append({})
+        link.append(0)
+        length.append(length[last] + 1)
+
+        p = last
+        while p >= 0 and letter not in nxt[p]:
+            nxt[p][letter] = cur
+            p = link[p]
+        if p < 0:
+            return cur
+
+        q = nxt[p][letter]
+        if length[p] + 1 == length[q]:
+            link[cur] = q
+            return cur
+
+        clone = len(nxt)
+        nxt.append(dict(nxt[q]))
+        link.append(link[q])
+        length.append(length[p] + 1)
+        while p >= 0 and nxt[p].get(letter) == q:
+            nxt[p][letter] = clone
+            p = link[p]
+        link[q] = link[cur] = clone
+        return cur
+
+
+class SubstringIndex(object):
+    """Answers the questions Superghost asks about a fragment, in time
+    proportional to the fragment's length:
+
+        is_word(f) - does `f` complete a word?
+        contains(f) - does `f` occur inside any word?
+        extensions(f) - which letters may be added on either side?
+
+    Appending letters is answered by a suffix automaton of the words,
+    and prepending them by a suffix automaton of the reversed words.
+    """
+
+    def __init__(self, words):
+        """
+        Args:
+            words (iterable of str)
+        """
+        self.words = frozenset(words)
+        self.forward = SuffixAutomaton(self.words)
+        self.backward = SuffixAutomaton(word[::-1] for word in self.words)
+
+
+    def nbytes(self):
+        """Approximate size in bytes of the words and both automata."""
+        words = sys.getsizeof(self.words) + sum(sys.getsizeof(word) for word in self.words)
+        return words + self.forward.nbytes() + self.backward.nbytes()
+
+
+    def is_word(self, fragment):
+        return fragment in self.words
+
+
+    def contains(self, fragment):
+        return self.forward.walk(fragment) >= 0
+
+
+    def extensions(self, fragment):
+        """Returns (left, right): the letters that may be prepended and
+        appended to `fragment` so that it still occurs in some word.
+        Both are empty if `fragment` itself occurs in no word."""
+        right = self.forward.walk(fragment)
+        if right < 0:
+            return '', ''
+        left = self.backward.walk(reversed(fragment))
+        return self.backward.letters(left), self.forward.letters(right)
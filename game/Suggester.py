@@ -0,0 +1,340 @@
+from collections import OrderedDict
+import threading
+
+from .CompactTrie import CompactTrie
+from .Trie import TRIE_BRANCH
+
+
+class Suggester(object):
+    """Finds the prefixes and words of a dictionary closest to a
+    string, by Levenshtein distance ("did you mean ...?").
+
+    Every node of the trie stands for a valid prefix (or a word), so
+    the search walks the trie along the input, spending edits
+    (deleting a letter of the input, or replacing it or inserting
+    before it the letter of a child) only where the trie has a node to
+    go to. Without edits left, the rest of the input is looked up
+    directly. Most branches of the walk end within a letter or two, so
+    it touches far fewer nodes than filling in an edit distance table
+    per node would.
+
+    Among equally distant suggestions, those that keep more of the
+    input's first letters come first. That lets the search for the
+    farthest ones start from the end of the input and stop as soon as
+    the closest `limit` are certain, instead of trying edits to the
+    first letters, where the trie is densest. Results are cached per
+    input, until the trie changes.
+    """
+
+    def __init__(self, wordlist, cache_size=1024):
+        """
+        Args:
+            wordlist (Trie or CompactTrie)
+            cache_size (int) - inputs whose suggestions are kept
+        """
+        self.wordlist = wordlist
+        self.cache_size = cache_size
+        self._compact = isinstance(wordlist, CompactTrie)
+        self._cache = OrderedDict()
+        # the trie's generation the cache belongs to
+        self._generation = wordlist.generation
+        self._lock = threading.Lock()
+
+
+    def suggest(self, word, max_distance=2, limit=5):
+        """Returns the `limit` closest (prefix, distance) pairs with
+        distance at most `max_distance`. Among equally distant
+        prefixes, those sharing a longer start with `word` come first,
+        then those closest in length to `word`, then prefixes before
+        words, then alphabetical order.
+        """
+        key = (word, max_distance, limit)
+        with self._lock:
+            if self._generation != self.wordlist.generation:
+                self._cache.clear()
+                self._generation = self.wordlist.generation
+            generation = self._generation
+            suggestions = self._cache.get(key)
+            if suggestions is not None:
+                self._cache.move_to_end(key)
+                return suggestions
+
+        found = self._search(word, max_distance, limit)
+        found.sort(key=lambda item: (item[1], -_shared(item[0], word), abs(len(item[0]) - len(word)),
+                                     item[2], item[0]))
+        suggestions = [(prefix, distance) for prefix, distance, _ in found[:limit]]
+
+        with self._lock:
+            # not if the trie changed during the search
+            if generation == self._generation:
+                self._cache[key] = suggestions
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return suggestions
+
+
+    def _search(self, word, max_distance, limit):
+        """Returns (prefix, distance, is_word) for every node closer
+        than `max_distance` to `word`, and for the nodes at
+        `max_distance` that rank among the first `limit`.
+
+        The first pass walks with one edit less than `max_distance`
+        and keeps the fewest edits each node was reached with, which is
+        its distance. The second walks the edits starting at each
+        letter of `word` in turn, from the last: a node that shares its
+        first `i` letters with `word` has a shortest edit sequence
+        that starts at letter `i`. Once the nodes found make up
+        `limit`, those at `max_distance` all share more of `word` than
+        any left, so the rest can be skipped.
+        """
+        if self._compact:
+            return self._search_compact(word, max_distance, limit)
+
+        size = len(word)
+        find = self.wordlist._find
+        # prefix -> [distance, node]
+        found = {}
+
+        # Records the nodes below `node` spelling word[j:] with up to
+        # `budget` edits, `used` edits having been made to get there.
+        def walk(node, prefix, j, budget, used):
+            if not budget:
+                end = find(node, word[j:])
+                if end is not None:
+                    record(prefix + word[j:], end, used)
+                return
+            if j == size:
+                record(prefix, node, used)
+            else:
+                child = node.children.get(word[j])
+                if child is not None:
+                    walk(child, prefix + word[j], j + 1, budget, used)
+            edit(node, prefix, j, budget, used)
+
+        # Same as walk(), for the edit sequences whose next edit is at
+        # word[j] (or after the end of `word`)
+        def edit(node, prefix, j, budget, used):
+            if budget == 1:
+                last_edit(node, prefix, j, used + 1)
+                return
+            letter = None
+            if j < size:
+                letter = word[j]
+                # the input's letter deleted
+                walk(node, prefix, j + 1, budget - 1, used + 1)
+            for other, child in node.children.items():
+                # (inserting the input's own letter is the same as
+                # matching it and inserting it after)
+                if other != letter:
+                    if letter is not None:
+                        # replaced
+                        walk(child, prefix + other, j + 1, budget - 1, used + 1)
+                    # inserted before it
+                    walk(child, prefix + other, j, budget - 1, used + 1)
+
+        # edit() with one edit left: the rest of `word` follows it
+        # unchanged. Most children cannot take the next two letters, so
+        # those are checked before looking up the rest.
+        def last_edit(node, prefix, j, used):
+            children = node.children
+            if j == size:
+                for other, child in children.items():
+                    record(prefix + other, child, used)
+                return
+            letter = word[j]
+            rest = word[j + 1:]
+            end = find(node, rest)
+            if end is not None:
+                record(prefix + rest, end, used)
+            if not rest:
+                for other, child in children.items():
+                    if other != letter:
+                        record(prefix + other, child, used)
+                        if letter in child.children:
+                            record(prefix + other + letter, child.children[letter], used)
+                return
+
+            after = rest[0]
+            tail = rest[1:]
+            for other, child in children.items():
+                following = child.children
+                # replaced
+                if after in following and other != letter:
+                    end = following[after]
+                    if tail:
+                        end = end.children.get(tail[0])
+                        if end is not None:
+                            end = find(end, tail[1:])
+                    if end is not None:
+                        record(prefix + other + rest, end, used)
+                # inserted before it
+                if letter in following:
+                    end = following[letter].children.get(after)
+                    if end is not None and tail:
+                        end = find(end, tail)
+                    if end is not None:
+                        record(prefix + other + letter + rest, end, used)
+
+        def record(prefix, node, used):
+            entry = found.get(prefix)
+            if entry is None:
+                found[prefix] = [used, node]
+            elif used < entry[0]:
+                entry[0] = used
+
+        root = self.wordlist.root
+        if max_distance:
+            walk(root, '', 0, max_distance - 1, 0)
+        # the nodes along `word`
+        path = [root]
+        for letter in word:
+            node = path[-1].children.get(letter)
+            if node is None:
+                break
+            path.append(node)
+
+        # (the root, reached by deleting every letter, is no prefix)
+        found.pop('', None)
+        for i in range(len(path) - 1, -1, -1):
+            if len(found) >= limit:
+                break
+            if i == size:
+                record(word, path[i], 0)
+            if max_distance:
+                edit(path[i], word[:i], i, max_distance, 0)
+            found.pop('', None)
+        return [(prefix, distance, node.value != TRIE_BRANCH)
+                for prefix, (distance, node) in found.items()]
+
+
+    def _search_compact(self, word, max_distance, limit):
+        """Same as _search() over the arrays of a CompactTrie."""
+        trie = self.wordlist
+        # lays out the arrays of a trie with values still to insert
+        root = trie.root.id
+        labels = trie._labels
+        first_child = trie._first_child
+        child_count = trie._child_count
+        terminal = trie._terminal
+
+        codes = word.encode('latin-1', 'replace')
+        size = len(codes)
+        found = {}
+
+        def walk(node, prefix, j, budget, used):
+            if not budget:
+                end = find(node, j)
+                if end >= 0:
+                    record(prefix + word[j:], end, used)
+                return
+            if j == size:
+                record(prefix, node, used)
+            else:
+                start = first_child[node]
+                child = labels.find(codes[j], start, start + child_count[node])
+                if child >= 0:
+                    walk(child, prefix + word[j], j + 1, budget, used)
+            edit(node, prefix, j, budget, used)
+
+        def edit(node, prefix, j, budget, used):
+            if budget == 1:
+                last_edit(node, prefix, j, used + 1)
+                return
+            code = None
+            if j < size:
+                code = codes[j]
+                walk(node, prefix, j + 1, budget - 1, used + 1)
+            start = first_child[node]
+            for child in range(start, start + child_count[node]):
+                if labels[child] != code:
+                    letter = chr(labels[child])
+                    if code is not None:
+                        walk(child, prefix + letter, j + 1, budget - 1, used + 1)
+                    walk(child, prefix + letter, j, budget - 1, used + 1)
+
+        def find(node, j):
+            """The node below `node` spelling codes[j:], or -1."""
+            for code in codes[j:]:
+                start = first_child[node]
+                node = labels.find(code, start, start + child_count[node])
+                if node < 0:
+                    break
+            return node
+
+        def last_edit(node, prefix, j, used):
+            start = first_child[node]
+            stop = start + child_count[node]
+            if j == size:
+                for child in range(start, stop):
+                    record(prefix + chr(labels[child]), child, used)
+                return
+            code = codes[j]
+            rest = word[j + 1:]
+            end = find(node, j + 1)
+            if end >= 0:
+                record(prefix + rest, end, used)
+            if not rest:
+                for child in range(start, stop):
+                    if labels[child] != code:
+                        letter = chr(labels[child])
+                        record(prefix + letter, child, used)
+                        offset = first_child[child]
+                        end = labels.find(code, offset, offset + child_count[child])
+                        if end >= 0:
+                            record(prefix + letter + word[j], end, used)
+                return
+
+            after = codes[j + 1]
+            for child in range(start, stop):
+                offset = first_child[child]
+                following = offset + child_count[child]
+                if labels[child] != code:
+                    end = labels.find(after, offset, following)
+                    if end >= 0:
+                        end = find(end, j + 2)
+                        if end >= 0:
+                            record(prefix + chr(labels[child]) + rest, end, used)
+                end = labels.find(code, offset, following)
+                if end >= 0:
+                    end = find(end, j + 1)
+                    if end >= 0:
+                        record(prefix + chr(labels[child]) + word[j] + rest, end, used)
+
+        def record(prefix, node, used):
+            entry = found.get(prefix)
+            if entry is None:
+                found[prefix] = [used, node]
+            elif used < entry[0]:
+                entry[0] = used
+
+        if max_distance:
+            walk(root, '', 0, max_distance - 1, 0)
+        path = [root]
+        for code in codes:
+            start = first_child[path[-1]]
+            node = labels.find(code, start, start + child_count[path[-1]])
+            if node < 0:
+                break
+            path.append(node)
+
+        found.pop('', None)
+        for i in range(len(path) - 1, -1, -1):
+            if len(found) >= limit:
+                break
+            if i == size:
+                record(word, path[i], 0)
+            if max_distance:
+                edit(path[i], word[:i], i, max_distance, 0)
+            found.pop('', None)
+        return [(prefix, distance, bool(terminal[node]))
+                for prefix, (distance, node) in found.items()]
+
+
+def _shared(prefix, word):
+    """Number of first letters `prefix` and `word` have in common."""
+    i = 0
+    for a, b in zip(prefix, word):
+        if a != b:
+            break
+        i += 1
+    return i
@@ -1,11 +1,88 @@
+import heapq
+import sys
+
 TRIE_BRANCH = -1
 
+# Number of most common completions cached per node for hints.
+HINT_CACHE_SIZE = 5
+
+class MoveTable(object):
+    """Precomputed move options for a branch node of the trie.
+
+    All fields are strings of single letters, so picking a move is a
+    single random.choice() with no intermediate containers.
+
+    Attributes:
+        winners - letters whose subtree has odd height. Choosing any
+            of these should lead to a win given optimal play.
+        losers - letters whose subtree has even height, ordered so
+            that the ones surviving longest come first.
+        best_losers - prefix of `losers` with the maximal height.
+        terminals - letters that end the game: their subtree has
+            height 0, so nothing can follow them. In a list reduced by
+            build_wordlist.py these are exactly the letters that
+            complete a word.
+        letters - every letter that continues the current word.
+    """
+
+    __slots__ = ('winners', 'losers', 'best_losers', 'terminals', 'letters')
+
+    def __init__(self, winners, losers, best_losers, terminals):
+        self.winners = winners
+        self.losers = losers
+        self.best_losers = best_losers
+        self.terminals = terminals
+        self.letters = winners + losers
+
+    @classmethod
+    def from_children(cls, children):
+        """Builds a table from (letter, height) pairs."""
+        winners = []
+        losers = []
+        terminals = []
+
+        for letter, height in sorted(children):
+            if height % 2 == 0:
+                losers.append((height, letter))
+            else:
+                winners.append(letter)
+            if height == 0:
+                terminals.append(letter)
+
+        # longest-surviving losers first, alphabetical within a height
+        losers.sort(key=lambda pair: (-pair[0], pair[1]))
+        best_count = sum(1 for height, _ in losers if height == losers[0][0]) if losers else 0
+        loser_letters = ''.join(letter for _, letter in losers)
+
+        return cls(''.join(winners), loser_letters,
+                   loser_letters[:best_count], ''.join(terminals))
+
+
 class TrieNode(object):
     def __init__(self, depth=0):
         self.value = TRIE_BRANCH
         self.children = dict()
         self.depth = depth
         self.height = -1
+        self.moves = None
+
+        # hint tables (see Trie.calculate_hint_tables)
+        self.leaf_start = 0
+        self.leaf_count = 0
+        self.deepest_leaf = -1
+        self.common_leaves = ()
+
+    def child(self, letter):
+        """Returns the child reached by appending `letter`, or None."""
+        return self.children.get(letter)
+
+    @property
+    def has_children(self):
+        return bool(self.children)
+
+    def iter_children(self):
+        """Yields (letter, child) for every child."""
+        return iter(self.children.items())
 
 class Trie(object):
 
@@ -14,6 +91,23 @@ class Trie(object):
             self.root = root
         else:
             self.root = TrieNode()
+
+        # Once heights (and move tables) have been calculated for the
+        # whole tree, insert() and remove() keep them up to date along
+        # the affected path, so they only need a full pass again if
+        # they were never calculated in the first place.
+        self._heights_valid = False
+        self._moves_valid = False
+
+        # Hint tables index every value in sorted order, so any change
+        # to the set of values invalidates them as a whole.
+        self._hints_valid = False
+        self._ranks = {}
+        self.leaves = []
+
+        # Incremented by every change to the set of values, so that
+        # anything derived from the trie can tell it is out of date.
+        self.generation = 0
     
 
     def find(self, value):
@@ -34,19 +128,160 @@ class Trie(object):
    
     def insert(self, value):
         """Inserts the provided value into the trie."""
-        self._insert(self.root, value)
+        path = self._insert(self.root, value)
+        self._update_path(path)
+        self._hints_valid = False
+        self.generation += 1
     
 
     def insert_all(self, iterable):
         """Inserts the provided values into the trie."""
         for value in iterable:
-            self._insert(self.root, value)
+            self.insert(value)
+
+
+    def remove(self, value):
+        """Removes the provided value from the trie, pruning any
+        branches that no longer lead to a value.
+
+        Returns:
+            True if the value was in the trie, False otherwise.
+        """
+        path = [self.root]
+        node = self.root
+        for char in value:
+            node = node.children.get(char)
+            if node is None:
+                return False
+            path.append(node)
+
+        if node.value == TRIE_BRANCH:
+            return False
+        node.value = TRIE_BRANCH
+
+        # drop nodes that have become dead ends
+        for i in range(len(path) - 1, 0, -1):
+            if path[i].children or path[i].value != TRIE_BRANCH:
+                break
+            del path[i - 1].children[value[i - 1]]
+            path.pop()
+
+        self._update_path(path)
+        self._hints_valid = False
+        self.generation += 1
+        return True
     
 
     def calculate_heights(self):
         """Recalculates heights for all nodes in the tree
-        and updates their internal values."""
-        self._calculate_heights(self.root)
+        and updates their internal values.
+
+        Does nothing if the heights are already up to date."""
+        if not self._heights_valid:
+            self._calculate_heights(self.root)
+            self._heights_valid = True
+
+
+    def calculate_move_tables(self):
+        """Stores a MoveTable on every branch node. Must be called
+        after calculate_heights().
+
+        Does nothing if the tables are already up to date."""
+        if self._moves_valid:
+            return
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            node.moves = self._node_moves(node)
+            stack.extend(node.children.values())
+        self._moves_valid = True
+
+
+    def calculate_hint_tables(self, ranks=None):
+        """Indexes the values of the trie for hints, calculating
+        heights first if needed.
+
+        Every value is stored in `leaves` in sorted order, and every
+        node records:
+
+            leaf_start, leaf_count - the range of `leaves` below it
+            deepest_leaf - index of the value reached by always
+                following the highest child (the completion that
+                keeps a game going the longest)
+            common_leaves - indices of the HINT_CACHE_SIZE most common
+                values below it, most common first
+
+        Args:
+            ranks - dict mapping values to their frequency rank (lower
+            is more common). Values without a rank are considered the
+            least common, and ties go to the shorter value. Kept for
+            later recalculations if omitted.
+
+        Does nothing if the tables are already up to date.
+        """
+        if ranks is not None:
+            self._ranks = ranks
+            self._hints_valid = False
+        self.calculate_heights()
+        if self._hints_valid:
+            return
+
+        leaves = []
+        unranked = len(self._ranks)
+        keys = []  # sort key of each leaf, parallel to `leaves`
+
+        stack = [(self.root, False)]
+        while stack:
+            node, expanded = stack.pop()
+
+            if not expanded:
+                node.leaf_start = len(leaves)
+                if node.value != TRIE_BRANCH:
+                    leaves.append(node.value)
+                    keys.append((self._ranks.get(node.value, unranked), len(node.value), len(keys)))
+                stack.append((node, True))
+                stack.extend((child, False) for _, child in sorted(node.children.items(), reverse=True))
+                continue
+
+            node.leaf_count = len(leaves) - node.leaf_start
+
+            if not node.children:
+                node.deepest_leaf = node.leaf_start if node.leaf_count else -1
+            else:
+                highest = None
+                for _, child in sorted(node.children.items()):
+                    if highest is None or child.height > highest.height:
+                        highest = child
+                node.deepest_leaf = highest.deepest_leaf
+
+            candidates = [node.leaf_start] if node.value != TRIE_BRANCH else []
+            for child in node.children.values():
+                candidates.extend(child.common_leaves)
+            node.common_leaves = tuple(heapq.nsmallest(
+                HINT_CACHE_SIZE, candidates, key=keys.__getitem__))
+
+        self.leaves = leaves
+        self._hints_valid = True
+
+
+    def leaf(self, index):
+        """Returns the value at the given index of `leaves`."""
+        return self.leaves[index]
+
+
+    def nbytes(self):
+        """Approximate size in bytes of the nodes, their child dicts
+        and move tables, and the hint table of values."""
+        size = sys.getsizeof(self.leaves) + sum(sys.getsizeof(value) for value in self.leaves)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            size += sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.children)
+            if node.moves is not None:
+                size += sys.getsizeof(node.moves)
+            stack.extend(node.children.values())
+        return size
 
 
     def _find(self, node, value):
@@ -59,20 +294,64 @@ class Trie(object):
     
 
     def _insert(self, node, value):
+        path = [node]
         for char in value:
             if char not in node.children:
                 node.children[char] = TrieNode(node.depth + 1)
             node = node.children[char]
+            path.append(node)
         node.value = value
+        return path
+
+
+    def _update_path(self, path):
+        """Refreshes heights and move tables along `path` (ordered
+        from the root) after the last node on it has changed.
+
+        Walking upwards stops as soon as a node's height is
+        unchanged, since nothing above it can be affected.
+        """
+        if not self._heights_valid:
+            return
+
+        changed = True
+        for node in reversed(path):
+            if not changed:
+                break
+            old_height = node.height
+            node.height = self._node_height(node)
+            if self._moves_valid:
+                node.moves = self._node_moves(node)
+            # the last node's parent always needs a refresh, since
+            # its children or terminal state changed
+            changed = node.height != old_height or node is path[-1]
 
 
     def _calculate_heights(self, node):
+        # iterative post-order, so long words can't exhaust the stack
+        stack = [(node, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded or not node.children:
+                node.height = self._node_height(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+
+
+    def _node_height(self, node):
+        height = -1
+        for child in node.children.values():
+            if child.height > height:
+                height = child.height
+        return height + 1
+
+
+    def _node_moves(self, node):
         if not node.children:
-            node.height = 0
-            return node.height
-        else:
-            node.height = max([self._calculate_heights(n) for n in node.children.values()]) + 1
-            return node.height
+            return None
+        return MoveTable.from_children(
+            (letter, child.height) for letter, child in node.children.items())
     
 
     def _debug_print(self, node):
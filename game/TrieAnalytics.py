@@ -0,0 +1,221 @@
+import numpy as np
+
+
+def _view(values):
+    """NumPy view of one of a CompactTrie's arrays, without copying."""
+    return np.asarray(memoryview(values))
+
+
+class TrieAnalytics(object):
+    """Dictionary-wide statistics of a CompactTrie, computed with NumPy.
+
+    The trie's node arrays (parent, first child, child count, depth,
+    terminal) are viewed as NumPy arrays without copying. Nodes are
+    numbered breadth first, so the nodes at each depth form one id
+    range, and the children of the nodes at one depth fill the range
+    of the next, in the same order. Everything that depends on a
+    node's children (height, the two-player outcome, the length of the
+    game) is then a reduceat() per depth over the level below, and
+    everything that depends on a node's parent is a gather from the
+    level above, rather than a walk over the nodes one at a time.
+
+    A game ends with the first word completed, so no word below
+    another word can be reached. build_wordlist.py drops those words,
+    so the shipped lists have none. For any other list they are
+    reported by unreachable(), and the other reports only count what a
+    game can reach: a word's children are left out, and the word
+    counts as a leaf.
+
+    Attributes (one entry per node id):
+        parent, depth, child_count, first_child, terminal - the trie's arrays
+        ended (bool) - some word above the node ends the game first
+        height - letters in the longest game from the node
+        wins (bool) - the player to move at the node wins with best play
+        length - letters left under best play (see GhostSolver)
+        words - reachable words at or below the node
+    """
+
+    def __init__(self, trie):
+        """
+        Args:
+            trie (CompactTrie)
+        """
+        self.trie = trie
+        self.node_count = len(trie)
+        self.labels = np.frombuffer(trie._labels, dtype=np.uint8)
+        self.parent = _view(trie._parent)
+        self.first_child = _view(trie._first_child)
+        self.child_count = _view(trie._child_count).astype(np.int32)
+        self.depth = _view(trie._depth)
+        self.terminal = _view(trie._terminal).astype(bool)
+
+        self.max_depth = int(self.depth[-1])
+        # levels[d] is the first node id at depth d; the depth is
+        # non-decreasing in breadth first order
+        self.levels = np.searchsorted(self.depth, np.arange(self.max_depth + 2))
+
+        self._propagate_down()
+        self._propagate_up()
+
+
+    def _level(self, d):
+        return slice(self.levels[d], self.levels[d + 1])
+
+
+    def _propagate_down(self):
+        """Marks the nodes below a word, and the first word on their way,
+        which ends the game (-1 for none)."""
+        terminal = self.terminal
+        self.ended = np.zeros(self.node_count, dtype=bool)
+        self.ended_by = np.full(self.node_count, -1, dtype=np.int32)
+        for d in range(1, self.max_depth + 1):
+            level = self._level(d)
+            parents = self.parent[level]
+            above = self.ended[parents]
+            self.ended[level] = above | terminal[parents]
+            self.ended_by[level] = np.where(above, self.ended_by[parents],
+                                            np.where(terminal[parents], parents, -1))
+
+
+    def _propagate_up(self):
+        """Solves the two-player game bottom-up, one depth at a time.
+
+        The player to move at a word has won, since the other player
+        completed it. At a branch, the player to move wins if some
+        child leaves the other player losing, and then finishes as
+        quickly as possible; otherwise they play the child that lasts
+        longest. These are GhostSolver's rules for two players.
+        """
+        terminal = self.terminal
+        child_count = self.child_count
+        first_child = self.first_child
+        # larger than any length, for children that are not safe
+        never = np.iinfo(np.int32).max
+
+        self.height = np.zeros(self.node_count, dtype=np.int32)
+        self.length = np.zeros(self.node_count, dtype=np.int32)
+        self.wins = terminal | (child_count == 0)
+        self.words = terminal.astype(np.int64)
+
+        for d in range(self.max_depth - 1, -1, -1):
+            level = self._level(d)
+            nodes = self.levels[d] + np.flatnonzero((child_count[level] > 0) & ~terminal[level])
+            if not len(nodes):
+                continue
+
+            # the children of `nodes` are runs of the next level starting
+            # at these offsets; the children of words are skipped over
+            # by taking each run from its own start
+            below = self._level(d + 1)
+            offsets = first_child[nodes] - self.levels[d + 1]
+            runs = _runs(offsets, child_count[nodes])
+
+            child_height = self.height[below][runs]
+            child_wins = self.wins[below][runs]
+            child_length = self.length[below][runs]
+            child_words = self.words[below][runs]
+            starts = np.concatenate(([0], np.cumsum(child_count[nodes])[:-1]))
+
+            self.height[nodes] = np.maximum.reduceat(child_height, starts) + 1
+            wins = np.logical_or.reduceat(~child_wins, starts)
+            quickest = np.minimum.reduceat(np.where(child_wins, never, child_length), starts)
+            longest = np.maximum.reduceat(child_length, starts)
+            self.wins[nodes] = wins
+            self.length[nodes] = np.where(wins, quickest, longest) + 1
+            self.words[nodes] = np.add.reduceat(child_words, starts)
+
+
+    def summary(self):
+        reachable = self.terminal & ~self.ended
+        return {
+            'nodes': self.node_count,
+            'words': int(np.count_nonzero(self.terminal)),
+            'reachable_words': int(np.count_nonzero(reachable)),
+            'max_depth': self.max_depth,
+            'longest_game': int(self.height[0]),
+            'first_player_wins': bool(self.wins[0]),
+            'best_play_length': int(self.length[0]),
+        }
+
+
+    def openings(self):
+        """One row per first letter: who wins with best play, how many
+        letters that takes, and the longest game possible."""
+        start = self.first_child[0]
+        ids = np.arange(start, start + self.child_count[0])
+        return [{
+            'letter': chr(self.labels[i]),
+            'words': int(self.words[i]),
+            # the second player is to move after the opening letter
+            'winner': 'second' if self.wins[i] else 'first',
+            'best_play_length': int(self.length[i]) + 1,
+            'longest_game': int(self.height[i]) + 1,
+        } for i in ids]
+
+
+    def game_lengths(self):
+        """One row per number of letters: the reachable words of that
+        length (every way a game can end) and the opening letters whose
+        game under best play is that long."""
+        reachable = self.terminal & ~self.ended
+        words = np.bincount(self.depth[reachable], minlength=self.max_depth + 1)
+        start = self.first_child[0]
+        best = self.length[start:start + self.child_count[0]] + 1
+        openings = np.bincount(best, minlength=self.max_depth + 1)
+        return [{
+            'length': length,
+            'words': int(words[length]),
+            'openings': int(openings[length]),
+        } for length in range(1, self.max_depth + 1) if words[length] or openings[length]]
+
+
+    def branching(self):
+        """One row per depth: the reachable nodes, how many are words,
+        and the number of letters that can follow the others."""
+        rows = []
+        for d in range(self.max_depth + 1):
+            level = self._level(d)
+            reachable = ~self.ended[level]
+            words = reachable & self.terminal[level]
+            counts = self.child_count[level][reachable & ~words & (self.child_count[level] > 0)]
+            rows.append({
+                'depth': d,
+                'nodes': int(np.count_nonzero(reachable)),
+                'words': int(np.count_nonzero(words)),
+                'branches': len(counts),
+                'mean_children': round(float(counts.mean()), 3) if len(counts) else 0,
+                'max_children': int(counts.max()) if len(counts) else 0,
+            })
+        return rows
+
+
+    def unreachable(self):
+        """Words below another word, with the word that ends the game
+        first, in alphabetical order."""
+        ids = np.flatnonzero(self.terminal & self.ended)
+        rows = [{'word': self.trie.word(i), 'ended_by': self.trie.word(int(self.ended_by[i]))}
+                for i in ids.tolist()]
+        rows.sort(key=lambda row: row['word'])
+        return rows
+
+
+    def report(self):
+        return {
+            'summary': self.summary(),
+            'openings': self.openings(),
+            'game_lengths': self.game_lengths(),
+            'branching': self.branching(),
+            'unreachable': self.unreachable(),
+        }
+
+
+def _runs(offsets, counts):
+    """Indices offsets[0] .. offsets[0] + counts[0] - 1, then the same
+    for the second offset, and so on, as one array."""
+    total = int(counts.sum())
+    # each index is one more than the previous, except at the start of
+    # a run, where it jumps to that run's offset
+    steps = np.ones(total, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    steps[starts] = offsets - np.concatenate(([0], offsets[:-1] + counts[:-1] - 1))
+    return np.cumsum(steps)
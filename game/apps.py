@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class GameConfig(AppConfig):
     name = 'game'
+
+    def ready(self):
+        # Load the default dictionary on a background thread as soon as
+        # the app is set up, rather than in the first request for it.
+        # ghost/asgi.py and ghost/wsgi.py turn this on; management
+        # commands and scripts load what they need themselves.
+        if getattr(settings, 'GHOST_WARMUP', False):
+            from . import views
+            views.warmup.start()
@@ -1,49 +1,237 @@
 from os import path
+import os
 import re
 import logging
 import json
 
+from django.conf import settings
+
 from .Trie import Trie
+from .CompactTrie import CompactTrie
+from .DefinitionStore import DefinitionStore
+from .SubstringIndex import SubstringIndex
+from .assets.build_wordlist import load_ranks as load_word_ranks
 
 logger = logging.getLogger("ghostAppLogger")
 
 ###########################################################
-# Output variables
+# Trie implementation
+###########################################################
+
+TRIE_CLASSES = {
+    'dict': Trie,
+    'compact': CompactTrie,
+}
+
+# 'auto' memory-maps the trie snapshot when one is available and
+# otherwise builds a dict-based trie from the word list, or an
+# array-based one in prefork mode, whose pages stay shared between
+# workers because reading them never touches reference counts.
+TRIE_IMPL = getattr(settings, 'GHOST_TRIE_IMPL', 'auto')
+PREFORK = getattr(settings, 'GHOST_PREFORK', False)
+
+# Number of decoded definitions kept in memory per process when
+# reading from the definitions index.
+DEFINITIONS_CACHE_SIZE = getattr(settings, 'GHOST_DEFINITIONS_CACHE_SIZE', 1024)
+
+# Optional word frequency list (one word per line, most common first)
+# used to rank the "common" hints of the default dictionary. Trie
+# snapshots carry the ranks they were built with, so this is only
+# needed to override them.
+WORD_RANKS_PATH = getattr(settings, 'GHOST_WORD_RANKS_PATH', None)
+
+# Build the substring index used by Superghost. It is off by default
+# since building it and solving the game add about a second to start-up.
+SUPERGHOST_ENABLED = getattr(settings, 'GHOST_SUPERGHOST_ENABLED', False)
+
+
+###########################################################
+# Dictionaries
 ###########################################################
-EN_TRIE = None
-EN_DEFINITIONS = None
+
+# Name -> directory holding the files below for that dictionary.
+# Nothing is loaded until a dictionary is first asked for (see
+# load_assets()).
+DEFAULT_DICTIONARY_DIR = path.join(path.dirname(__file__), "static/game")
+DICTIONARIES = getattr(settings, 'GHOST_DICTIONARIES', None) or {'en': DEFAULT_DICTIONARY_DIR}
+DEFAULT_DICTIONARY = getattr(settings, 'GHOST_DEFAULT_DICTIONARY', 'en')
+
+WORDS_FILE = "wordlist.txt"
+DEFINITIONS_FILE = "definitions.json"
+TRIE_SNAPSHOT_FILE = "wordlist.trie"
+DEFINITIONS_INDEX_FILE = "definitions.idx"
+# touched by `manage.py reload_dictionary` to make every worker reload
+RELOAD_TRIGGER_FILE = ".reload"
+# the trie sent to the browser, named after a hash of its contents
+CLIENT_TRIE_FILE_PATTERN = re.compile(r"^wordlist\.[0-9a-f]+\.ctrie$")
 
 
 ###########################################################
 # Load files
 ###########################################################
 
-EN_WEBSTERS_WORDS_PATH = "static/game/wordlist.txt"
-EN_WEBSTERS_DICT_PATH = "static/game/definitions.json"
+def load_trie_snapshot(snapshot_path, words_path):
+  """Memory-maps the trie snapshot at `snapshot_path`.
 
-en_word_list = []
+  Returns None (after logging why) if the snapshot is missing,
+  older than the word list it was built from, or unreadable.
+  """
+  if not path.exists(snapshot_path):
+    return None
 
-logger.info(f"Loading EN words list from '{EN_WEBSTERS_WORDS_PATH}'")
+  if path.exists(words_path) and path.getmtime(words_path) > path.getmtime(snapshot_path):
+    logger.warning(f"Ignoring trie snapshot '{snapshot_path}': it is older than '{words_path}'.")
+    return None
 
-with open(path.join(path.dirname(__file__), EN_WEBSTERS_WORDS_PATH)) as f:
-  line = f.readline().strip().lower()
-  while line:
-    match = re.match(r"^[a-zA-Z]*$", line) 
-    if match is not None:
-      en_word_list.append(line)
-    else:
-      logger.error(f"File contains invalid token: '{line}'")
+  try:
+    return CompactTrie.open_snapshot(snapshot_path)
+  except (OSError, ValueError) as e:
+    logger.error(f"Could not load trie snapshot '{snapshot_path}': {e}")
+    return None
+
+
+def load_definitions_index(index_path, dict_path):
+  """Memory-maps the definitions index at `index_path`.
+
+  Returns None (after logging why) if the index is missing,
+  older than the JSON definitions, or unreadable.
+  """
+  if not path.exists(index_path):
+    return None
+
+  if path.exists(dict_path) and path.getmtime(dict_path) > path.getmtime(index_path):
+    logger.warning(f"Ignoring definitions index '{index_path}': it is older than '{dict_path}'.")
+    return None
+
+  try:
+    return DefinitionStore.open(index_path, DEFINITIONS_CACHE_SIZE)
+  except (OSError, ValueError) as e:
+    logger.error(f"Could not load definitions index '{index_path}': {e}")
+    return None
+
+
+def load_words_from_text(words_path):
+  """Reads a word list with one word per line, skipping invalid tokens."""
+  word_list = []
+
+  with open(words_path) as f:
     line = f.readline().strip().lower()
+    while line:
+      match = re.match(r"^[a-zA-Z]*$", line) 
+      if match is not None:
+        word_list.append(line)
+      else:
+        logger.error(f"File contains invalid token: '{line}'")
+      line = f.readline().strip().lower()
+
+  logger.info(f"Loaded {len(word_list)} words from file.")
+  return word_list
+
+
+def load_trie_from_text(words_path, trie_class):
+  """Builds a trie of the given class from a word list with one word per line."""
+  trie = trie_class()
+  trie.insert_all(load_words_from_text(words_path))
+  return trie
+
+
+def dictionary_path(name, filename):
+  return path.join(DICTIONARIES[name], filename)
+
+
+def watched_paths(name):
+  """Files whose changes call for a reload of dictionary `name`."""
+  paths = [dictionary_path(name, f) for f in (WORDS_FILE, TRIE_SNAPSHOT_FILE, DEFINITIONS_FILE,
+                                               DEFINITIONS_INDEX_FILE)]
+  if name == DEFAULT_DICTIONARY and WORD_RANKS_PATH:
+    paths.append(WORD_RANKS_PATH)
+  return paths
+
+
+def reload_trigger_path(name):
+  """File touched by `manage.py reload_dictionary` once it has rebuilt
+  dictionary `name`. While it exists, workers only watch it."""
+  return dictionary_path(name, RELOAD_TRIGGER_FILE)
+
+
+def load_trie(name):
+  words_path = dictionary_path(name, WORDS_FILE)
+  trie = None
+
+  if TRIE_IMPL in ('auto', 'compact'):
+    logger.info(f"Loading {name} trie snapshot from '{DICTIONARIES[name]}'")
+    trie = load_trie_snapshot(dictionary_path(name, TRIE_SNAPSHOT_FILE), words_path)
+
+  if trie is not None:
+    logger.info(f"Mapped {name} trie snapshot ({len(trie)} nodes).")
+  else:
+    if TRIE_IMPL == 'auto':
+      trie_impl = 'compact' if PREFORK else 'dict'
+    else:
+      trie_impl = TRIE_IMPL
+    logger.info(f"Loading {name} words list from '{words_path}'")
+    trie = load_trie_from_text(words_path, TRIE_CLASSES[trie_impl])
+    logger.info(f"Built {name} trie ({trie_impl}).")
+
+  return trie
+
+
+def load_definitions(name):
+  dict_path = dictionary_path(name, DEFINITIONS_FILE)
+  definitions = load_definitions_index(dictionary_path(name, DEFINITIONS_INDEX_FILE), dict_path)
+
+  if definitions is not None:
+    logger.info(f"Mapped {name} definitions index ({len(definitions)} entries).")
+  else:
+    logger.info(f"Loading full {name} dictionary from '{dict_path}'")
+    with open(dict_path) as f:
+      definitions = json.load(f)
+    logger.info(f"Loaded full {name} dictionary.")
+
+  return definitions
+
+
+def load_ranks(name):
+  if name != DEFAULT_DICTIONARY or not WORD_RANKS_PATH:
+    return None
+
+  logger.info(f"Loading {name} word ranks from '{WORD_RANKS_PATH}'")
+  ranks = load_word_ranks(WORD_RANKS_PATH)
+  logger.info(f"Loaded {len(ranks)} word ranks.")
+  return ranks
+
+
+def load_substring_index(name):
+  if not SUPERGHOST_ENABLED:
+    return None
+
+  logger.info(f"Building {name} substring index from '{DICTIONARIES[name]}'")
+  index = SubstringIndex(load_words_from_text(dictionary_path(name, WORDS_FILE)))
+  logger.info(f"Built {name} substring index ({len(index.forward)} states).")
+  return index
 
-logger.info(f"Loaded {len(en_word_list)} words from file.")
 
-EN_TRIE = Trie()
-EN_TRIE.insert_all(en_word_list)
+def find_client_trie(name):
+  """Name of the newest client trie file of dictionary `name`, or None
+  if build_wordlist.py has not written one."""
+  directory = DICTIONARIES[name]
+  try:
+    candidates = [f for f in os.listdir(directory) if CLIENT_TRIE_FILE_PATTERN.match(f)]
+  except OSError:
+    return None
+  if not candidates:
+    logger.info(f"No client trie for {name}; moves will only be checked by the server.")
+    return None
+  return max(candidates, key=lambda f: path.getmtime(path.join(directory, f)))
 
-logger.info("Built EN trie.")
 
+def load_assets(name):
+  """Loads everything the game needs for dictionary `name` from the
+  files on disk.
 
-logger.info(f"Loading full EN dictionary from '{EN_WEBSTERS_DICT_PATH}'")
-with open(path.join(path.dirname(__file__), EN_WEBSTERS_DICT_PATH)) as f:
-  EN_DEFINITIONS = json.load(f)
-logger.info("Loaded full EN dictionary.")
\ No newline at end of file
+  Returns:
+    (trie, definitions, word ranks or None, substring index or None,
+    client trie file name or None)
+  """
+  return (load_trie(name), load_definitions(name), load_ranks(name), load_substring_index(name),
+          find_client_trie(name))
@@ -19,11 +19,49 @@
 # its wordlist Trie to simply not include words which would not
 # constitute an endgame condition.)
 #
+# In addition to the word list, the script writes a binary snapshot of
+# the finished trie (including heights and move tables) and an
+# offset-indexed copy of the definitions. When they are present, the
+# server memory-maps them instead of parsing the text and JSON files,
+# so worker start-up no longer depends on the dictionary size. It also
+# writes a compact encoding of the trie for the browser, named after a
+# hash of its contents so that it can be cached indefinitely.
+#
+# The build is split into stages that stream their inputs, so memory
+# use does not grow with the size of the sources: the frequency list
+# is sorted in bounded runs that are merged from disk, and the full
+# dictionary is parsed one entry at a time. The content hashes of each
+# stage's inputs are recorded in a manifest in the output directory,
+# and a stage whose inputs and outputs are unchanged is skipped. The
+# time and peak memory of every stage are reported as it finishes.
+#
+# Usage:
+#   python build_wordlist.py [--output-dir DIR] [--force]
+#   python build_wordlist.py --snapshot-only --output-dir ../static/game
+#
 ###############################################################################
 
+from contextlib import contextmanager
 from os import path
+import argparse
+import hashlib
+import heapq
 import json
+import os
 import re
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+if __package__ in (None, ''):
+    # allow running as a plain script from any directory
+    sys.path.insert(0, path.abspath(path.join(path.dirname(__file__), '..', '..')))
+
+from game.ClientTrie import ClientTrie
+from game.CompactTrie import CompactTrie
+from game.DefinitionStore import DefinitionStore
 
 # Word list
 WORD_LIST = "gutenberg_top_10000.txt"
@@ -37,67 +75,445 @@ TGT_FILE = "wordlist.txt"
 # Output file for definitions
 TGT_SHORT_DICT = "definitions.json"
 
+# Output file for the binary trie snapshot
+TGT_SNAPSHOT = "wordlist.trie"
+
+# Output file for the indexed definitions
+TGT_DICT_INDEX = "definitions.idx"
+
+# Output file for the trie served to the browser; {} is replaced by
+# the start of the hash of its contents
+TGT_CLIENT_TRIE = "wordlist.{}.ctrie"
+CLIENT_TRIE_HASH_LENGTH = 12
+client_trie_pattern = re.compile(r"^wordlist\.[0-9a-f]+\.ctrie$")
+
+# Record of the input and output hashes of every stage. The leading
+# dot keeps collectstatic from publishing it.
+BUILD_MANIFEST = ".build_manifest.json"
+
+# Bump when a change to this script changes its outputs, so that
+# existing manifests no longer match.
+BUILD_VERSION = 2
+
+# Words sorted in memory at a time before being spilled to a run file
+SORT_BUFFER_SIZE = 1000000
+
+# Characters read from the source dictionary at a time
+READ_CHUNK_SIZE = 1 << 20
+
+# Longest key or value expected in the source dictionary, in
+# characters. One that still does not decode once this much has been
+# read is malformed.
+MAX_ENTRY_SIZE = 1 << 24
+
 # minimum word length is 4
 pattern = re.compile("^[a-zA-Z]{4,}$")
 
 def validate(word):
     return re.match(pattern, word) is not None
 
-with open(path.join(path.dirname(__file__), SRC_FILE)) as f:
-    dictionary = json.load(f)
 
-with open(path.join(path.dirname(__file__), WORD_LIST)) as f:
-    wordlist = [key.lower().strip() for key in f.readlines() if validate(key)]
+def load_wordlist(filename):
+    """Yields the valid words of a list with one word per line."""
+    with open(filename) as f:
+        for key in f:
+            if validate(key):
+                yield key.lower().strip()
+
+
+def load_ranks(filename):
+    """Reads a word frequency list with one word per line, most
+    common first, into a dict mapping each word to its rank."""
+    ranks = dict()
+    with open(filename) as f:
+        for line in f:
+            word = line.strip().lower()
+            if word and word not in ranks:
+                ranks[word] = len(ranks)
+    return ranks
+
+
+###############################################################################
+# Outputs are written to a temporary file that then replaces the target,
+# so a running server never sees (or has memory-mapped) a partly
+# written file; mappings of the old file stay valid.
+###############################################################################
+@contextmanager
+def replace_file(filename, mode):
+    fd, tmp_name = tempfile.mkstemp(dir=path.dirname(path.abspath(filename)),
+                                    prefix=path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+###############################################################################
+# Sort a stream of words that may not fit in memory. Up to buffer_size
+# words are sorted at a time and written to a temporary run file; the
+# runs are then merged lazily. Small inputs never touch the disk.
+###############################################################################
+def external_sort(words, buffer_size=SORT_BUFFER_SIZE, tmp_dir=None):
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as run_dir:
+        runs = []
+        buffer = []
+        for word in words:
+            buffer.append(word)
+            if len(buffer) >= buffer_size:
+                runs.append(write_run(sorted(buffer), run_dir, len(runs)))
+                buffer = []
+
+        if not runs:
+            yield from sorted(buffer)
+            return
+
+        if buffer:
+            runs.append(write_run(sorted(buffer), run_dir, len(runs)))
 
+        files = [open(run) for run in runs]
+        try:
+            yield from heapq.merge(*[(line.rstrip('\n') for line in f) for f in files])
+        finally:
+            for f in files:
+                f.close()
+
+
+def write_run(sorted_words, run_dir, number):
+    filename = path.join(run_dir, f"run{number:05d}.txt")
+    with open(filename, 'w') as f:
+        for word in sorted_words:
+            f.write(word + "\n")
+    return filename
 
-if not wordlist:
-    print("Error. No words have been loaded.")
-    exit()
-elif len(wordlist) < 2:
-    print("Error. Only one word has been loaded.")
-    exit()
 
 ###############################################################################
 # Remove all long words whose substrings are also words,
 # since the short word will be reached first and the game
 # will end before the longer word can ever be reached
 ###############################################################################
-wordlist.sort()
+def reduce_sorted(sorted_words):
+    """Reduces a sorted stream of words in a single pass. Every word
+    that starts with the last word kept (including duplicates) is
+    dominated by it."""
+    prev = None
+    for word in sorted_words:
+        if prev is None or not word.startswith(prev):
+            yield word
+            prev = word
+
+
+def reduce_wordlist(wordlist):
+    return list(reduce_sorted(sorted(wordlist)))
+
+
+###############################################################################
+# Read the entries of a JSON object one at a time, so that the full
+# dictionary never has to be held in memory.
+###############################################################################
+def iter_json_object(f, chunk_size=READ_CHUNK_SIZE, max_entry_size=MAX_ENTRY_SIZE):
+    """Yields the (key, value) pairs of the JSON object in text file `f`.
 
-reduced_wordlist = wordlist[0:1]
+    Raises ValueError (a JSONDecodeError for malformed values) without
+    reading on once a key or value is still incomplete after
+    `max_entry_size` characters.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'\s*')
+    buffer = ''
+    pos = 0
+    eof = False
 
-prev = wordlist[0]
-current = wordlist[1]
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
 
-for i in range(1, len(wordlist)):
-    if not current.startswith(prev):
-        reduced_wordlist.append(current)
-        prev = current
-    current = wordlist[i]
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = whitespace.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return
+            fill()
 
+    def expect(chars):
+        skip_whitespace()
+        if pos >= len(buffer) or buffer[pos] not in chars:
+            found = buffer[pos:pos + 20] if pos < len(buffer) else 'end of file'
+            raise ValueError(f"Expected one of {chars!r} in JSON object, found {found!r}.")
+        return buffer[pos]
+
+    def decode():
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - pos > max_entry_size:
+                    raise
+                fill()
+                continue
+            # a number may continue in the next chunk; complete values
+            # are always followed by whitespace or punctuation
+            if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,:}'):
+                fill()
+                continue
+            pos = end
+            return value
+
+    fill()
+    expect('{')
+    pos += 1
+    if expect('}"') == '}':
+        return
+
+    while True:
+        key = decode()
+        expect(':')
+        pos += 1
+        value = decode()
+        yield key, value
+
+        if expect(',}') == '}':
+            return
+        pos += 1
 
-# one last iteration to catch the final word in the dictionary
-if not current.startswith(prev):
-    reduced_wordlist.append(current)
 
 ###############################################################################
 # Create wordlist to be loaded into the Trie
 ###############################################################################
-with open(path.join(path.dirname(__file__), TGT_FILE), 'w') as f:
-    for word in reduced_wordlist:
-        f.write(word + "\n")
+def write_wordlist(reduced_wordlist, filename):
+    with replace_file(filename, 'w') as f:
+        for word in reduced_wordlist:
+            f.write(word + "\n")
+
+
+def read_wordlist(filename):
+    with open(filename) as f:
+        return [line.strip() for line in f if line.strip()]
 
 
 ###############################################################################
 # Create reduced dictionary that only contains the words that exist
 # in the wordlist.
 ###############################################################################
+def write_definitions(reduced_wordlist, entries, filename):
+    """Writes the definitions of the words in `reduced_wordlist`, taken
+    from the (word, definition) pairs in `entries`."""
+    wanted = set(reduced_wordlist)
+    reduced_dict = dict()
+    for word, definition in entries:
+        if word in wanted and definition is not None:
+            reduced_dict[word] = definition
+
+    with replace_file(filename, 'w') as f:
+        json.dump(reduced_dict, f)
+
+    return reduced_dict
+
+
+###############################################################################
+# Create the binary trie snapshot that is memory-mapped by the server
+###############################################################################
+def write_snapshot(reduced_wordlist, filename, ranks=None):
+    trie = CompactTrie()
+    trie.insert_all(reduced_wordlist)
+    trie.calculate_move_tables()
+    trie.calculate_hint_tables(ranks)
+
+    with replace_file(filename, 'wb') as f:
+        trie.write_snapshot(f)
+
+
+###############################################################################
+# Create the trie served to the browser, which validates moves with it
+###############################################################################
+def write_client_trie(reduced_wordlist, output_dir):
+    """Writes the client trie under a name derived from its contents
+    and removes those written by earlier builds. Returns the path of
+    the new file."""
+    trie = CompactTrie()
+    trie.insert_all(reduced_wordlist)
+    data = ClientTrie.encode(trie)
+
+    filename = path.join(output_dir, TGT_CLIENT_TRIE.format(
+        hashlib.sha256(data).hexdigest()[:CLIENT_TRIE_HASH_LENGTH]))
+    with replace_file(filename, 'wb') as f:
+        f.write(data)
+
+    for name in os.listdir(output_dir):
+        if client_trie_pattern.match(name) and name != path.basename(filename):
+            os.remove(path.join(output_dir, name))
+    return filename
+
+
+###############################################################################
+# Create the definitions index that is memory-mapped by the server
+###############################################################################
+def write_definitions_index(reduced_dict, filename):
+    with replace_file(filename, 'wb') as f:
+        DefinitionStore.write(reduced_dict.items(), f)
+
+
+###############################################################################
+# Incremental builds
+###############################################################################
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def inputs_hash(inputs):
+    """Hash of the build version and the contents of the given files
+    (None entries stand for an absent optional input)."""
+    digest = hashlib.sha256(str(BUILD_VERSION).encode())
+    for filename in inputs:
+        digest.update((file_hash(filename) if filename else '-').encode())
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    try:
+        with open(path.join(output_dir, BUILD_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, output_dir):
+    with replace_file(path.join(output_dir, BUILD_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+@contextmanager
+def measure(name, trace_memory):
+    """Prints the wall time and peak memory of the enclosed stage.
+    Peak RSS is for the whole process so far; with `trace_memory`
+    the peak of Python allocations within the stage is also shown."""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    line = f"{name:<20} {elapsed:8.3f} s   peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:8.1f} MB"
+    if trace_memory:
+        line += f"   peak allocated {tracemalloc.get_traced_memory()[1] / 2 ** 20:8.1f} MB"
+        tracemalloc.stop()
+    print(line)
+
+
+def run_stage(name, inputs, outputs, build, manifest, args):
+    """Runs `build` unless the manifest shows that the stage already
+    ran on the same inputs and its outputs are untouched since.
+
+    Pass outputs=None for a stage whose file names depend on what it
+    writes: `build` then returns the list of outputs, and the ones
+    recorded in the manifest are checked instead.
+    """
+    key = inputs_hash(inputs)
+    entry = manifest.get(name)
+    if outputs is None:
+        outputs = [path.join(args.output_dir, o) for o in entry['outputs']] if entry else []
+    if (not args.force and entry is not None and entry['inputs'] == key
+            and all(path.exists(o) and file_hash(o) == entry['outputs'].get(path.basename(o))
+                    for o in outputs)):
+        # the server ignores snapshots older than the word list, so
+        # skipped outputs must still look newer than their inputs
+        for output in outputs:
+            os.utime(output)
+        print(f"{name:<20} unchanged, skipped")
+        return
+
+    with measure(name, args.trace_memory):
+        outputs = build() or outputs
+    manifest[name] = {
+        'inputs': key,
+        'outputs': {path.basename(o): file_hash(o) for o in outputs},
+    }
+    save_manifest(manifest, args.output_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the Ghost word list, definitions and trie snapshot.")
+    parser.add_argument('--output-dir', default=path.dirname(__file__),
+                        help="directory the output files are written to (default: this directory)")
+    parser.add_argument('--snapshot-only', action='store_true',
+                        help=f"only rebuild {TGT_SNAPSHOT}, {TGT_DICT_INDEX} and the client trie from the "
+                             f"{TGT_FILE} and {TGT_SHORT_DICT} in the output directory")
+    parser.add_argument('--ranks',
+                        help="word frequency list (one word per line, most common first) "
+                             "used to rank the common-word hints stored in the snapshot")
+    parser.add_argument('--force', action='store_true',
+                        help="rebuild every stage even if its inputs are unchanged")
+    parser.add_argument('--sort-buffer', type=int, default=SORT_BUFFER_SIZE,
+                        help=f"words sorted in memory before spilling to disk (default: {SORT_BUFFER_SIZE})")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also report the peak Python allocations of each stage (slower)")
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.output_dir)
+    word_list = path.join(path.dirname(__file__), WORD_LIST)
+    src_file = path.join(path.dirname(__file__), SRC_FILE)
+    tgt_file = path.join(args.output_dir, TGT_FILE)
+    tgt_short_dict = path.join(args.output_dir, TGT_SHORT_DICT)
+    tgt_snapshot = path.join(args.output_dir, TGT_SNAPSHOT)
+    tgt_dict_index = path.join(args.output_dir, TGT_DICT_INDEX)
+
+    if not args.snapshot_only:
+        def build_wordlist():
+            sorted_words = external_sort(load_wordlist(word_list), args.sort_buffer)
+            write_wordlist(reduce_sorted(sorted_words), tgt_file)
+
+        run_stage('wordlist', [word_list], [tgt_file], build_wordlist, manifest, args)
+
+        reduced_wordlist = read_wordlist(tgt_file)
+        if not reduced_wordlist:
+            print("Error. No words have been loaded.")
+            exit()
+        elif len(reduced_wordlist) < 2:
+            print("Error. Only one word has been loaded.")
+            exit()
+
+        def build_definitions():
+            with open(src_file) as f:
+                write_definitions(reduced_wordlist, iter_json_object(f), tgt_short_dict)
+
+        run_stage('definitions', [tgt_file, src_file], [tgt_short_dict], build_definitions, manifest, args)
+
+    if path.exists(tgt_short_dict):
+        def build_definitions_index():
+            with open(tgt_short_dict) as f:
+                write_definitions_index(json.load(f), tgt_dict_index)
+
+        run_stage('definitions_index', [tgt_short_dict], [tgt_dict_index],
+                  build_definitions_index, manifest, args)
+
+    def build_snapshot():
+        ranks = load_ranks(args.ranks) if args.ranks else None
+        write_snapshot(read_wordlist(tgt_file), tgt_snapshot, ranks)
+
+    run_stage('snapshot', [tgt_file, args.ranks], [tgt_snapshot], build_snapshot, manifest, args)
+
+    def build_client_trie():
+        filename = write_client_trie(read_wordlist(tgt_file), args.output_dir)
+        print(f"Wrote {path.basename(filename)} ({path.getsize(filename)} bytes)")
+        return [filename]
+
+    run_stage('client_trie', [tgt_file], None, build_client_trie, manifest, args)
 
-reduced_dict = dict()
-for word in reduced_wordlist:
-    definition = dictionary.get(word, None)
-    if definition is not None:
-        reduced_dict[word] = definition
 
-with open(path.join(path.dirname(__file__), TGT_SHORT_DICT), 'w') as f:
-    json.dump(reduced_dict, f)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
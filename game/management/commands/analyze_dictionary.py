@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game import asset_loader
+from game.assets import build_wordlist
+from game.CompactTrie import CompactTrie
+
+# report -> columns of its CSV file
+TABLES = {
+    'openings': ['letter', 'words', 'winner', 'best_play_length', 'longest_game'],
+    'game_lengths': ['length', 'words', 'openings'],
+    'branching': ['depth', 'nodes', 'words', 'branches', 'mean_children', 'max_children'],
+    'unreachable': ['word', 'ended_by'],
+}
+
+
+class Command(BaseCommand):
+    help = ("Reports statistics of a whole dictionary: the winner of every opening letter "
+            "under best play, the lengths of games, the branching factor by depth, and the "
+            "words no game can reach because a shorter word ends it first. Needs NumPy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dictionary', default=asset_loader.DEFAULT_DICTIONARY)
+        parser.add_argument('--words', metavar='FILE',
+                            help="analyze a word list with one word per line instead (such as the "
+                                 "unreduced source of build_wordlist.py), keeping the words it would")
+        parser.add_argument('--format', choices=('json', 'csv'), default='json')
+        parser.add_argument('--output',
+                            help="file for the JSON report (default: standard output), or directory "
+                                 "for the CSV files, one per report")
+
+    def handle(self, *args, **options):
+        try:
+            from game.TrieAnalytics import TrieAnalytics
+        except ImportError:
+            raise CommandError("analyze_dictionary needs NumPy: pip install numpy")
+        if options['format'] == 'csv' and not options['output']:
+            raise CommandError("--format csv needs an --output directory.")
+
+        start_time = time.perf_counter()
+        trie = self.load(options)
+        # a trie built from text lays out its arrays on first use
+        len(trie)
+        loaded = time.perf_counter()
+        report = TrieAnalytics(trie).report()
+        analyzed = time.perf_counter()
+
+        if options['format'] == 'json':
+            self.write_json(report, options['output'])
+        else:
+            self.write_csv(report, options['output'])
+        self.stderr.write(f"Loaded {len(trie)} nodes in {loaded - start_time:.2f} s, "
+                          f"analyzed them in {analyzed - loaded:.2f} s.")
+
+    def load(self, options):
+        if options['words']:
+            if not os.path.exists(options['words']):
+                raise CommandError(f"No such file: {options['words']}")
+            trie = CompactTrie()
+            trie.insert_all(build_wordlist.load_wordlist(options['words']))
+            return trie
+
+        name = options['dictionary']
+        if name not in asset_loader.DICTIONARIES:
+            raise CommandError(f"Unknown dictionary: {name}")
+        words_path = asset_loader.dictionary_path(name, asset_loader.WORDS_FILE)
+        trie = asset_loader.load_trie_snapshot(
+            asset_loader.dictionary_path(name, asset_loader.TRIE_SNAPSHOT_FILE), words_path)
+        if trie is None:
+            trie = asset_loader.load_trie_from_text(words_path, CompactTrie)
+        return trie
+
+    def write_json(self, report, output):
+        if output is None:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def write_csv(self, report, output):
+        os.makedirs(output, exist_ok=True)
+        for name, columns in TABLES.items():
+            with open(os.path.join(output, f"{name}.csv"), 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(report[name])
+        with open(os.path.join(output, 'summary.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['statistic', 'value'])
+            writer.writerows(report['summary'].items())
@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game import asset_loader
+from game.assets import build_wordlist
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the trie snapshot and definitions index of each dictionary from its "
+            "wordlist.txt and definitions.json, then makes every running worker that has "
+            "it loaded load it again. Games in progress finish on the dictionary they "
+            "started with.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dictionary', action='append', dest='dictionaries', metavar='NAME',
+                            help="dictionary to rebuild (may be repeated; default: all of GHOST_DICTIONARIES)")
+        parser.add_argument('--no-build', action='store_true',
+                            help="only signal the workers, without rebuilding the snapshot and index")
+        parser.add_argument('--force', action='store_true',
+                            help="rebuild even if the inputs are unchanged")
+
+    def handle(self, *args, **options):
+        names = options['dictionaries'] or list(asset_loader.DICTIONARIES)
+        unknown = [name for name in names if name not in asset_loader.DICTIONARIES]
+        if unknown:
+            raise CommandError(f"Unknown dictionaries: {', '.join(unknown)}")
+
+        for name in names:
+            trigger = asset_loader.reload_trigger_path(name)
+            if not os.path.exists(trigger):
+                # while the trigger exists workers ignore the files
+                # being rebuilt; an empty one does not reload them
+                open(trigger, 'w').close()
+
+            if not options['no_build']:
+                argv = ['--snapshot-only', '--output-dir', asset_loader.DICTIONARIES[name]]
+                if options['force']:
+                    argv.append('--force')
+                build_wordlist.main(argv)
+
+            # workers poll this file (see GHOST_DICTIONARY_WATCH_INTERVAL)
+            with open(trigger, 'w') as f:
+                f.write(f"{time.time()}\n")
+            self.stdout.write(f"Workers will load the new '{name}' dictionary within the watch interval.")
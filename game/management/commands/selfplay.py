@@ -0,0 +1,132 @@
+from multiprocessing import Pool
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game import asset_loader
+from game.SelfPlay import (STRATEGIES, SelfPlayResult, create_strategy, init_worker,
+                           play_chunk, read_results, write_record)
+
+
+class Command(BaseCommand):
+    help = ("Plays seeded games of Ghost between two strategies across a pool of processes "
+            "and reports win rates, game lengths and games per second. Results are "
+            "appended to a file as they come in, so an interrupted run can be resumed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('strategies', nargs=2, metavar='STRATEGY',
+                            help="'random', 'best', 'solved', 'easy', 'medium', 'hard', or the dotted path "
+                                 "of a GhostStrategy class")
+        parser.add_argument('--games', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="games played per task (and per line of the results file)")
+        parser.add_argument('--dictionary', default=asset_loader.DEFAULT_DICTIONARY)
+        parser.add_argument('--output', default='selfplay.jsonl',
+                            help="results file (default: selfplay.jsonl)")
+        parser.add_argument('--resume', action='store_true',
+                            help="continue the run recorded in --output, skipping the chunks it already has")
+
+    def handle(self, *args, **options):
+        if options['dictionary'] not in asset_loader.DICTIONARIES:
+            raise CommandError(f"Unknown dictionary: {options['dictionary']}")
+        for name in options['strategies']:
+            if name not in STRATEGIES:
+                # fail before loading anything
+                try:
+                    create_strategy(name, None)
+                except ValueError as e:
+                    raise CommandError(str(e))
+
+        params = {
+            'strategies': options['strategies'],
+            'games': options['games'],
+            'seed': options['seed'],
+            'chunk_size': options['chunk_size'],
+            'dictionary': options['dictionary'],
+        }
+        output = options['output']
+        done = self.resume(output, params) if options['resume'] else {}
+        if not options['resume'] and os.path.exists(output):
+            raise CommandError(f"{output} already exists; pass --resume to continue it.")
+
+        chunk_size = params['chunk_size']
+        tasks = [(chunk, start, min(chunk_size, params['games'] - start), params['seed'])
+                 for chunk, start in enumerate(range(0, params['games'], chunk_size))
+                 if chunk not in done]
+
+        total = SelfPlayResult()
+        for result in done.values():
+            total.merge(result)
+        played = SelfPlayResult()
+
+        if tasks:
+            # a worker whose initializer raises is replaced by the pool
+            # over and over, so load here first; forked workers then
+            # start with the dictionary already loaded
+            try:
+                init_worker(params['dictionary'], params['strategies'])
+            except Exception as e:
+                raise CommandError(f"Could not load {params['dictionary']}: {e}")
+
+        start_time = time.perf_counter()
+        is_new = not os.path.exists(output)
+        with open(output, 'a') as f:
+            if is_new:
+                write_record(f, params)
+            if tasks:
+                with Pool(options['workers'], initializer=init_worker,
+                          initargs=(params['dictionary'], params['strategies'])) as pool:
+                    for chunk, result in pool.imap_unordered(_play_chunk, tasks):
+                        write_record(f, {'chunk': chunk, 'result': result})
+                        result = SelfPlayResult.from_dict(result)
+                        played.merge(result)
+                        total.merge(result)
+        elapsed = time.perf_counter() - start_time
+
+        self.report(params, total, played, elapsed)
+
+    def resume(self, output, params):
+        if not os.path.exists(output):
+            return {}
+        recorded, done = read_results(output)
+        if recorded != params:
+            raise CommandError(f"{output} was written by a run with different settings: {recorded}")
+
+        # drop a partly written last line, so appended records start on
+        # a line of their own
+        with open(output, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+        self.stdout.write(f"Resuming: {len(done)} chunks already played.")
+        return done
+
+    def report(self, params, total, played, elapsed):
+        names = params['strategies']
+        self.stdout.write(f"{total.games} games of {names[0]} against {names[1]} "
+                          f"(each moves first in half of them)")
+        for seat, name in enumerate(names):
+            if total.games:
+                self.stdout.write(f"  {name:<12} wins {total.wins[seat] / total.games:7.2%}   "
+                                  f"as first player {total.first_wins[seat]:>10}   "
+                                  f"as second {total.wins[seat] - total.first_wins[seat]:>10}")
+
+        if total.games:
+            self.stdout.write(f"Letters per game: mean {total.mean_length():.2f}, "
+                              f"median {total.percentile(0.5)}, 90th percentile {total.percentile(0.9)}, "
+                              f"max {max(total.lengths)}")
+            for length in sorted(total.lengths):
+                share = total.lengths[length] / total.games
+                self.stdout.write(f"  {length:>3} {total.lengths[length]:>10} {share:7.2%} {'#' * round(share * 50)}")
+
+        if played.games and elapsed > 0:
+            self.stdout.write(f"Played {played.games} games in {elapsed:.2f} s "
+                              f"({played.games / elapsed:,.0f} games/s, including worker start-up)")
+
+
+def _play_chunk(task):
+    return play_chunk(*task)
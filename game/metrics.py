@@ -0,0 +1,157 @@
+from bisect import bisect_left
+import functools
+import inspect
+import threading
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets. Most
+# stages take microseconds, so the low end is finely divided.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class Histogram(object):
+    """Cumulative histogram in the Prometheus sense: each bucket
+    counts the observations less than or equal to its bound."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Counter(object):
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(object):
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class MetricsRegistry(object):
+    """Collects histograms, counters and gauges and renders them in the
+    Prometheus text exposition format.
+
+    Metrics are identified by a name and a set of labels. Functions
+    and methods are timed by wrapping them (see timed() and
+    instrument()), so code that is never instrumented pays nothing.
+    """
+
+    def __init__(self, namespace='ghost'):
+        self.namespace = namespace
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+
+    def histogram(self, name, help_text, **labels):
+        return self._get(Histogram, name, help_text, labels)
+
+
+    def counter(self, name, help_text, **labels):
+        return self._get(Counter, name, help_text, labels)
+
+
+    def gauge(self, name, help_text, **labels):
+        return self._get(Gauge, name, help_text, labels)
+
+
+    def timed(self, func, stage):
+        """Returns a wrapper around `func` (which may be a coroutine
+        function) that records its duration under `stage`."""
+        histogram = self.histogram('stage_seconds', "Time spent in each stage of a request.", stage=stage)
+        clock = time.perf_counter
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(clock() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(clock() - start)
+        return wrapper
+
+
+    def instrument(self, obj, attribute, stage):
+        """Replaces the method `attribute` of `obj` (on that instance
+        only) with a timed version."""
+        setattr(obj, attribute, self.timed(getattr(obj, attribute), stage))
+
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items(), key=lambda item: item[0])
+
+        previous = None
+        for (name, labels), metric in metrics:
+            full_name = f"{self.namespace}_{name}"
+            if name != previous:
+                kind = {Histogram: 'histogram', Counter: 'counter', Gauge: 'gauge'}[type(metric)]
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                previous = name
+
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), metric.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{full_name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{_labels(labels)} {metric.sum}")
+                lines.append(f"{full_name}_count{_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{full_name}{_labels(labels)} {metric.value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+    def _get(self, metric_class, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = metric_class()
+                self._help[name] = help_text
+        return metric
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+registry = MetricsRegistry()
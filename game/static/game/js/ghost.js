@@ -0,0 +1,224 @@
+// Checks the player's moves in the browser. A letter that leaves the
+// dictionary or completes a word is sent to /api/move, and the loss is
+// shown once the server confirms it; the other moves are submitted with
+// the form as usual.
+//
+// The trie is the compact encoding written by build_wordlist.py
+// (see game/ClientTrie.py for the layout).
+(function () {
+  'use strict';
+
+  var MAGIC = 'GHCT';
+  var VERSION = 1;
+  var HEADER_SIZE = 10;
+
+  function decodeTrie(buffer) {
+    var view = new DataView(buffer);
+    var bytes = new Uint8Array(buffer);
+    var magic = String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]);
+    if (magic !== MAGIC || view.getUint16(4, true) !== VERSION) {
+      throw new Error('Unsupported client trie');
+    }
+
+    var count = view.getUint32(6, true);
+    var labels = bytes.subarray(HEADER_SIZE, HEADER_SIZE + count);
+    var childCount = bytes.subarray(HEADER_SIZE + count, HEADER_SIZE + 2 * count);
+    var terminal = bytes.subarray(HEADER_SIZE + 2 * count, HEADER_SIZE + 2 * count + ((count + 7) >> 3));
+
+    // nodes are breadth first, so children are contiguous and follow
+    // their parent
+    var firstChild = new Uint32Array(count);
+    var following = 1;
+    for (var node = 0; node < count; node++) {
+      firstChild[node] = following;
+      following += childCount[node];
+    }
+
+    var height = new Uint16Array(count);
+    for (node = count - 1; node >= 0; node--) {
+      var end = firstChild[node] + childCount[node];
+      for (var child = firstChild[node]; child < end; child++) {
+        if (height[child] + 1 > height[node]) {
+          height[node] = height[child] + 1;
+        }
+      }
+    }
+
+    return {
+      // node id reached by `word`, or -1 if no word starts with it
+      find: function (word) {
+        var node = 0;
+        for (var i = 0; i < word.length && node >= 0; i++) {
+          var code = word.charCodeAt(i);
+          var end = firstChild[node] + childCount[node];
+          var next = -1;
+          for (var child = firstChild[node]; child < end; child++) {
+            if (labels[child] === code) {
+              next = child;
+              break;
+            }
+          }
+          node = next;
+        }
+        return node;
+      },
+      isWord: function (node) {
+        return (terminal[node >> 3] >> (node & 7) & 1) === 1;
+      },
+      height: function (node) {
+        return height[node];
+      },
+      size: count
+    };
+  }
+
+  function setText(id, html) {
+    var element = document.getElementById(id);
+    if (element) {
+      element.innerHTML = html;
+    }
+  }
+
+  function escape(text) {
+    var div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+  }
+
+  function showLoss(word, move) {
+    setText('prefix-letters', escape(word));
+    setText('game-status', '<span class="nes-text is-error">You lose!</span>');
+    if (move.definition) {
+      setText('game-definition', escape(move.definition));
+    }
+    if (move.suggestions && move.suggestions.length) {
+      setText('suggestions', 'Did you mean ' + move.suggestions.map(function (suggestion) {
+        return '<span class="nes-text is-primary">' + escape(suggestion) + '</span>';
+      }).join(', ') + '?');
+    }
+    if (move.hints && move.hints.length) {
+      setText('hint', 'Hint: You could have  tried for ' + move.hints.map(function (hint) {
+        return '<span class="nes-text is-success">' + escape(hint) + '</span>';
+      }).join(', ') + '!');
+    }
+  }
+
+  // Shows a reply that does not end the game with the player's loss,
+  // as the page would after submitting the form.
+  function showMove(form, input, move) {
+    if (move.is_game_over) {
+      input.remove();
+      form.elements.prefix.value = '';
+      form.elements.session.value = '';
+      setText('prefix-letters', escape(move.word));
+      setText('game-status', '<span class="nes-text is-primary">You win!</span>');
+      if (move.definition) {
+        setText('game-definition', escape(move.definition));
+      }
+      return;
+    }
+    input.disabled = false;
+    input.value = '';
+    form.elements.prefix.value = move.word;
+    form.elements.session.value = move.session;
+    setText('prefix-letters', escape(move.word));
+    setText('game-status', 'Game on! Type in another letter to continue.');
+  }
+
+  // The trie says the letter loses; the server has the last word,
+  // since the trie may belong to an older version of the dictionary.
+  // Its reply also carries the hint, suggestions and definition, and
+  // ends the game's session there. Returns false if the server
+  // disagreed, after showing its reply.
+  function endGame(form, input, word, letter) {
+    input.disabled = true;
+    setText('game-status', 'Checking...');
+
+    return fetch(form.dataset.moveUrl, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({
+        prefix: word.slice(0, -1),
+        input: letter,
+        session: form.elements.session.value,
+        dictionary: form.elements.dictionary.value,
+        hint: true,
+        suggest: true,
+        definition: true
+      })
+    }).then(function (response) {
+      if (!response.ok) {
+        throw new Error('Move rejected with status ' + response.status);
+      }
+      return response.json();
+    }).then(function (move) {
+      if (move.is_game_over && move.word === null) {
+        input.remove();
+        form.elements.prefix.value = '';
+        form.elements.session.value = '';
+        showLoss(word, move);
+        return true;
+      }
+      showMove(form, input, move);
+      return false;
+    });
+  }
+
+  function start(form, trie) {
+    // set once the trie disagrees with the server
+    var stale = false;
+
+    form.addEventListener('submit', function (event) {
+      var input = document.getElementById('input-txt');
+      // the reset button, a finished game, a dictionary other than
+      // the one this trie belongs to, or a trie known to be out of date
+      if (event.submitter && event.submitter.name === 'reset' || !input || stale ||
+          form.elements.dictionary.value !== form.dataset.dictionary) {
+        return;
+      }
+
+      var letter = input.value.toLowerCase();
+      if (!/^[a-z]$/.test(letter)) {
+        event.preventDefault();
+        setText('game-status', 'Type in a single letter.');
+        return;
+      }
+
+      var word = form.elements.prefix.value.toLowerCase() + letter;
+      var node = trie.find(word);
+      if (node < 0 || trie.isWord(node)) {
+        event.preventDefault();
+        endGame(form, input, word, letter).then(function (confirmed) {
+          stale = !confirmed;
+        }).catch(function (error) {
+          // leave this move to the form and the server
+          console.warn(error);
+          stale = true;
+          input.disabled = false;
+          setText('game-status', 'Could not check the move. Submit it again.');
+        });
+      }
+    });
+  }
+
+  var form = document.getElementById('game-form');
+  if (!form || !form.dataset.trieUrl || !window.fetch) {
+    return;
+  }
+
+  // without the trie every move is simply checked by the server
+  fetch(form.dataset.trieUrl).then(function (response) {
+    if (!response.ok) {
+      throw new Error('Could not load the client trie');
+    }
+    return response.arrayBuffer();
+  }).then(function (buffer) {
+    var started = performance.now();
+    var trie = decodeTrie(buffer);
+    console.debug('Decoded ' + trie.size + ' trie nodes (' + buffer.byteLength + ' bytes) in ' +
+                  (performance.now() - started).toFixed(1) + ' ms');
+    start(form, trie);
+  }).catch(function (error) {
+    console.warn(error);
+  });
+})();
@@ -0,0 +1,1347 @@
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+import contextlib
+import gc
+import inspect
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from unittest import mock, skipIf
+from urllib.parse import urlencode
+import weakref
+
+from benchmarks.run import compare, synthetic_words
+
+from . import asset_loader, SelfPlay, urls, views
+from . import DictionaryRegistry as DictionaryRegistry_module
+from .assets import build_wordlist
+from .ClientTrie import ClientTrie
+from .CompactTrie import CompactTrie
+from .DefinitionStore import DefinitionStore
+from .DictionaryRegistry import Dictionary, DictionaryLibrary, DictionaryRegistry, DictionaryWarmup, StageTimer
+from .GameSessions import GameSessionStore
+from .GhostGame import GhostGame, SuperghostGame, HINT_COMMON, HINT_LONGEST
+from .GhostSolver import GhostSolver
+from .GhostStrategies import DIFFICULTIES, SuperghostStrat
+from .metrics import MetricsRegistry
+from .ResponseCache import ResponseCache
+from .SubstringIndex import SubstringIndex
+from .Suggester import Suggester
+from .Trie import TRIE_BRANCH, Trie
+
+try:
+    from .TrieAnalytics import TrieAnalytics
+except ImportError:
+    # NumPy is only needed by analyze_dictionary
+    TrieAnalytics = None
+
+# A small dictionary with words of different heights under one letter,
+# a word that is a prefix of another (for lists that are not reduced)
+# and a letter with a single word.
+WORDS = ['apple', 'apricot', 'band', 'banana', 'bandana', 'cat', 'cater', 'dog']
+
+
+def build(trie_class, words=WORDS):
+    trie = trie_class()
+    trie.insert_all(words)
+    trie.calculate_heights()
+    trie.calculate_move_tables()
+    return trie
+
+
+def walk(trie):
+    """Yields (prefix, node) for every node, parents first."""
+    stack = [('', trie.root)]
+    while stack:
+        prefix, node = stack.pop()
+        yield prefix, node
+        stack.extend((prefix + letter, child) for letter, child in node.iter_children())
+
+
+###########################################################
+# Tries
+###########################################################
+
+class CompactTrieTests(SimpleTestCase):
+
+    def assertSameTrie(self, compact, reference):
+        nodes = dict(walk(reference))
+        compact_nodes = dict(walk(compact))
+        self.assertEqual(sorted(compact_nodes), sorted(nodes))
+        for prefix, node in nodes.items():
+            other = compact_nodes[prefix]
+            self.assertEqual(other.value, node.value, prefix)
+            self.assertEqual(other.depth, node.depth, prefix)
+            self.assertEqual(other.height, node.height, prefix)
+            self.assertEqual(other.has_children, node.has_children, prefix)
+            self.assertEqual(sorted(other.children), sorted(node.children), prefix)
+
+    def test_matches_trie(self):
+        self.assertSameTrie(build(CompactTrie), build(Trie))
+
+    def test_find(self):
+        trie = build(CompactTrie)
+        self.assertEqual(trie.find('band').value, 'band')
+        self.assertEqual(trie.find('ban').value, TRIE_BRANCH)
+        self.assertIsNone(trie.find('bx'))
+        self.assertIsNone(trie.find('bĀ'))
+        self.assertEqual(trie.find('').id, CompactTrie.ROOT)
+
+    def test_child_and_iter_children(self):
+        node = build(CompactTrie).find('ap')
+        self.assertEqual([letter for letter, _ in node.iter_children()], ['p', 'r'])
+        self.assertEqual(node.child('r'), node.children['r'])
+        self.assertIsNone(node.child('z'))
+        self.assertFalse(node.trie.find('apple').has_children)
+
+    def test_words_sorted(self):
+        self.assertEqual(list(build(CompactTrie).words()), sorted(WORDS))
+
+    def test_insert_and_remove(self):
+        compact = build(CompactTrie)
+        reference = build(Trie)
+        for trie in (compact, reference):
+            trie.insert('bandit')
+            trie.remove('apricot')
+            trie.calculate_heights()
+        self.assertFalse(compact.remove('apricot'))
+        self.assertIsNone(compact.find('apr'))
+        self.assertSameTrie(compact, reference)
+
+
+class ClientTrieTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        compact = build(CompactTrie)
+        client = ClientTrie(ClientTrie.encode(compact))
+        self.assertEqual(len(client), len(compact))
+        for prefix, node in walk(compact):
+            found = client.find_id(prefix)
+            self.assertEqual(found, node.id, prefix)
+            self.assertEqual(client.is_word(found), node.value != TRIE_BRANCH, prefix)
+            self.assertEqual(client.height(found), node.height, prefix)
+        for value in ('x', 'bx', 'dogs', 'bĀ'):
+            self.assertIsNone(client.find_id(value), value)
+
+    def test_rejects_other_buffers(self):
+        data = ClientTrie.encode(build(CompactTrie))
+        for bad in (data[:4], b'XXXX' + data[4:], data[:4] + b'\x02\x00' + data[6:]):
+            with self.assertRaises(ValueError):
+                ClientTrie(bad)
+
+
+class MoveTableTests(SimpleTestCase):
+
+    def test_tables_match_heights(self):
+        for trie_class in (Trie, CompactTrie):
+            trie = build(trie_class)
+            for prefix, node in walk(trie):
+                if not node.has_children:
+                    continue
+                moves = node.moves
+                children = dict(node.iter_children())
+                self.assertEqual(sorted(moves.letters), sorted(children), prefix)
+                for letter in moves.winners:
+                    self.assertEqual(children[letter].height % 2, 1)
+                for letter in moves.losers:
+                    self.assertEqual(children[letter].height % 2, 0)
+                heights = [children[letter].height for letter in moves.losers]
+                self.assertEqual(heights, sorted(heights, reverse=True))
+                self.assertEqual(set(moves.terminals),
+                                 {letter for letter, child in children.items() if not child.has_children})
+
+    def test_compact_tables_are_calculated_on_first_use(self):
+        trie = CompactTrie()
+        trie.insert_all(WORDS)
+        self.assertEqual(trie.find('ca').moves.letters, 't')
+
+    def test_word_with_continuations_does_not_end_the_game(self):
+        # 'cat' can be continued into 'cater', so playing its last
+        # letter does not end the game (a reduced list has no such words)
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class))
+            move = game.make_move('ca')
+            self.assertEqual(move.word, 'cat')
+            self.assertFalse(move.is_game_over)
+            move = game.make_move('cate')
+            self.assertEqual(move.word, 'cater')
+            self.assertTrue(move.is_game_over)
+
+
+class MakeMovesTests(SimpleTestCase):
+
+    def test_matches_make_move(self):
+        words = [prefix for prefix, _ in walk(build(Trie))]
+        # words out of the trie, repeated words and words sharing prefixes
+        words += ['x', 'catz', 'cats', 'apx', 'ban', 'ban', '']
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class))
+            for difficulty in (None,) + DIFFICULTIES:
+                for draw in (0.0, 0.5, 0.99):
+                    # the same draw for every move, however it is drawn
+                    with mock.patch('random.random', return_value=draw), \
+                            mock.patch('random.choice', lambda letters: letters[int(draw * len(letters))]):
+                        moves = game.make_moves(words, difficulty)
+                        expected = [game.make_move(word, difficulty=difficulty) for word in words]
+                    self.assertEqual([move.as_dict() for move in moves],
+                                     [move.as_dict() for move in expected], (trie_class, difficulty, draw))
+
+
+class FrequencyWeightedStratTests(SimpleTestCase):
+
+    def play_everywhere(self, game, difficulty):
+        """Plays every draw at every branch node a game can reach."""
+        for prefix, node in walk(game.wordlist):
+            if node.value == TRIE_BRANCH and node.has_children:
+                for draw in (0.0, 0.5, 0.999):
+                    letter = game.get_strategy(difficulty).get_move(node, draw)
+                    self.assertIsNotNone(node.child(letter), (prefix, letter))
+
+    def test_below_words(self):
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class))
+            for difficulty in DIFFICULTIES:
+                self.play_everywhere(game, difficulty)
+
+    def test_tables_follow_the_trie(self):
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class))
+            game.wordlist.insert('axe')
+            game.wordlist.insert('dogma')
+            for difficulty in DIFFICULTIES:
+                self.play_everywhere(game, difficulty)
+                self.assertIn(game.make_move('a', difficulty=difficulty).word, ('ap', 'ax'))
+            game.wordlist.remove('apricot')
+            with mock.patch('random.random', return_value=0.999):
+                self.assertEqual(game.make_move('a', difficulty='easy').word, 'ax')
+
+    def test_hard_plays_the_best_moves(self):
+        game = GhostGame(build(Trie))
+        strategy = game.get_strategy('hard')
+        for prefix, node in walk(game.wordlist):
+            if node.value == TRIE_BRANCH and node.has_children:
+                moves = node.moves
+                for draw in (0.0, 0.5, 0.999):
+                    self.assertIn(strategy.get_move(node, draw), moves.winners or moves.best_losers, prefix)
+
+
+class IncrementalHeightTests(SimpleTestCase):
+
+    def assertSameHeights(self, trie, words):
+        fresh = build(Trie, words)
+        nodes = dict(walk(fresh))
+        updated = dict(walk(trie))
+        self.assertEqual(sorted(updated), sorted(nodes))
+        for prefix, node in nodes.items():
+            self.assertEqual(updated[prefix].height, node.height, prefix)
+            if node.has_children:
+                self.assertEqual(updated[prefix].moves.letters, node.moves.letters, prefix)
+
+    def test_insert_updates_path(self):
+        trie = build(Trie)
+        trie.insert('apricots')
+        trie.insert('bandanas')
+        self.assertSameHeights(trie, WORDS + ['apricots', 'bandanas'])
+
+    def test_remove_prunes_and_updates_path(self):
+        trie = build(Trie)
+        self.assertTrue(trie.remove('bandana'))
+        self.assertFalse(trie.remove('bandana'))
+        self.assertFalse(trie.remove('ban'))
+        self.assertTrue(trie.remove('dog'))
+        self.assertIsNone(trie.find('d'))
+        self.assertSameHeights(trie, [w for w in WORDS if w not in ('bandana', 'dog')])
+
+    def test_long_word(self):
+        # heights are computed without recursion
+        trie = build(Trie, ['a' * 5000])
+        self.assertEqual(trie.root.height, 5000)
+
+
+class SnapshotTests(SimpleTestCase):
+
+    def snapshot(self):
+        trie = build(CompactTrie)
+        trie.calculate_hint_tables({'cater': 0, 'band': 1})
+        f = io.BytesIO()
+        trie.write_snapshot(f)
+        return trie, f.getvalue()
+
+    def test_round_trip(self):
+        trie, data = self.snapshot()
+        loaded = CompactTrie.from_buffer(data)
+        self.assertEqual(list(loaded.words()), list(trie.words()))
+        for prefix, node in walk(trie):
+            other = loaded.find(prefix)
+            self.assertEqual((other.height, other.leaf_start, other.leaf_count, other.common_leaves),
+                             (node.height, node.leaf_start, node.leaf_count, node.common_leaves), prefix)
+            if node.has_children:
+                self.assertEqual(other.moves.letters, node.moves.letters, prefix)
+
+    def test_truncated(self):
+        _, data = self.snapshot()
+        for size in (10, len(data) // 2, len(data) * 3 // 4):
+            with self.assertRaises(ValueError):
+                CompactTrie.from_buffer(data[:size])
+
+    def test_loader_falls_back_on_a_truncated_file(self):
+        _, data = self.snapshot()
+        with tempfile.TemporaryDirectory() as directory:
+            words_path = os.path.join(directory, 'wordlist.txt')
+            snapshot_path = os.path.join(directory, 'wordlist.trie')
+            with open(words_path, 'w') as f:
+                f.write('\n'.join(WORDS))
+            with open(snapshot_path, 'wb') as f:
+                f.write(data[:len(data) // 2])
+            with self.assertLogs('ghostAppLogger', 'ERROR'):
+                self.assertIsNone(asset_loader.load_trie_snapshot(snapshot_path, words_path))
+
+
+class AssetLoaderTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        with open(os.path.join(self.directory, asset_loader.WORDS_FILE), 'w') as f:
+            f.write('\n'.join(WORDS))
+        patcher = mock.patch.object(asset_loader, 'DICTIONARIES', {'test': self.directory})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load_trie(self, impl, prefork=False):
+        with mock.patch.object(asset_loader, 'TRIE_IMPL', impl), \
+                mock.patch.object(asset_loader, 'PREFORK', prefork):
+            return asset_loader.load_trie('test')
+
+    def write_snapshot(self):
+        with open(os.path.join(self.directory, asset_loader.TRIE_SNAPSHOT_FILE), 'wb') as f:
+            build(CompactTrie).write_snapshot(f)
+
+    def test_text_fallback(self):
+        # forked workers share a CompactTrie's arrays; a dict trie's
+        # pages would be copied as soon as its reference counts change
+        self.assertIsInstance(self.load_trie('auto'), Trie)
+        self.assertIsInstance(self.load_trie('auto', prefork=True), CompactTrie)
+        self.assertIsInstance(self.load_trie('compact'), CompactTrie)
+        self.assertIsInstance(self.load_trie('dict', prefork=True), Trie)
+
+    def test_snapshot(self):
+        self.write_snapshot()
+        trie = self.load_trie('auto')
+        self.assertIsInstance(trie, CompactTrie)
+        self.assertEqual(list(trie.words()), sorted(WORDS))
+        self.assertIsInstance(self.load_trie('dict'), Trie)
+
+    def test_stale_snapshot_is_ignored(self):
+        self.write_snapshot()
+        words_path = os.path.join(self.directory, asset_loader.WORDS_FILE)
+        os.utime(words_path, (time.time() + 10, time.time() + 10))
+        with self.assertLogs('ghostAppLogger', 'WARNING'):
+            self.assertIsInstance(self.load_trie('auto'), Trie)
+
+
+class HintTests(SimpleTestCase):
+
+    def test_random_hints_cover_every_completion(self):
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class))
+            with mock.patch('random.randrange', side_effect=range(3)):
+                hints = [game.get_leaf_node('ban') for _ in range(3)]
+            self.assertEqual(hints, ['banana', 'band', 'bandana'])
+            self.assertEqual(game.get_leaf_node('dog'), 'dog')
+            self.assertIsNone(game.get_leaf_node('dx'))
+
+    def test_modes(self):
+        ranks = {'band': 0, 'bandana': 1}
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class), ranks)
+            self.assertEqual(game.get_hints('ba', HINT_LONGEST), ['bandana'])
+            self.assertEqual(game.get_hints('ba', HINT_COMMON), ['band', 'bandana', 'banana'])
+            self.assertEqual(game.get_hints('x', HINT_COMMON), [])
+            with self.assertRaises(ValueError):
+                game.get_hints('ba', 'shortest')
+
+    def test_tables_follow_insert_and_remove(self):
+        for trie_class in (Trie, CompactTrie):
+            game = GhostGame(build(trie_class, ['apple', 'apricot', 'banana', 'band']))
+            game.wordlist.insert('azure')
+            self.assertEqual(game.get_leaf_node('az'), 'azure')
+            self.assertEqual(game.get_hints('a', HINT_LONGEST), ['apricot'])
+            game.wordlist.remove('apricot')
+            self.assertEqual(game.get_hints('a', HINT_LONGEST), ['apple'])
+
+    def test_word_ranks(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+            f.write('The\nof\n\nthe\nAnd\n')
+            f.flush()
+            self.assertEqual(asset_loader.load_word_ranks(f.name), {'the': 0, 'of': 1, 'and': 2})
+
+
+def brute_force(words, prefix, players):
+    """(loser, length, letters) of GhostSolver's rules, by searching
+    every game from `prefix` over the list of words."""
+    if prefix in words or not any(word.startswith(prefix) for word in words):
+        return players - 1, 0, ''
+    outcomes = {}
+    for letter in sorted({word[len(prefix)] for word in words if word.startswith(prefix) and word != prefix}):
+        loser, length, _ = brute_force(words, prefix + letter, players)
+        loser, length = (loser + 1) % players, length + 1
+        outcomes[letter] = (0, length, loser) if loser else (1, -length, loser)
+    best = min(outcomes.values())
+    _, length, loser = best
+    return loser, abs(length), ''.join(letter for letter, outcome in outcomes.items() if outcome == best)
+
+
+class GhostSolverTests(SimpleTestCase):
+
+    def test_two_players_match_minimax(self):
+        def wins(prefix):
+            # the player to move wins if the last move completed a word,
+            # or if some letter leaves the other player losing
+            children = {word[:len(prefix) + 1] for word in WORDS if word.startswith(prefix) and word != prefix}
+            return prefix in WORDS or not children or any(not wins(child) for child in children)
+
+        for trie_class in (Trie, CompactTrie):
+            trie = build(trie_class)
+            solver = GhostSolver(trie)
+            for prefix, node in walk(trie):
+                self.assertEqual(solver.outcomes(node), (wins(prefix), not wins(prefix)), prefix)
+
+    def test_matches_brute_force(self):
+        for players in (2, 3, 4):
+            for trie_class in (Trie, CompactTrie):
+                trie = build(trie_class)
+                solver = GhostSolver(trie, players)
+                for prefix, node in walk(trie):
+                    loser, length, letters = brute_force(WORDS, prefix, players)
+                    self.assertEqual(solver.loser(node, 1), (1 + loser) % players, (players, prefix))
+                    self.assertEqual(solver.length(node), length, (players, prefix))
+                    if node.value == TRIE_BRANCH:
+                        self.assertEqual(solver.best_moves(node), letters, (players, prefix))
+
+    def test_solve_matches_lazy_entries(self):
+        trie = build(Trie)
+        lazy, solved = GhostSolver(trie, 3), GhostSolver(trie, 3)
+        solved.solve()
+        # every node a game can reach: words end it
+        reachable = [node for prefix, node in walk(trie) if not any(
+            prefix.startswith(word) and prefix != word for word in WORDS)]
+        self.assertEqual(set(solved.table), set(reachable))
+        for node in reachable:
+            self.assertEqual(lazy._entry(node), solved.table[node], node.value)
+
+    def test_needs_two_players(self):
+        with self.assertRaises(ValueError):
+            GhostSolver(build(Trie), 1)
+
+    def test_game_with_more_players(self):
+        game = GhostGame(build(Trie), players=3)
+        self.assertEqual(game.strategies, {})
+        move = game.make_move('ba')
+        self.assertIn(move.word, {'ba' + letter for letter in game.solver.best_moves(game.wordlist.find('ba'))})
+
+
+@skipIf(TrieAnalytics is None, "TrieAnalytics needs NumPy.")
+class TrieAnalyticsTests(SimpleTestCase):
+
+    def test_matches_solver(self):
+        for words in (WORDS, synthetic_words(200, random.Random(4))):
+            trie = build(CompactTrie, words)
+            analytics = TrieAnalytics(trie)
+            solver = GhostSolver(trie)
+            solver.solve()
+            for prefix, node in walk(trie):
+                ended = any(prefix.startswith(word) and prefix != word for word in words)
+                self.assertEqual(bool(analytics.ended[node.id]), ended, prefix)
+                if ended:
+                    continue
+                self.assertEqual(bool(analytics.wins[node.id]), solver.outcomes(node)[0], prefix)
+                self.assertEqual(int(analytics.length[node.id]), solver.length(node), prefix)
+                below = [word for word in words if word.startswith(prefix) and not any(
+                    word.startswith(other) and len(prefix) <= len(other) < len(word) for other in words)]
+                self.assertEqual(int(analytics.words[node.id]), len(below), prefix)
+                self.assertEqual(int(analytics.height[node.id]), max(len(word) for word in below) - len(prefix),
+                                 prefix)
+
+    def test_reports(self):
+        report = TrieAnalytics(build(CompactTrie)).report()
+        self.assertEqual(report['unreachable'], [{'word': 'bandana', 'ended_by': 'band'},
+                                                 {'word': 'cater', 'ended_by': 'cat'}])
+        summary = report['summary']
+        self.assertEqual((summary['words'], summary['reachable_words'], summary['max_depth']), (8, 6, 7))
+        self.assertEqual([row['letter'] for row in report['openings']], ['a', 'b', 'c', 'd'])
+        self.assertEqual(sum(row['words'] for row in report['game_lengths']), 6)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            words = os.path.join(directory, 'words.txt')
+            with open(words, 'w') as f:
+                f.write('\n'.join(WORDS) + '\n')
+            output = os.path.join(directory, 'report')
+            call_command('analyze_dictionary', words=words, format='csv', output=output, stderr=io.StringIO())
+            self.assertEqual(sorted(os.listdir(output)), ['branching.csv', 'game_lengths.csv', 'openings.csv',
+                                                          'summary.csv', 'unreachable.csv'])
+            stdout = io.StringIO()
+            call_command('analyze_dictionary', words=words, stdout=stdout, stderr=io.StringIO())
+            kept = [word for word in WORDS if build_wordlist.validate(word)]
+            self.assertEqual(json.loads(stdout.getvalue())['summary']['nodes'], len(build(CompactTrie, kept)))
+
+
+def edit_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        previous, row = row, [i]
+        for j, y in enumerate(b, 1):
+            row.append(min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (x != y)))
+    return row[-1]
+
+
+class SuggesterTests(SimpleTestCase):
+
+    INPUTS = ['', 'a', 'cat', 'cot', 'bnad', 'bandanas', 'dgo', 'aple', 'xyz', 'apricots', 'zzzzzz']
+
+    def brute_force(self, trie, word, max_distance):
+        """Every prefix within `max_distance`, with its distance, in
+        Suggester's order."""
+        prefixes = {prefix for prefix, _ in walk(trie) if prefix}
+        found = [(prefix, edit_distance(prefix, word)) for prefix in prefixes]
+        found = [(prefix, distance) for prefix, distance in found if distance <= max_distance]
+        found.sort(key=lambda item: (item[1], -len(os.path.commonprefix([item[0], word])),
+                                     abs(len(item[0]) - len(word)),
+                                     trie.find(item[0]).value != TRIE_BRANCH, item[0]))
+        return found
+
+    def assert_matches_brute_force(self, words, inputs, max_distances=range(4)):
+        for trie_class in (Trie, CompactTrie):
+            trie = build(trie_class, words)
+            suggester = Suggester(trie, cache_size=0)
+            for word in inputs:
+                for max_distance in max_distances:
+                    expected = self.brute_force(trie, word, max_distance)
+                    for limit in (1, 3, 5, 1000):
+                        self.assertEqual(suggester.suggest(word, max_distance, limit), expected[:limit],
+                                         (trie_class, word, max_distance, limit))
+
+    def test_matches_brute_force(self):
+        self.assert_matches_brute_force(WORDS, self.INPUTS)
+
+    def test_sparse_input(self):
+        # few prefixes are close to 'zzzz', and only after its first
+        # letters are edited
+        words = WORDS + ['dazzle', 'dizzy', 'muzzle', 'puzzle', 'zebra', 'zoo', 'fizz', 'buzzer']
+        self.assert_matches_brute_force(words, ['zzzz', 'zzzzz', 'uzzz', 'zazz'], max_distances=(1, 2))
+        trie = build(Trie, words)
+        self.assertEqual(Suggester(trie).suggest('zzzz', 2),
+                         [('buzz', 2), ('dazz', 2), ('dizz', 2), ('muzz', 2), ('puzz', 2)])
+
+    def test_synthetic_words(self):
+        words = synthetic_words(300, random.Random(2))
+        inputs = [word[:4] + 'q' for word in random.Random(3).sample(words, 10)]
+        self.assert_matches_brute_force(words, inputs, max_distances=(2,))
+
+    def test_cache_follows_the_trie(self):
+        for trie_class in (Trie, CompactTrie):
+            trie = build(trie_class)
+            suggester = Suggester(trie)
+            self.assertEqual(suggester.suggest('cax', 1), [('cat', 1), ('ca', 1)])
+            trie.insert('cax')
+            self.assertEqual(suggester.suggest('cax', 1)[0], ('cax', 0))
+            trie.remove('cax')
+            self.assertEqual(suggester.suggest('cax', 1), [('cat', 1), ('ca', 1)])
+
+
+###########################################################
+# Superghost
+###########################################################
+
+SUPERGHOST_WORDS = ['band', 'bandana', 'cat', 'scat', 'dog']
+
+
+def substrings(words):
+    return {word[i:j] for word in words for i in range(len(word)) for j in range(i, len(word) + 1)}
+
+
+class SubstringIndexTests(SimpleTestCase):
+
+    def test_matches_brute_force(self):
+        index = SubstringIndex(SUPERGHOST_WORDS)
+        fragments = substrings(SUPERGHOST_WORDS)
+        for fragment in fragments | {'x', 'nb', 'tc', 'dogs', 'caté'}:
+            self.assertEqual(index.contains(fragment), fragment in fragments, fragment)
+            self.assertEqual(index.is_word(fragment), fragment in SUPERGHOST_WORDS, fragment)
+            left, right = index.extensions(fragment)
+            self.assertEqual(left, ''.join(sorted({f[0] for f in fragments if f[1:] == fragment and f})), fragment)
+            self.assertEqual(right, ''.join(sorted({f[-1] for f in fragments if f[:-1] == fragment and f})), fragment)
+
+    def test_fragments_do_not_span_words(self):
+        index = SubstringIndex(['ab', 'cd'])
+        self.assertFalse(index.contains('bc'))
+        self.assertEqual(index.extensions('b'), ('a', ''))
+
+
+class SuperghostTests(SimpleTestCase):
+
+    def test_solution_matches_minimax(self):
+        fragments = substrings(SUPERGHOST_WORDS)
+
+        def wins(fragment):
+            if fragment in SUPERGHOST_WORDS:
+                return True
+            children = {f for f in fragments if len(f) == len(fragment) + 1 and fragment in (f[1:], f[:-1])}
+            return any(not wins(child) for child in children)
+
+        strategy = SuperghostStrat(SubstringIndex(SUPERGHOST_WORDS))
+        strategy.solve()
+        for fragment, (strategy_wins, _) in strategy.table.items():
+            self.assertEqual(strategy_wins, wins(fragment), fragment)
+        self.assertIn('', strategy.table)
+
+    def test_make_move(self):
+        game = SuperghostGame(SubstringIndex(SUPERGHOST_WORDS))
+        self.assertEqual(game.make_move('dog').as_dict(), {'word': None, 'is_game_over': True, 'is_real_word': True})
+        self.assertEqual(game.make_move('gd').as_dict(), {'word': None, 'is_game_over': True, 'is_real_word': False})
+        extensions = {f for f in substrings(SUPERGHOST_WORDS) if len(f) == 4 and 'ana' in f}
+        for _ in range(10):
+            move = game.make_move('ana')
+            self.assertIn(move.word, extensions)
+            self.assertFalse(move.is_game_over)
+
+
+###########################################################
+# Definitions
+###########################################################
+
+DEFINITIONS = {'apple': 'A fruit.', 'band': 'A group.', 'café': 'A place.', 'dog': ['An animal.', 'A tool.']}
+
+
+class DefinitionStoreTests(SimpleTestCase):
+
+    def store(self, cache_size=2):
+        f = io.BytesIO()
+        DefinitionStore.write(DEFINITIONS.items(), f)
+        return DefinitionStore(f.getvalue(), cache_size)
+
+    def test_lookup(self):
+        store = self.store()
+        self.assertEqual(len(store), len(DEFINITIONS))
+        for word, definition in DEFINITIONS.items():
+            self.assertEqual(store[word], definition)
+        self.assertEqual(sorted(store), sorted(DEFINITIONS))
+        self.assertNotIn('ban', store)
+        self.assertNotIn(1, store)
+        self.assertIsNone(store.get('zebra'))
+
+    def test_cache_is_bounded(self):
+        store = self.store(cache_size=2)
+        for word in ('apple', 'band', 'dog', 'zebra', 'apple'):
+            store.get(word)
+        self.assertEqual(list(store._cache), ['zebra', 'apple'])
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            DefinitionStore(b'GHSTTRIE' + bytes(32))
+
+
+###########################################################
+# Dictionary build
+###########################################################
+
+class IterJsonObjectTests(SimpleTestCase):
+
+    def entries(self, text, **kwargs):
+        return list(build_wordlist.iter_json_object(io.StringIO(text), **kwargs))
+
+    def test_matches_json(self):
+        data = {'apple': 'A fruit.', 'café': ['A place.', 12345678], 'e': {'"}': 1.5e10}, 'null': None}
+        text = json.dumps(data, indent=1)
+        for chunk_size in (1, 3, 7, len(text)):
+            self.assertEqual(self.entries(text, chunk_size=chunk_size), list(data.items()), chunk_size)
+        self.assertEqual(self.entries(' { } '), [])
+
+    def test_malformed(self):
+        for text in ('', '[]', '{"a": 1', '{"a": 1 "b": 2}', '{"a": tru}', '{"a": "b'):
+            with self.assertRaises(ValueError):
+                self.entries(text, chunk_size=2)
+
+    def test_malformed_entry_fails_early(self):
+        f = io.StringIO('{"a": [1, 2 3], "b": "' + 'x' * 100000 + '"}')
+        entries = build_wordlist.iter_json_object(f, chunk_size=10, max_entry_size=100)
+        with self.assertRaises(json.JSONDecodeError):
+            list(entries)
+        self.assertLess(f.tell(), 200)
+
+
+###########################################################
+# Sessions
+###########################################################
+
+class GameSessionStoreTests(SimpleTestCase):
+
+    def test_advance(self):
+        trie = build(Trie)
+        session = GameSessionStore().create('b', trie.find('b'))
+        session.advance('an')
+        self.assertEqual((session.word, session.node), ('ban', trie.find('ban')))
+        session.advance('xd')
+        self.assertEqual((session.word, session.node), ('banxd', None))
+
+    def test_expiry(self):
+        store = GameSessionStore(ttl=60)
+        session = store.create('', None)
+        self.assertIs(store.get(session.token), session)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(store.get(session.token))
+        self.assertEqual(len(store), 0)
+        self.assertIsNone(store.get(''))
+
+    def test_capacity(self):
+        store = GameSessionStore(capacity=2)
+        first, second = store.create('', None), store.create('', None)
+        store.get(first.token)
+        store.create('', None)
+        self.assertIsNone(store.get(second.token))
+        self.assertIs(store.get(first.token), first)
+
+
+class GetSessionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dictionary = views.create_dictionary(build(Trie), {}, None, None)
+        patcher = mock.patch.object(views, 'sessions', GameSessionStore())
+        self.sessions = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missing_token_starts_from_prefix(self):
+        session = views.get_session('unknown', 'ban', self.dictionary)
+        self.assertEqual(session.word, 'ban')
+        self.assertEqual(session.node, self.dictionary.game.wordlist.find('ban'))
+        self.assertIs(self.sessions.get(session.token), session)
+
+    def test_matching_token_keeps_session(self):
+        session = self.sessions.create('ban', None, self.dictionary)
+        self.assertIs(views.get_session(session.token, 'ban', self.dictionary), session)
+
+    def test_mismatched_prefix_is_rejected(self):
+        session = self.sessions.create('ban', None, self.dictionary)
+        with self.assertRaises(ValueError):
+            views.get_session(session.token, 'bandan', self.dictionary)
+        self.assertIs(self.sessions.get(session.token), session)
+        self.assertEqual(session.word, 'ban')
+
+    def test_play_turn_follows_session(self):
+        session, word, move = views.play_turn('', 'ba', 'n', self.dictionary)
+        self.assertEqual(word, 'ban')
+        self.assertFalse(move.is_game_over)
+        self.assertEqual(session.word, move.word)
+        self.assertEqual(session.node, self.dictionary.game.wordlist.find(move.word))
+
+
+###########################################################
+# Dictionary registry
+###########################################################
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class DictionaryRegistryTests(SimpleTestCase):
+
+    INTERVAL = 0.01
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = [os.path.join(directory.name, name) for name in ('wordlist.txt', 'wordlist.trie')]
+        self.trigger = os.path.join(directory.name, '.reload')
+        for filename in self.paths:
+            self.write(filename)
+
+    def write(self, filename, text='x'):
+        with open(filename, 'w') as f:
+            f.write(text)
+
+    def registry(self):
+        registry = DictionaryRegistry(lambda: Dictionary(None, {}))
+        self.addCleanup(registry.stop_watching)
+        return registry
+
+    def assertStaysAt(self, registry, version):
+        time.sleep(self.INTERVAL * 10)
+        self.assertEqual(registry.current.version, version)
+
+    def test_reload(self):
+        registry = self.registry()
+        versions = []
+        registry.add_listener(lambda dictionary: versions.append(dictionary.version))
+        old = registry.current
+        registry.reload().join()
+        self.assertEqual(versions, [1, 2])
+        self.assertIsNot(registry.current, old)
+        self.assertIsNotNone(registry.current.build_seconds)
+
+    def test_failed_reload_keeps_the_current_version(self):
+        registry = DictionaryRegistry(mock.Mock(side_effect=[Dictionary(None, {}), OSError()]))
+        with self.assertLogs('ghostAppLogger', 'ERROR'):
+            registry.reload().join()
+        self.assertEqual(registry.current.version, 1)
+
+    def test_watch(self):
+        registry = self.registry()
+        registry.watch(self.paths, self.INTERVAL, self.trigger)
+        self.write(self.paths[0], 'changed')
+        self.assertTrue(wait_for(lambda: registry.current.version == 2))
+        self.assertStaysAt(registry, 2)
+
+    def test_trigger(self):
+        registry = self.registry()
+        registry.watch(self.paths, self.INTERVAL, self.trigger)
+        # an empty trigger holds reloads off while files are rebuilt
+        self.write(self.trigger, '')
+        for filename in self.paths:
+            self.write(filename, 'rebuilt')
+            self.assertStaysAt(registry, 1)
+        self.write(self.trigger, 'now')
+        self.assertTrue(wait_for(lambda: registry.current.version == 2))
+        os.remove(self.trigger)
+        self.assertStaysAt(registry, 2)
+
+    def test_watchers_restart_after_fork(self):
+        registry = self.registry()
+        registry.watch(self.paths, self.INTERVAL)
+        registry.pause_watching()
+        self.assertTrue(wait_for(lambda: not registry._watcher.is_alive()))
+        # what os.register_at_fork() runs in a child process
+        DictionaryRegistry_module._restart_watchers()
+        self.assertTrue(registry._watcher.is_alive())
+
+        registry.stop_watching()
+        self.assertTrue(wait_for(lambda: not registry._watcher.is_alive()))
+        DictionaryRegistry_module._restart_watchers()
+        self.assertFalse(registry._watcher.is_alive())
+
+    def test_stopped_registry_is_freed(self):
+        registry = DictionaryRegistry(lambda: Dictionary(None, {}))
+        registry.watch(self.paths, self.INTERVAL)
+        registry.stop_watching()
+        watcher = registry._watcher
+        watcher.join()
+        reference = weakref.ref(registry)
+        del registry
+        gc.collect()
+        self.assertIsNone(reference())
+
+
+class SizedDictionary(Dictionary):
+
+    def __init__(self, size):
+        super().__init__(None, {})
+        self.size = size
+
+    def nbytes(self):
+        return self.size
+
+
+class DictionaryLibraryTests(SimpleTestCase):
+
+    def library(self, sizes, budget_bytes, **kwargs):
+        library = DictionaryLibrary(lambda name: SizedDictionary(sizes[name]), sizes, budget_bytes, **kwargs)
+        self.addCleanup(lambda: [registry.stop_watching() for registry in library._registries.values()])
+        return library
+
+    def test_least_recently_used_are_evicted(self):
+        library = self.library({'en': 40, 'fr': 40, 'de': 40}, budget_bytes=100)
+        evicted = []
+        library.add_listener(lambda event, name, registry: evicted.append(name) if event == 'evict' else None)
+        library.current('en')
+        library.current('fr')
+        library.current('en')
+        library.current('de')
+        self.assertEqual(evicted, ['fr'])
+        self.assertEqual([name for name in library.names if library.is_loaded(name)], ['en', 'de'])
+        self.assertEqual(library.stats['fr'], {'loads': 1, 'hits': 0, 'evictions': 1})
+        self.assertEqual(library.stats['en']['hits'], 1)
+        # versions keep counting across evictions
+        self.assertEqual(library.current('fr').version, 2)
+
+    def test_dictionary_over_budget_is_kept(self):
+        library = self.library({'en': 40, 'fr': 200}, budget_bytes=100)
+        library.current('en')
+        self.assertEqual(library.current('fr').size_bytes, 200)
+        self.assertFalse(library.is_loaded('en'))
+        self.assertTrue(library.is_loaded('fr'))
+
+    def test_no_budget(self):
+        library = self.library({'en': 40, 'fr': 200}, budget_bytes=0)
+        library.current('en')
+        library.current('fr')
+        self.assertTrue(library.is_loaded('en'))
+
+    def test_evicted_registry_is_freed(self):
+        with tempfile.NamedTemporaryFile() as f:
+            library = self.library({'en': 40, 'fr': 80}, budget_bytes=100,
+                                   watched_paths=lambda name: [f.name], watch_interval=0.01)
+            registry = library.get('en')
+            reference = weakref.ref(registry)
+            library.current('fr')
+            watcher = registry._watcher
+            del registry
+            watcher.join()
+            gc.collect()
+            self.assertIsNone(reference())
+
+    def test_size_estimates(self):
+        trie = build(CompactTrie)
+        f = io.BytesIO()
+        DefinitionStore.write(DEFINITIONS.items(), f)
+        store = DefinitionStore(f.getvalue())
+        self.assertEqual(store.nbytes(), len(f.getvalue()))
+        dictionary = views.create_dictionary(trie, store, None, SubstringIndex(WORDS))
+        self.assertEqual(dictionary.nbytes(), trie.nbytes() + store.nbytes() + dictionary.superghost.index.nbytes())
+        self.assertGreater(views.create_dictionary(build(Trie), DEFINITIONS, None, None).nbytes(), 0)
+
+
+class DictionaryWarmupTests(SimpleTestCase):
+
+    def test_loads_in_background(self):
+        loaded = []
+        library = DictionaryLibrary(lambda name: loaded.append(name) or SizedDictionary(1), ['en', 'fr'])
+        warmup = DictionaryWarmup(library, ['fr'])
+        self.assertEqual(warmup.status()['status'], DictionaryWarmup.IDLE)
+        warmup.start().join()
+        self.assertTrue(warmup.ready)
+        self.assertEqual(loaded, ['fr'])
+        self.assertEqual(list(warmup.status()['dictionaries']), ['fr'])
+        # a finished warmup is not started again
+        self.assertIsNone(warmup.start())
+
+    def test_failure_is_retried(self):
+        attempts = []
+
+        def load(name):
+            attempts.append(name)
+            if len(attempts) == 1:
+                raise OSError("missing wordlist")
+            return SizedDictionary(1)
+
+        warmup = DictionaryWarmup(DictionaryLibrary(load, ['en']), ['en'])
+        with self.assertLogs('ghostAppLogger', 'ERROR'):
+            warmup.start().join()
+        self.assertFalse(warmup.wait())
+        self.assertEqual(warmup.status()['error'], "OSError: missing wordlist")
+        warmup.start().join()
+        self.assertTrue(warmup.ready)
+        self.assertIsNone(warmup.error)
+        self.assertEqual(len(attempts), 2)
+
+    def test_stage_timer(self):
+        timer = StageTimer()
+        with timer('trie'):
+            pass
+        with self.assertRaises(ValueError):
+            with timer('heights'):
+                raise ValueError()
+        self.assertEqual(list(timer.seconds), ['trie', 'heights'])
+        self.assertTrue(all(seconds >= 0 for seconds in timer.seconds.values()))
+
+
+###########################################################
+# Views
+###########################################################
+
+class ViewTestCase(SimpleTestCase):
+    """Serves the views from a dictionary of WORDS and DEFINITIONS,
+    with sessions and cached responses of their own."""
+
+    def setUp(self):
+        library = DictionaryLibrary(self.load_dictionary, [views.DEFAULT_DICTIONARY])
+        for name, value in (('dictionaries', library), ('sessions', GameSessionStore()),
+                            ('responses', ResponseCache())):
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def load_dictionary(self, name):
+        return views.create_dictionary(build(Trie), DEFINITIONS, None, None)
+
+    def move(self, **data):
+        return self.client.post(reverse('game:api_move'), data, content_type='application/json')
+
+
+class ApiMoveTests(ViewTestCase):
+
+    def test_game(self):
+        reply = self.move(prefix='', input='d').json()
+        self.assertEqual(reply['word'], 'do')
+        self.assertFalse(reply['is_game_over'])
+        reply = self.move(prefix='do', input='g', session=reply['session']).json()
+        self.assertEqual(reply, {'word': None, 'is_game_over': True, 'is_real_word': True, 'session': None})
+
+    def test_loss_reply(self):
+        # the page shows the loss once this reply confirms it
+        reply = self.move(prefix='do', input='g', hint=True, suggest=True, definition=True).json()
+        self.assertTrue(reply['is_game_over'])
+        self.assertIsNone(reply['word'])
+        self.assertEqual(reply['definition'], DEFINITIONS['dog'])
+        self.assertIn('hints', reply)
+        self.assertIn('suggestions', reply)
+        # a letter the page's trie may wrongly reject is played as usual
+        reply = self.move(prefix='c', input='a', hint=True, suggest=True, definition=True).json()
+        self.assertEqual(reply['word'], 'cat')
+        self.assertFalse(reply['is_game_over'])
+
+    def test_mismatched_session_is_rejected(self):
+        session = self.move(prefix='', input='d').json()['session']
+        self.assertEqual(self.move(prefix='ca', input='t', session=session).status_code, 400)
+        # the session is still usable
+        self.assertEqual(self.move(prefix='do', input='g', session=session).status_code, 200)
+
+    def test_unknown_session_starts_from_prefix(self):
+        reply = self.move(prefix='c', input='a', session='expired').json()
+        self.assertEqual(reply['word'], 'cat')
+        self.assertFalse(reply['is_game_over'])
+
+    def test_validate_word(self):
+        for word in ('', 'cat', 'CaT'):
+            self.assertTrue(views.validate_word(word), word)
+        for word in ('cat\n', 'ca t', 'café', '1', None, True, 1):
+            self.assertFalse(views.validate_word(word), word)
+
+    def test_invalid_input_is_rejected(self):
+        for value in (None, True, 1, ['c'], 'c\n', 'c1'):
+            self.assertEqual(self.move(prefix='', input=value).status_code, 400, value)
+            self.assertEqual(self.move(prefix=value, input='c').status_code, 400, value)
+
+
+class AsyncViewTests(ViewTestCase):
+
+    def post_form(self, data):
+        return self.async_client.post(reverse('game:index'), urlencode(data),
+                                      content_type='application/x-www-form-urlencoded')
+
+    async def test_index(self):
+        response = await self.async_client.get(reverse('game:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(views.dictionaries.is_loaded(views.DEFAULT_DICTIONARY))
+
+        response = await self.post_form({'prefix': '', 'input-txt': 'D'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['prefix'], 'do')
+        self.assertTrue(response.context['session'])
+
+        response = await self.post_form({'prefix': 'do', 'input-txt': 'g', 'session': response.context['session']})
+        self.assertTrue(response.context['player_lost'])
+        self.assertEqual(response.context['definition'], DEFINITIONS['dog'])
+
+    async def test_api_moves(self):
+        response = await self.async_client.post(reverse('game:api_moves'), {'words': ['d', 'dog', 'x']},
+                                                content_type='application/json')
+        self.assertEqual(response.json()['moves'], [
+            {'word': 'do', 'is_game_over': False, 'is_real_word': True},
+            {'word': None, 'is_game_over': True, 'is_real_word': True},
+            {'word': None, 'is_game_over': True, 'is_real_word': False},
+        ])
+
+    async def test_api_moves_rejects_invalid_batches(self):
+        for data in ({'words': 'dog'}, {'words': ['dog', None]}, {'words': ['d'], 'difficulty': 'impossible'}, []):
+            response = await self.async_client.post(reverse('game:api_moves'), data,
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+
+
+class ApiCompletionsTests(ViewTestCase):
+
+    def test_completions(self):
+        reply = self.client.get(reverse('game:api_completions', args=['BAN']), {'limit': 2}).json()
+        self.assertEqual(reply, {'prefix': 'ban', 'count': 3, 'completions': ['banana', 'band']})
+        reply = self.client.get(reverse('game:api_completions', args=['x'])).json()
+        self.assertEqual(reply, {'prefix': 'x', 'count': 0, 'completions': []})
+
+    def test_invalid_limit(self):
+        for limit in ('-1', 'ten', str(views.COMPLETIONS_MAX_LIMIT + 1)):
+            response = self.client.get(reverse('game:api_completions', args=['ban']), {'limit': limit})
+            self.assertEqual(response.status_code, 400, limit)
+
+
+class HealthTests(ViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(views, 'warmup', DictionaryWarmup(views.dictionaries, [views.DEFAULT_DICTIONARY]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load_dictionary(self, name):
+        dictionary = super().load_dictionary(name)
+        dictionary.stage_seconds = {'trie': 0.5}
+        return dictionary
+
+    def test_live(self):
+        response = self.client.get(reverse('game:health_live'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(views.dictionaries.is_loaded(views.DEFAULT_DICTIONARY))
+
+    def test_ready_starts_warmup(self):
+        with mock.patch.object(views.warmup, 'start') as start:
+            response = self.client.get(reverse('game:health_ready'))
+        start.assert_called_once_with()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], DictionaryWarmup.IDLE)
+
+        views.warmup.start().join()
+        response = self.client.get(reverse('game:health_ready'))
+        self.assertEqual(response.status_code, 200)
+        status = response.json()
+        self.assertEqual(status['status'], DictionaryWarmup.READY)
+        self.assertEqual(status['dictionaries'][views.DEFAULT_DICTIONARY]['stage_seconds'], {'trie': 0.5})
+
+
+class ResponseCacheTests(SimpleTestCase):
+
+    def test_lru(self):
+        cache = ResponseCache(capacity=2)
+        cache.put('a', 200, b'{}')
+        cache.put('b', 200, b'[]')
+        self.assertEqual(cache.get('a').body, b'{}')
+        cache.put('c', 404, b'null')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(sorted(cache._entries), ['a', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_etag_depends_only_on_body(self):
+        cache = ResponseCache()
+        etag = cache.put('a', 200, b'{"word":"dog"}').etag
+        self.assertEqual(ResponseCache().put('b', 200, b'{"word":"dog"}').etag, etag)
+        self.assertNotEqual(cache.put('a', 200, b'{"word":"cat"}').etag, etag)
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+    def test_capacity_zero_stores_nothing(self):
+        cache = ResponseCache(capacity=0)
+        self.assertEqual(cache.put('a', 200, b'{}').body, b'{}')
+        self.assertEqual(len(cache), 0)
+
+
+class CachedLookupTests(ViewTestCase):
+
+    def get(self, word, **headers):
+        return self.client.get(reverse('game:api_definition', args=[word]), **headers)
+
+    def test_definition(self):
+        response = self.get('DOG')
+        self.assertEqual(response.json(), {'word': 'dog', 'definition': DEFINITIONS['dog']})
+        self.assertEqual(response['Cache-Control'], f'public, max-age={views.LOOKUP_MAX_AGE}')
+        self.assertEqual(self.get('cat').status_code, 404)
+
+    def test_rendered_once(self):
+        etag = self.get('dog')['ETag']
+        self.assertEqual(self.get('dog')['ETag'], etag)
+        self.assertEqual((views.responses.hits, views.responses.misses), (1, 1))
+
+    def test_not_modified(self):
+        etag = self.get('dog')['ETag']
+        response = self.get('dog', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get('dog', HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code, 304)
+        self.assertEqual(self.get('dog', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        # a 404 is never answered with a 304
+        etag = self.get('cat')['ETag']
+        self.assertEqual(self.get('cat', HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_reload_renders_again(self):
+        self.get('dog')
+        views.dictionaries.get(views.DEFAULT_DICTIONARY).reload().join()
+        self.get('dog')
+        self.assertEqual((views.responses.hits, views.responses.misses), (0, 2))
+        self.assertEqual(len(views.responses), 2)
+
+
+###########################################################
+# Self-play
+###########################################################
+
+class SelfPlayTests(SimpleTestCase):
+
+    def setUp(self):
+        # the command loads into this process; start every test without
+        patcher = mock.patch.object(SelfPlay, '_worker', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.output = os.path.join(self.directory.name, 'selfplay.jsonl')
+
+    def test_create_strategy(self):
+        trie = build(Trie)
+        for name in SelfPlay.STRATEGIES:
+            self.assertTrue(SelfPlay.create_strategy(name, trie), name)
+        self.assertTrue(SelfPlay.create_strategy('game.GhostStrategies.RandomChoiceStrat', trie))
+        for name in ('nope', 'game.nope.Strat', 'game.Trie.Trie',
+                     # needs the trie and a difficulty
+                     'game.GhostStrategies.FrequencyWeightedStrat'):
+            with self.assertRaises(ValueError):
+                SelfPlay.create_strategy(name, trie)
+
+    def test_games_are_reproducible(self):
+        trie = build(Trie)
+        strategies = [SelfPlay.create_strategy('random', trie), SelfPlay.create_strategy('best', trie)]
+
+        def play(seed):
+            return SelfPlay.play_game(trie, strategies, seed % 2, random.Random(seed))
+
+        games = [play(seed) for seed in range(50)]
+        self.assertEqual(games, [play(seed) for seed in range(50)])
+        for loser, length in games:
+            self.assertIn(loser, (0, 1))
+            self.assertTrue(1 <= length <= 7)
+
+    def test_result(self):
+        result = SelfPlay.SelfPlayResult()
+        result.add(0, 0, 3)
+        result.add(0, 1, 5)
+        result.add(1, 0, 5)
+        self.assertEqual(result.wins, [1, 2])
+        self.assertEqual(result.first_wins, [1, 1])
+        self.assertEqual(result.percentile(0.5), 5)
+        self.assertAlmostEqual(result.mean_length(), 13 / 3)
+
+        total = SelfPlay.SelfPlayResult.from_dict(json.loads(json.dumps(result.as_dict())))
+        total.merge(result)
+        self.assertEqual(total.as_dict(), {'games': 6, 'wins': [2, 4], 'first_wins': [2, 2],
+                                           'lengths': {'3': 2, '5': 4}})
+
+    def test_read_results_ignores_partial_line(self):
+        with open(self.output, 'w') as f:
+            SelfPlay.write_record(f, {'games': 2})
+            SelfPlay.write_record(f, {'chunk': 0, 'result': SelfPlay.SelfPlayResult().as_dict()})
+            f.write('{"chunk": 1, "res')
+        params, chunks = SelfPlay.read_results(self.output)
+        self.assertEqual(params, {'games': 2})
+        self.assertEqual(list(chunks), [0])
+
+    def call(self, *args, **options):
+        with mock.patch.object(asset_loader, 'load_trie', lambda name: build(Trie)), \
+                mock.patch.object(asset_loader, 'load_ranks', lambda name: None):
+            call_command('selfplay', *args, stdout=io.StringIO(), output=self.output, **options)
+
+    def test_command_and_resume(self):
+        self.call('best', 'random', games=40, chunk_size=10, workers=2)
+        params, chunks = SelfPlay.read_results(self.output)
+        self.assertEqual(params['games'], 40)
+        self.assertEqual(sorted(chunks), [0, 1, 2, 3])
+        self.assertEqual(sum(result.games for result in chunks.values()), 40)
+
+        # with half of the results lost, resuming replays the same games
+        with open(self.output) as f:
+            lines = f.readlines()
+        with open(self.output, 'w') as f:
+            f.writelines(lines[:3])
+        self.call('best', 'random', games=40, chunk_size=10, workers=2, resume=True)
+        _, resumed = SelfPlay.read_results(self.output)
+        self.assertEqual({chunk: result.as_dict() for chunk, result in resumed.items()},
+                         {chunk: result.as_dict() for chunk, result in chunks.items()})
+
+    def test_command_errors(self):
+        with self.assertRaises(CommandError):
+            self.call('best', 'game.GhostStrategies.FrequencyWeightedStrat', games=10)
+        with mock.patch.object(SelfPlay, 'create_strategy', side_effect=[None, RuntimeError("broken")]):
+            # raised before the pool starts, where it would hang
+            with self.assertRaises(CommandError):
+                self.call('best', 'random', games=10)
+        self.call('best', 'random', games=10, workers=1)
+        with self.assertRaises(CommandError):
+            self.call('best', 'random', games=10)
+
+
+###########################################################
+# Benchmarks
+###########################################################
+
+class BenchmarkTests(SimpleTestCase):
+
+    def test_compare(self):
+        results = {'faster': 0.5, 'slightly_slower': 1.05, 'slower': 1.5, 'new': 1.0, 'unmeasured': 1.0}
+        baseline = {'faster': 1.0, 'slightly_slower': 1.0, 'slower': 1.0, 'unmeasured': 0}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(compare(results, baseline, 0.1), ['slower'])
+            self.assertEqual(compare(results, baseline, 0.01), ['slightly_slower', 'slower'])
+
+    def test_synthetic_words_are_reproducible(self):
+        words = synthetic_words(100, random.Random(1))
+        self.assertEqual(words, synthetic_words(100, random.Random(1)))
+        self.assertTrue(all(4 <= len(word) <= 12 and views.validate_word(word) for word in words))
+
+
+###########################################################
+# Metrics
+###########################################################
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def test_render(self):
+        registry = MetricsRegistry('test')
+        registry.counter('moves_total', "Moves.", outcome='won').inc(2)
+        registry.gauge('version', "Version.").set(3)
+        histogram = registry.histogram('seconds', "Time.", stage='find')
+        for value in (0.000001, 0.002, 5):
+            histogram.observe(value)
+        text = registry.render()
+        self.assertIn('# TYPE test_moves_total counter\ntest_moves_total{outcome="won"} 2\n', text)
+        self.assertIn('# TYPE test_version gauge\ntest_version 3\n', text)
+        self.assertIn('test_seconds_bucket{stage="find",le="1e-05"} 1\n', text)
+        self.assertIn('test_seconds_bucket{stage="find",le="0.0025"} 2\n', text)
+        self.assertIn('test_seconds_bucket{stage="find",le="+Inf"} 3\n', text)
+        self.assertIn('test_seconds_count{stage="find"} 3\n', text)
+
+    def test_timed(self):
+        registry = MetricsRegistry()
+
+        def fail():
+            raise ValueError()
+
+        async def double(value):
+            return value * 2
+
+        with self.assertRaises(ValueError):
+            registry.timed(fail, 'fail')()
+        self.assertEqual(async_to_sync(registry.timed(double, 'double'))(2), 4)
+        self.assertEqual(registry.histogram('stage_seconds', '', stage='fail').count, 1)
+        self.assertEqual(registry.histogram('stage_seconds', '', stage='double').count, 1)
+
+    def test_instrument_only_wraps_the_instance(self):
+        registry = MetricsRegistry()
+        trie, other = build(Trie), build(Trie)
+        registry.instrument(trie, 'find', 'find')
+        trie.find('cat')
+        other.find('cat')
+        self.assertEqual(registry.histogram('stage_seconds', '', stage='find').count, 1)
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def test_disabled(self):
+        with mock.patch.object(views, 'METRICS_ENABLED', False):
+            self.assertEqual(self.client.get(reverse('game:metrics')).status_code, 404)
+
+    def test_enabled(self):
+        with mock.patch.object(views, 'METRICS_ENABLED', True):
+            response = self.client.get(reverse('game:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_api_views_timed(self):
+        # the timing wrappers are only made when the module loads with
+        # metrics on, so check that every API view has one
+        source = inspect.getsource(views)
+        for pattern in urls.urlpatterns:
+            if pattern.name.startswith('api_'):
+                self.assertIn(f"{pattern.name} = metrics.timed({pattern.name}, '{pattern.name}')", source)
@@ -8,6 +8,16 @@ app_name = 'game'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('api/move', views.api_move, name='api_move'),
+    path('api/moves', views.api_moves, name='api_moves'),
+    path('api/superghost', views.api_superghost, name='api_superghost'),
+    path('api/definition/<str:word>', views.api_definition, name='api_definition'),
+    path('api/completions/<str:prefix>', views.api_completions, name='api_completions'),
+    path('api/suggestions/<str:word>', views.api_suggestions, name='api_suggestions'),
+    path('trie/<str:dictionary>/<str:filename>', views.client_trie, name='client_trie'),
+    path('health/live', views.health_live, name='health_live'),
+    path('health/ready', views.health_ready, name='health_ready'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,35 +1,275 @@
-from django.http import JsonResponse, HttpResponseBadRequest
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import (JsonResponse, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseNotAllowed, HttpResponseNotModified, Http404, FileResponse)
 from django.shortcuts import render
+from django.utils.http import parse_etags
 
+import json
+import logging
 import re
 
-from .asset_loader import EN_TRIE, EN_DEFINITIONS
-from .GhostGame import GhostGame
+from . import asset_loader
+from .DictionaryRegistry import Dictionary, DictionaryLibrary, DictionaryWarmup, StageTimer
+from .GameSessions import GameSessionStore
+from .GhostGame import GhostGame, SuperghostGame, HINT_MODES
+from .GhostStrategies import DIFFICULTIES
+from .metrics import registry as metrics
+from .ResponseCache import ResponseCache
 
-game = GhostGame(EN_TRIE)
+logger = logging.getLogger("ghostAppLogger")
+
+
+def create_dictionary(trie, definitions, word_ranks, substring_index, client_trie=None):
+    superghost = SuperghostGame(substring_index) if substring_index is not None else None
+    return Dictionary(GhostGame(trie, word_ranks), definitions, superghost, client_trie)
+
+
+def load_dictionary(name):
+    """Loads dictionary `name` from the files on disk, recording the
+    time taken by each stage in the Dictionary's stage_seconds."""
+    timer = StageTimer()
+    with timer('trie'):
+        trie = asset_loader.load_trie(name)
+    with timer('heights'):
+        trie.calculate_heights()
+    with timer('move_tables'):
+        trie.calculate_move_tables()
+    with timer('ranks'):
+        word_ranks = asset_loader.load_ranks(name)
+    with timer('hint_tables'):
+        trie.calculate_hint_tables(word_ranks)
+    with timer('definitions'):
+        definitions = asset_loader.load_definitions(name)
+    with timer('substring_index'):
+        substring_index = asset_loader.load_substring_index(name)
+    client_trie = asset_loader.find_client_trie(name)
+    with timer('game'):
+        # the trie already holds the ranks and every table GhostGame
+        # needs, so this only builds the strategies
+        dictionary = create_dictionary(trie, definitions, None, substring_index, client_trie)
+    dictionary.stage_seconds = timer.seconds
+    return dictionary
+
+
+DEFAULT_DICTIONARY = asset_loader.DEFAULT_DICTIONARY
+
+# Dictionaries are loaded on first use and dropped, least recently
+# used first, once together they take more than the memory budget.
+# Every request reads the current version of its dictionary once and
+# plays on it; see DictionaryRegistry for how new versions are loaded.
+dictionaries = DictionaryLibrary(
+    load_dictionary,
+    asset_loader.DICTIONARIES,
+    budget_bytes=getattr(settings, 'GHOST_DICTIONARY_MEMORY_BUDGET', 0) * 2 ** 20,
+    watched_paths=asset_loader.watched_paths,
+    watch_interval=getattr(settings, 'GHOST_DICTIONARY_WATCH_INTERVAL', 10),
+    reload_trigger=asset_loader.reload_trigger_path,
+)
+
+# Loads the default dictionary in the background when the app starts
+# (see GameConfig.ready()); /health/ready reports when it is done.
+warmup = DictionaryWarmup(dictionaries, [DEFAULT_DICTIONARY])
+
+sessions = GameSessionStore(
+    ttl=getattr(settings, 'GHOST_SESSION_TTL', 1800),
+    capacity=getattr(settings, 'GHOST_SESSION_CAPACITY', 10000),
+)
+
+COMPACT_JSON = {'separators': (',', ':')}
+
+BATCH_MAX_SIZE = getattr(settings, 'GHOST_BATCH_MAX_SIZE', 10000)
+
+METRICS_ENABLED = getattr(settings, 'GHOST_METRICS_ENABLED', False)
+
+HINT_MODE = getattr(settings, 'GHOST_HINT_MODE', 'random')
+if HINT_MODE not in HINT_MODES:
+    raise ImproperlyConfigured(f"GHOST_HINT_MODE must be one of {', '.join(HINT_MODES)}, not {HINT_MODE!r}.")
+
+# CPU opponent of games that do not ask for one (see DIFFICULTIES)
+DEFAULT_DIFFICULTY = getattr(settings, 'GHOST_DEFAULT_DIFFICULTY', 'hard')
+if DEFAULT_DIFFICULTY not in DIFFICULTIES:
+    raise ImproperlyConfigured(f"GHOST_DEFAULT_DIFFICULTY must be one of {', '.join(DIFFICULTIES)}, "
+                               f"not {DEFAULT_DIFFICULTY!r}.")
+
+# seconds browsers may cache a client trie (its name changes with it)
+CLIENT_TRIE_MAX_AGE = 365 * 24 * 3600
+
+# Definition and completion lookups are rendered once per dictionary
+# version and kept in this cache; clients and proxies may reuse them
+# for LOOKUP_MAX_AGE seconds and then revalidate with their ETag.
+responses = ResponseCache(capacity=getattr(settings, 'GHOST_RESPONSE_CACHE_SIZE', 10000))
+LOOKUP_MAX_AGE = getattr(settings, 'GHOST_LOOKUP_MAX_AGE', 3600)
+
+# most completions returned by one /api/completions request
+COMPLETIONS_MAX_LIMIT = 1000
+
+# "Did you mean" suggestions offered when a player leaves the
+# dictionary: at most SUGGEST_LIMIT prefixes or words, each within
+# SUGGEST_MAX_DISTANCE edits of what they played
+SUGGEST_MAX_DISTANCE = getattr(settings, 'GHOST_SUGGEST_MAX_DISTANCE', 2)
+SUGGEST_LIMIT = getattr(settings, 'GHOST_SUGGEST_LIMIT', 5)
 
 
 def validate_word(word):
-    return word is not None and re.match(r"^[a-zA-Z]*$", word) is not None
+    return isinstance(word, str) and re.fullmatch(r"[a-zA-Z]*", word) is not None
+
+
+def get_text(data, key, default=''):
+    """Field `key` of a request's data, or None if it is not a string
+    (such as a JSON null, boolean or number)."""
+    value = data.get(key, default)
+    return value if isinstance(value, str) else None
+
+
+def is_true(value):
+    return value is True or str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def record_outcome(cpu_move):
+    if not METRICS_ENABLED:
+        return
+    if not cpu_move.is_game_over:
+        outcome = 'in_progress'
+    elif cpu_move.word is None:
+        outcome = 'player_lost_word' if cpu_move.is_real_word else 'player_lost_invalid'
+    elif cpu_move.is_real_word:
+        outcome = 'player_won'
+    else:
+        outcome = 'cpu_invalid'
+    metrics.counter('moves_total', "Moves played, by resulting game state.", outcome=outcome).inc()
+
+
+def record_invalid(endpoint):
+    if METRICS_ENABLED:
+        metrics.counter('invalid_input_total', "Requests rejected as invalid input.", endpoint=endpoint).inc()
+
+
+async def get_dictionary(name):
+    """Returns the current version of the dictionary called `name`.
 
+    Loading a dictionary takes a while, so the first request for one
+    waits for it in a worker thread rather than on the event loop.
+    Raises KeyError for unknown names.
+    """
+    if name not in dictionaries:
+        raise KeyError(name)
+    if dictionaries.is_loaded(name):
+        return dictionaries.current(name)
+    return await sync_to_async(dictionaries.current, thread_sensitive=False)(name)
 
-def index(request):
-    ctx = {}
+
+def get_session(token, prefix, dictionary, difficulty=DEFAULT_DIFFICULTY):
+    """Returns the game session for `token`, positioned at `prefix`.
+
+    The session's own word, dictionary and difficulty are
+    authoritative. If the session is missing or expired, a new one is
+    started on `dictionary` against `difficulty` from a full search of
+    the trie.
+
+    Raises ValueError if the session does not match the prefix the
+    client sent; the session is left as it was.
+    """
+    session = sessions.get(token)
+    if session is None:
+        return sessions.create(prefix, dictionary.game.wordlist.find(prefix), dictionary, difficulty)
+    if session.word != prefix:
+        raise ValueError(f"Session {token} is at {session.word!r}, not {prefix!r}.")
+    return session
+
+
+def play_turn(token, prefix, usr_input, dictionary, difficulty=DEFAULT_DIFFICULTY):
+    """Plays the user's letters and the CPU's reply.
+
+    Returns:
+        (session, word, cpu_move) where `word` is the word after the
+        user's move. The session is discarded once the game is over.
+
+    Raises ValueError if the session does not match `prefix`.
+    """
+    session = get_session(token, prefix, dictionary, difficulty)
+    session.advance(usr_input)
+    word = session.word
+
+    cpu_move = session.dictionary.game.make_move(word, session.node, session.difficulty)
+
+    if cpu_move.is_game_over:
+        sessions.discard(session.token)
+    else:
+        session.word = cpu_move.word
+        session.node = cpu_move.node
+
+    return session, word, cpu_move
+
+
+def get_hints(dictionary, word, cpu_move, mode=HINT_MODE):
+    """Suggests words the user could have played instead, if their
+    last letter took the game out of the trie. See GhostGame.get_hints()
+    for the modes."""
+    if cpu_move.is_game_over and not cpu_move.is_real_word and cpu_move.word is None:
+        return dictionary.game.get_hints(word[0:-1], mode)
+    return []
+
+
+def get_suggestions(dictionary, word, cpu_move):
+    """Prefixes and words close to `word`, if the user's last letter
+    took the game out of the trie. See GhostGame.get_suggestions()."""
+    if cpu_move.is_game_over and not cpu_move.is_real_word and cpu_move.word is None:
+        return dictionary.game.get_suggestions(word, SUGGEST_MAX_DISTANCE, SUGGEST_LIMIT)
+    return []
+
+
+def get_definition(dictionary, word, cpu_move):
+    """Definition of the word that ended the game, if any."""
+    if not cpu_move.is_game_over:
+        return None
+    target_word = cpu_move.word if cpu_move.word is not None else word
+    return dictionary.definitions.get(target_word.lower(), None)
+
+
+async def get_definition_async(dictionary, word, cpu_move):
+    # Definitions may be read from disk (see DefinitionStore), so
+    # lookups are run in a worker thread rather than on the event loop.
+    return await sync_to_async(get_definition, thread_sensitive=False)(dictionary, word, cpu_move)
+
+
+async def index(request):
+    name = request.POST.get('dictionary') or DEFAULT_DICTIONARY
+    if name not in dictionaries:
+        record_invalid('index')
+        return HttpResponseBadRequest(f"Unknown dictionary: {name}")
+    difficulty = request.POST.get('difficulty') or DEFAULT_DIFFICULTY
+    if difficulty not in DIFFICULTIES:
+        record_invalid('index')
+        return HttpResponseBadRequest(f"Unknown difficulty: {difficulty}")
+    ctx = {'dictionaries': dictionaries.names, 'dictionary': name,
+           'difficulties': DIFFICULTIES, 'difficulty': difficulty}
+    # the page checks the player's moves against this version's trie
+    dictionary = None
 
     if request.method == 'POST':
-        
         if request.POST.get('reset', None) is not None:
+            sessions.discard(request.POST.get('session', ''))
             ctx['prefix'] = ''
         else:
-            usr_input = request.POST.get('input-txt', '')
-            prefix = request.POST.get('prefix', '') + usr_input
-            prefix = prefix.lower()
+            usr_input = request.POST.get('input-txt', '').lower()
+            prefix = request.POST.get('prefix', '').lower()
 
-            if not validate_word(prefix):
-                logger.info(f"Rejected invalid word: {prefix}")
+            if not validate_word(prefix + usr_input):
+                logger.info(f"Rejected invalid word: {prefix + usr_input}")
+                record_invalid('index')
                 return HttpResponseBadRequest("Word must be a string of letters.")
 
-            cpu_move = game.make_move(prefix)
+            dictionary = await get_dictionary(name)
+            try:
+                session, prefix, cpu_move = play_turn(request.POST.get('session', ''), prefix, usr_input,
+                                                      dictionary, difficulty)
+            except ValueError as e:
+                logger.info(str(e))
+                record_invalid('index')
+                return HttpResponseBadRequest("Session does not match the word.")
+            record_outcome(cpu_move)
             ctx['is_game_over'] = cpu_move.is_game_over
             ctx['previous_word'] = prefix
             ctx['prefix'] = cpu_move.word
@@ -39,7 +279,8 @@ def index(request):
                 if not cpu_move.is_real_word and cpu_move.word is None:
                     # player attempted a word that does not exist
                     ctx['player_lost'] = True
-                    ctx['hint'] = game.get_leaf_node(prefix[0:-1])
+                    ctx['hints'] = get_hints(session.dictionary, prefix, cpu_move)
+                    ctx['suggestions'] = get_suggestions(session.dictionary, prefix, cpu_move)
                 elif cpu_move.is_real_word and cpu_move.word is None:
                     # player played a real word
                     ctx['player_lost'] = True
@@ -47,8 +288,391 @@ def index(request):
                     # computer played a real word
                     ctx['player_won'] = True
 
-                target_word = cpu_move.word if cpu_move.word is not None else prefix
-                target_word = target_word.lower()
-                ctx['definition'] = EN_DEFINITIONS.get(target_word, None)
+                ctx['definition'] = await get_definition_async(session.dictionary, prefix, cpu_move)
+            else:
+                ctx['session'] = session.token
+                dictionary = session.dictionary
+
+    if dictionary is None:
+        dictionary = await get_dictionary(name)
+    ctx['client_trie'] = dictionary.client_trie
 
     return render(request, 'game/index.html', ctx)
+
+
+async def api_move(request):
+    """JSON version of index() for clients that do not need the page.
+
+    Expects a POST with the fields `prefix`, `input`, `session`,
+    `dictionary` and `difficulty` (all optional), either form-encoded
+    or as a JSON object. The difficulty is kept for the rest of the
+    game. Pass
+    `hint`, `suggest` and/or `definition` as true to include them in
+    the reply; `hint` may also name one of HINT_MODES.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return HttpResponseBadRequest("Request body must be a JSON object.")
+        if not isinstance(data, dict):
+            return HttpResponseBadRequest("Request body must be a JSON object.")
+    else:
+        data = request.POST
+
+    usr_input = get_text(data, 'input')
+    prefix = get_text(data, 'prefix')
+
+    if not validate_word(prefix) or not validate_word(usr_input):
+        logger.info(f"Rejected invalid word: {prefix!r} {usr_input!r}")
+        record_invalid('api_move')
+        return HttpResponseBadRequest("Word must be a string of letters.")
+    usr_input, prefix = usr_input.lower(), prefix.lower()
+
+    try:
+        dictionary = await get_dictionary(str(data.get('dictionary') or DEFAULT_DICTIONARY))
+    except KeyError:
+        record_invalid('api_move')
+        return HttpResponseBadRequest("Unknown dictionary.")
+
+    difficulty = str(data.get('difficulty') or DEFAULT_DIFFICULTY)
+    if difficulty not in DIFFICULTIES:
+        record_invalid('api_move')
+        return HttpResponseBadRequest("Unknown difficulty.")
+
+    try:
+        session, prefix, cpu_move = play_turn(get_text(data, 'session') or '', prefix, usr_input, dictionary,
+                                              difficulty)
+    except ValueError as e:
+        logger.info(str(e))
+        record_invalid('api_move')
+        return HttpResponseBadRequest("Session does not match the prefix.")
+    record_outcome(cpu_move)
+
+    result = cpu_move.as_dict()
+    result['session'] = None if cpu_move.is_game_over else session.token
+    hint = data.get('hint')
+    if hint in HINT_MODES or is_true(hint):
+        hints = get_hints(session.dictionary, prefix, cpu_move, hint if hint in HINT_MODES else HINT_MODE)
+        result['hint'] = hints[0] if hints else None
+        result['hints'] = hints
+    if is_true(data.get('suggest')):
+        result['suggestions'] = get_suggestions(session.dictionary, prefix, cpu_move)
+    if is_true(data.get('definition')):
+        result['definition'] = await get_definition_async(session.dictionary, prefix, cpu_move)
+
+    return JsonResponse(result, json_dumps_params=COMPACT_JSON)
+
+
+async def api_moves(request):
+    """Plays the CPU's move for many game states at once.
+
+    Expects a POST with a JSON object of the form {"words": [...]},
+    optionally with a "dictionary" and a "difficulty", and replies
+    with {"moves": [...]},
+    one GhostMove per word in the same order. No sessions are created
+    or used.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return HttpResponseBadRequest("Request body must be a JSON object.")
+
+    words = data.get('words') if isinstance(data, dict) else None
+    if not isinstance(words, list):
+        return HttpResponseBadRequest("Request body must contain a list of words.")
+    if len(words) > BATCH_MAX_SIZE:
+        return HttpResponseBadRequest(f"At most {BATCH_MAX_SIZE} words can be played per request.")
+    if not all(isinstance(word, str) and validate_word(word) for word in words):
+        record_invalid('api_moves')
+        return HttpResponseBadRequest("Words must be strings of letters.")
+
+    try:
+        dictionary = await get_dictionary(str(data.get('dictionary') or DEFAULT_DICTIONARY))
+    except KeyError:
+        record_invalid('api_moves')
+        return HttpResponseBadRequest("Unknown dictionary.")
+    difficulty = str(data.get('difficulty') or DEFAULT_DIFFICULTY)
+    if difficulty not in DIFFICULTIES:
+        record_invalid('api_moves')
+        return HttpResponseBadRequest("Unknown difficulty.")
+
+    # large batches take long enough to stall other connections
+    game = dictionary.game
+    moves = await sync_to_async(game.make_moves, thread_sensitive=False)(
+        [word.lower() for word in words], difficulty)
+    return JsonResponse({'moves': [move.as_dict() for move in moves]}, json_dumps_params=COMPACT_JSON)
+
+
+async def api_superghost(request):
+    """Plays a move of Superghost, where letters may be added at
+    either end of the fragment.
+
+    Expects a POST with the fields `fragment` (the fragment so far),
+    `input` (the letter being played), `side` ('left' or 'right',
+    default 'right') and `dictionary` (optional), either form-encoded
+    or as a JSON object. The
+    reply's `word` is the fragment after the CPU's move. The client
+    keeps the fragment; no sessions are used.
+    """
+    if not asset_loader.SUPERGHOST_ENABLED:
+        raise Http404("Superghost is disabled.")
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return HttpResponseBadRequest("Request body must be a JSON object.")
+        if not isinstance(data, dict):
+            return HttpResponseBadRequest("Request body must be a JSON object.")
+    else:
+        data = request.POST
+
+    fragment = get_text(data, 'fragment')
+    usr_input = get_text(data, 'input')
+    side = get_text(data, 'side', 'right')
+
+    if not validate_word(fragment) or not validate_word(usr_input) or side not in ('left', 'right'):
+        logger.info(f"Rejected invalid Superghost move: {fragment!r} {usr_input!r} {side!r}")
+        record_invalid('api_superghost')
+        return HttpResponseBadRequest("Fragment and input must be letters and side 'left' or 'right'.")
+    fragment, usr_input = fragment.lower(), usr_input.lower()
+
+    try:
+        dictionary = await get_dictionary(str(data.get('dictionary') or DEFAULT_DICTIONARY))
+    except KeyError:
+        record_invalid('api_superghost')
+        return HttpResponseBadRequest("Unknown dictionary.")
+
+    fragment = usr_input + fragment if side == 'left' else fragment + usr_input
+    cpu_move = dictionary.superghost.make_move(fragment)
+    record_outcome(cpu_move)
+
+    result = cpu_move.as_dict()
+    result['fragment'] = fragment
+    return JsonResponse(result, json_dumps_params=COMPACT_JSON)
+
+
+async def cached_lookup(request, key, lookup):
+    """Serves a GET lookup from `responses`, rendering it on a miss.
+
+    Args:
+        key - cache key; must identify the dictionary version
+        lookup - callable returning (status, JSON-serializable data).
+        It is run in a worker thread, since definitions may be read
+        from disk.
+
+    Replies 304 when the request's If-None-Match has the ETag of the
+    current response.
+    """
+    entry = responses.get(key)
+    if METRICS_ENABLED:
+        metrics.counter('lookups_total', "Definition and completion lookups, by response cache outcome.",
+                        cache='miss' if entry is None else 'hit').inc()
+    if entry is None:
+        status, data = await sync_to_async(lookup, thread_sensitive=False)()
+        entry = responses.put(key, status, json.dumps(data, **COMPACT_JSON).encode())
+
+    if entry.status == 200 and entry.etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry.body, status=entry.status, content_type='application/json')
+    response['ETag'] = entry.etag
+    response['Cache-Control'] = f'public, max-age={LOOKUP_MAX_AGE}'
+    return response
+
+
+async def lookup_dictionary(request, endpoint):
+    """Returns (name, Dictionary) for the `dictionary` query parameter,
+    or (name, None) after recording the rejection if there is no such
+    dictionary."""
+    name = request.GET.get('dictionary') or DEFAULT_DICTIONARY
+    try:
+        return name, await get_dictionary(name)
+    except KeyError:
+        record_invalid(endpoint)
+        return name, None
+
+
+async def api_definition(request, word):
+    """Definition of `word`: {"word": ..., "definition": ...}, or a 404
+    if the dictionary has none. Responses are cacheable (see
+    cached_lookup())."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    word = word.lower()
+    if not word or not validate_word(word):
+        record_invalid('api_definition')
+        return HttpResponseBadRequest("Word must be a string of letters.")
+    name, dictionary = await lookup_dictionary(request, 'api_definition')
+    if dictionary is None:
+        return HttpResponseBadRequest("Unknown dictionary.")
+
+    def lookup():
+        definition = dictionary.definitions.get(word, None)
+        return (200 if definition is not None else 404), {'word': word, 'definition': definition}
+
+    key = ('definition', name, dictionary.version, word)
+    return await cached_lookup(request, key, lookup)
+
+
+async def api_completions(request, prefix):
+    """Words of the dictionary that start with `prefix`, in
+    alphabetical order: {"prefix": ..., "count": ..., "completions":
+    [...]}. `count` is the number of such words; at most `limit`
+    (query parameter, default 20) are listed. Responses are cacheable
+    (see cached_lookup())."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    prefix = prefix.lower()
+    if not validate_word(prefix):
+        record_invalid('api_completions')
+        return HttpResponseBadRequest("Prefix must be a string of letters.")
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        limit = -1
+    if not 0 <= limit <= COMPLETIONS_MAX_LIMIT:
+        return HttpResponseBadRequest(f"Limit must be between 0 and {COMPLETIONS_MAX_LIMIT}.")
+    name, dictionary = await lookup_dictionary(request, 'api_completions')
+    if dictionary is None:
+        return HttpResponseBadRequest("Unknown dictionary.")
+
+    def lookup():
+        wordlist = dictionary.game.wordlist
+        wordlist.calculate_hint_tables()
+        node = wordlist.find(prefix)
+        count = node.leaf_count if node is not None else 0
+        start = node.leaf_start if node is not None else 0
+        completions = [wordlist.leaf(i) for i in range(start, start + min(count, limit))]
+        return 200, {'prefix': prefix, 'count': count, 'completions': completions}
+
+    key = ('completions', name, dictionary.version, prefix, limit)
+    return await cached_lookup(request, key, lookup)
+
+
+async def api_suggestions(request, word):
+    """Prefixes and words of the dictionary closest to `word` by edit
+    distance, closest first: {"word": ..., "suggestions": [...]}. See
+    SUGGEST_MAX_DISTANCE and SUGGEST_LIMIT. Responses are cacheable
+    (see cached_lookup())."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    word = word.lower()
+    if not word or not validate_word(word):
+        record_invalid('api_suggestions')
+        return HttpResponseBadRequest("Word must be a string of letters.")
+    name, dictionary = await lookup_dictionary(request, 'api_suggestions')
+    if dictionary is None:
+        return HttpResponseBadRequest("Unknown dictionary.")
+
+    def lookup():
+        suggestions = dictionary.game.get_suggestions(word, SUGGEST_MAX_DISTANCE, SUGGEST_LIMIT)
+        return 200, {'word': word, 'suggestions': suggestions}
+
+    key = ('suggestions', name, dictionary.version, word)
+    return await cached_lookup(request, key, lookup)
+
+
+def client_trie(request, dictionary, filename):
+    """Serves the trie that the page uses to check moves before they
+    are sent. Its name changes with its contents, so it may be cached
+    for good."""
+    if dictionary not in dictionaries or not asset_loader.CLIENT_TRIE_FILE_PATTERN.match(filename):
+        raise Http404("No such client trie.")
+    try:
+        f = open(asset_loader.dictionary_path(dictionary, filename), 'rb')
+    except OSError:
+        raise Http404("No such client trie.")
+    response = FileResponse(f, content_type='application/octet-stream')
+    response['Cache-Control'] = f'public, max-age={CLIENT_TRIE_MAX_AGE}, immutable'
+    return response
+
+
+def health_live(request):
+    """Liveness: the process is up and serving requests, whether or
+    not its dictionaries are loaded yet."""
+    return JsonResponse({'status': 'alive'})
+
+
+def health_ready(request):
+    """Readiness: 200 once the warmup has loaded the trie (with its
+    heights and move tables) and the definitions of every dictionary
+    it warms, 503 until then. Starts the warmup if nothing has (or if
+    it failed), so a worker started without one still becomes ready."""
+    if not warmup.ready:
+        warmup.start()
+    status = 200 if warmup.ready else 503
+    return JsonResponse(warmup.status(), status=status)
+
+
+def metrics_view(request):
+    """Exposes the collected metrics in the Prometheus text format."""
+    if not METRICS_ENABLED:
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+###########################################################
+# Instrumentation
+#
+# Each stage of a move is timed by wrapping the function that
+# implements it. With GHOST_METRICS_ENABLED off nothing is
+# wrapped, so the hot path is exactly as if metrics did not exist.
+###########################################################
+
+if METRICS_ENABLED:
+    def instrument_dictionary(name, dictionary):
+        game = dictionary.game
+        metrics.instrument(game.wordlist, 'find', 'find')
+        metrics.instrument(game.strategy, 'get_move', 'strategy')
+        for strategy in game.strategies.values():
+            metrics.instrument(strategy, 'get_move', 'strategy')
+        metrics.instrument(game, 'make_move', 'make_move')
+        metrics.instrument(game, 'get_hints', 'get_hints')
+        metrics.instrument(game, 'get_suggestions', 'get_suggestions')
+
+        metrics.gauge('dictionary_version', "Version of each dictionary used for new games.",
+                      dictionary=name).set(dictionary.version)
+        # the version is not a label, so reloads do not add series
+        metrics.gauge('dictionary_build_seconds', "Time taken to load the current dictionary version.",
+                      dictionary=name).set(dictionary.build_seconds)
+        metrics.gauge('dictionary_rss_delta_bytes', "Change in resident memory while loading the current "
+                      "dictionary version.", dictionary=name).set(dictionary.rss_delta_bytes)
+        for stage, seconds in dictionary.stage_seconds.items():
+            metrics.gauge('dictionary_stage_seconds', "Time taken by each stage of loading the current "
+                          "dictionary version.", dictionary=name, stage=stage).set(seconds)
+
+    def record_dictionary_event(event, name, registry):
+        if event == 'load':
+            metrics.counter('dictionary_loads_total', "Dictionaries loaded on first use.",
+                            dictionary=name).inc()
+            registry.add_listener(lambda dictionary: instrument_dictionary(name, dictionary))
+        elif event == 'hit':
+            metrics.counter('dictionary_hits_total', "Requests served by an already loaded dictionary.",
+                            dictionary=name).inc()
+        else:
+            metrics.counter('dictionary_evictions_total', "Dictionaries dropped to stay within the memory budget.",
+                            dictionary=name).inc()
+            metrics.gauge('dictionary_version', "Version of each dictionary used for new games.",
+                          dictionary=name).set(0)
+
+    dictionaries.add_listener(record_dictionary_event)
+    get_session = metrics.timed(get_session, 'session')
+    get_definition = metrics.timed(get_definition, 'definition')
+    render = metrics.timed(render, 'render')
+    index = metrics.timed(index, 'index')
+    api_move = metrics.timed(api_move, 'api_move')
+    api_moves = metrics.timed(api_moves, 'api_moves')
+    api_superghost = metrics.timed(api_superghost, 'api_superghost')
+    api_definition = metrics.timed(api_definition, 'api_definition')
+    api_completions = metrics.timed(api_completions, 'api_completions')
+    api_suggestions = metrics.timed(api_suggestions, 'api_suggestions')
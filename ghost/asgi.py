@@ -0,0 +1,18 @@
+"""
+ASGI config for ghost project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ghost.settings')
+# serving: warm the dictionary up at start-up (see GHOST_WARMUP)
+os.environ.setdefault('GHOST_WARMUP', '1')
+
+application = get_asgi_application()
@@ -47,6 +47,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ghost.wsgi.application'
 
+ASGI_APPLICATION = 'ghost.asgi.application'
+
 DATABASES = {}
 
 AUTH_PASSWORD_VALIDATORS = []
@@ -61,6 +63,97 @@ USE_L10N = False
 
 USE_TZ = True
 
+# Trie implementation used for the word list: 'dict' (one object per
+# node), 'compact' (flat arrays, see game/CompactTrie.py) or 'auto'.
+# 'auto' and 'compact' memory-map static/game/wordlist.trie when it
+# exists; otherwise the trie is built from static/game/wordlist.txt.
+GHOST_TRIE_IMPL = os.getenv('GHOST_TRIE_IMPL', 'auto')
+
+# Definitions are read from static/game/definitions.idx when it exists.
+# This is the number of decoded entries each process keeps cached.
+GHOST_DEFINITIONS_CACHE_SIZE = int(os.getenv('GHOST_DEFINITIONS_CACHE_SIZE', 1024))
+
+# Games in progress are tracked per process. Idle sessions expire after
+# GHOST_SESSION_TTL seconds; the least recently used are evicted once
+# there are more than GHOST_SESSION_CAPACITY.
+GHOST_SESSION_TTL = int(os.getenv('GHOST_SESSION_TTL', 1800))
+GHOST_SESSION_CAPACITY = int(os.getenv('GHOST_SESSION_CAPACITY', 10000))
+
+# Maximum number of game states accepted by a single /api/moves request.
+GHOST_BATCH_MAX_SIZE = int(os.getenv('GHOST_BATCH_MAX_SIZE', 10000))
+
+# Time each stage of a move and count outcomes, exposed at /metrics in
+# the Prometheus text format. When off, no timing code is installed.
+GHOST_METRICS_ENABLED = os.getenv('GHOST_METRICS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
+# Hint shown when a player leaves the dictionary: 'random', 'longest'
+# or 'common'. Common hints are ranked by GHOST_WORD_RANKS_PATH when
+# set (one word per line, most common first).
+GHOST_HINT_MODE = os.getenv('GHOST_HINT_MODE', 'random')
+GHOST_WORD_RANKS_PATH = os.getenv('GHOST_WORD_RANKS_PATH') or None
+
+# Computer opponent of games that do not pick one: 'easy', 'medium' or
+# 'hard'. All three prefer letters leading to common words (ranked by
+# GHOST_WORD_RANKS_PATH); see game.GhostStrategies.FrequencyWeightedStrat.
+GHOST_DEFAULT_DIFFICULTY = os.getenv('GHOST_DEFAULT_DIFFICULTY', 'hard')
+
+# Read by gunicorn.conf.py too: load the dictionary once in the
+# master process and fork the workers from it. GHOST_TRIE_IMPL=auto
+# then builds an array-backed trie when there is no snapshot, since
+# walking a dict-based trie updates reference counts on every node and
+# unshares its pages.
+GHOST_PREFORK = os.getenv('GHOST_PREFORK', '0').lower() in ('1', 'true', 'yes')
+
+# Load the default dictionary on a background thread when the app
+# starts (see game/apps.py), so a worker is warm before /health/ready
+# lets traffic in. ghost/asgi.py and ghost/wsgi.py default it to on;
+# management commands leave it off.
+GHOST_WARMUP = os.getenv('GHOST_WARMUP', '0').lower() in ('1', 'true', 'yes')
+
+# Seconds between checks for changes to the dictionary files (or a
+# `manage.py reload_dictionary`). A change is loaded in the background
+# and used for new games; games in progress finish on the old version.
+# 0 disables reloading.
+GHOST_DICTIONARY_WATCH_INTERVAL = float(os.getenv('GHOST_DICTIONARY_WATCH_INTERVAL', 10))
+
+# Dictionaries that games can be played with, as name=directory pairs
+# separated by commas (e.g. "en=game/static/game,fr=/srv/ghost/fr").
+# Each directory holds its own wordlist.txt and definitions.json, plus
+# the snapshot and index built from them. Relative paths are taken
+# from the project directory. Unset, only the bundled English list is
+# available.
+GHOST_DICTIONARIES = {
+    name.strip(): os.path.join(BASE_DIR, directory.strip())
+    for name, _, directory in (pair.partition('=') for pair in os.getenv('GHOST_DICTIONARIES', '').split(','))
+    if name.strip() and directory.strip()
+} or None
+GHOST_DEFAULT_DICTIONARY = os.getenv('GHOST_DEFAULT_DICTIONARY', 'en')
+
+# Dictionaries are loaded on first use. Once together they take more
+# than this many megabytes, the least recently used are dropped (and
+# loaded again when next needed). Each is counted by the size of its
+# arrays and mapped files. 0 means no limit.
+GHOST_DICTIONARY_MEMORY_BUDGET = int(os.getenv('GHOST_DICTIONARY_MEMORY_BUDGET', 0))
+
+# Responses of /api/definition and /api/completions are cached per
+# process (GHOST_RESPONSE_CACHE_SIZE entries) and may be reused by
+# browsers and proxies for GHOST_LOOKUP_MAX_AGE seconds before they
+# revalidate them with their ETag.
+GHOST_RESPONSE_CACHE_SIZE = int(os.getenv('GHOST_RESPONSE_CACHE_SIZE', 10000))
+GHOST_LOOKUP_MAX_AGE = int(os.getenv('GHOST_LOOKUP_MAX_AGE', 3600))
+
+# "Did you mean" suggestions for a player who leaves the dictionary:
+# up to GHOST_SUGGEST_LIMIT prefixes or words within
+# GHOST_SUGGEST_MAX_DISTANCE edits (insertions, deletions or
+# replacements) of what they played. Each extra edit widens the search
+# considerably.
+GHOST_SUGGEST_MAX_DISTANCE = int(os.getenv('GHOST_SUGGEST_MAX_DISTANCE', 2))
+GHOST_SUGGEST_LIMIT = int(os.getenv('GHOST_SUGGEST_LIMIT', 5))
+
+# Serve Superghost at /api/superghost. Building its substring index
+# and solving it adds about a second to start-up.
+GHOST_SUPERGHOST_ENABLED = os.getenv('GHOST_SUPERGHOST_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
 STATIC_ROOT = '/var/ghost/static'
 STATIC_URL = '/static/'
 
@@ -71,7 +164,7 @@ LOGGING = {
         'file': {
             'level': 'DEBUG',
             'class': 'logging.handlers.RotatingFileHandler',
-            'filename': '/var/log/django/ghost/webapp.log',
+            'filename': os.path.join(os.getenv('LOG_PATH', '/var/log/django/ghost'), 'webapp.log'),
             'maxBytes': 20*1024*1024,
             'backupCount': 2,
         },
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ghost.settings')
+# serving: warm the dictionary up at start-up (see GHOST_WARMUP)
+os.environ.setdefault('GHOST_WARMUP', '1')
 
 application = get_wsgi_application()
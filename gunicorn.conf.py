@@ -0,0 +1,51 @@
+# Gunicorn configuration for serving the ASGI application:
+#
+#   $ gunicorn ghost.asgi:application
+#
+# Each worker runs an event loop (uvicorn), so idle keep-alive
+# connections do not occupy a thread. See
+# https://docs.gunicorn.org/en/stable/settings.html
+#
+# With GHOST_PREFORK=1 the dictionary is loaded once in the master
+# process and the workers are forked from it, sharing its pages
+# instead of each loading a copy (see when_ready below).
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('GHOST_BIND', '0.0.0.0:8000')
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# seconds an idle keep-alive connection is held open
+keepalive = int(os.getenv('GHOST_KEEPALIVE', 75))
+
+# load the application (and, in when_ready, the dictionary) in the
+# master before forking the workers
+preload_app = os.getenv('GHOST_PREFORK', '0').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    # Loading the application started the warmup of the default
+    # dictionary (see GameConfig.ready()); waiting for it here builds
+    # the game and maps the dictionary once, in the master, and the
+    # workers inherit it ready. Other dictionaries are loaded by each
+    # worker when first used.
+    import game.views
+    game.views.warmup.start()
+    if not game.views.warmup.wait():
+        server.log.warning(f"Could not preload the dictionary: {game.views.warmup.error}")
+
+    # only the workers serve games, so only they need to reload the
+    # dictionary; their watchers are started after the fork
+    game.views.dictionaries.pause_watching()
+
+    # Objects that exist before the fork are never examined by the
+    # workers' garbage collector, so collections do not write to the
+    # pages they share with the master.
+    gc.freeze()
+    server.log.info(f"Preloaded dictionary; froze {gc.get_freeze_count()} objects.")